@@ -0,0 +1,175 @@
+import sys, os
+import subprocess
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from pipeline import build_stages, scene_paths, pipeline_steps, STATE_FILE
+
+parser = argparse.ArgumentParser(description='Script for running the sparse depth pipeline on several scenes under a shared CPU budget.')
+parser.add_argument('--dataset', type=str, help='Dataset layout profile.', choices=['dtu', 'tnt'], required=True)
+parser.add_argument('--data_path', type=str, help='Path to the dataset root.', required=True)
+parser.add_argument('--scenes', type=str, nargs='*', help='Scenes to process.', default=[])
+parser.add_argument('--scene_file', type=str, help='File listing one scene per line.')
+parser.add_argument('--cpus', type=int, help='Total number of cores shared by all running stages.', default=os.cpu_count())
+parser.add_argument('--colmap_threads', type=int, help='Number of threads used by each colmap stage (defaults to half the budget).')
+parser.add_argument('--workers', type=int, help='Number of worker processes used to render the depth maps.', default=1)
+parser.add_argument('--max_error', type=float, help='Maximum point error threshold.', default=2.0)
+parser.add_argument('--min_track_len', type=int, help='Minimum required point track length.', default=3)
+parser.add_argument('--matcher', type=str, help='Image pair matching strategy.', choices=['exhaustive', 'pose'], default='exhaustive')
+parser.add_argument('--top_k_pairs', type=int, help='Number of pairs per image for the pose matcher.', default=20)
+parser.add_argument('--retries', type=int, help='Number of times a failed scene is retried.', default=1)
+parser.add_argument('--log_dir', type=str, help='Directory of the per-scene log files (defaults to <data_path>/logs).')
+parser.add_argument('--colmap', type=str, help='Colmap executable (may include leading arguments).', default='colmap')
+parser.add_argument('--fake_colmap', action='store_true', help='Use the local fake colmap stand-in instead of colmap.')
+parser.add_argument('--incremental', action='store_true', help='Add new frames to the existing databases instead of rebuilding the scenes.')
+parser.add_argument('--dry_run', action='store_true', help='Only report which stages would run for each scene.')
+
+class SceneJob:
+    """Tracks the progress of a single scene through its pipeline stages."""
+    def __init__(self, scene, stages, state_file, log_file):
+        self.scene = scene
+        self.stages = stages
+        self.state_file = state_file
+        self.log_file = log_file
+        self.attempts = 0
+        self.steps = None
+        self.stage = None
+        self.running = False
+        self.failed = False
+
+    def log(self, message):
+        print(f"[{self.scene}] {message}", flush=True)
+        with open(self.log_file, 'a') as lf:
+            lf.write(f"{message}\n")
+
+    def start(self, dry_run=False):
+        self.steps = pipeline_steps(self.stages, self.state_file, dry_run=dry_run, log=self.log)
+        self.advance()
+
+    def advance(self):
+        # resuming the generator records the completed stage and yields the next one
+        self.stage = next(self.steps, None)
+
+    @property
+    def finished(self):
+        return self.stage is None
+
+def run_job_stage(job, stage):
+    with open(job.log_file, 'a') as lf:
+        for command in stage.commands:
+            lf.write(f"$ {' '.join(command)}\n")
+            lf.flush()
+            subprocess.run(command, check=True, stdout=lf, stderr=subprocess.STDOUT)
+
+def stage_cores(stage, cpus):
+    return max(1, min(stage.cores, cpus))
+
+def schedule(jobs, cpus, retries=1, run_fn=run_job_stage):
+    """Runs the stages of several scenes concurrently without exceeding a core budget.
+
+    Each scene runs its stages in order, while stages of different scenes overlap
+    whenever their combined core demand fits in the budget.
+
+    Parameters:
+        jobs: Scene jobs to run.
+        cpus: Total number of cores shared by all running stages.
+        retries: Number of times a failed scene is retried (resuming from its cache).
+        run_fn: Callable running a single stage of a job.
+
+    Returns:
+        Scenes that failed after all retries.
+    """
+    for job in jobs:
+        job.start()
+
+    available = cpus
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, cpus)) as executor:
+        while True:
+            for job in jobs:
+                if job.finished or job.running or job.failed:
+                    continue
+                cores = stage_cores(job.stage, cpus)
+                if cores > available:
+                    continue
+                available -= cores
+                job.running = True
+                running[executor.submit(run_fn, job, job.stage)] = (job, cores)
+
+            if not running:
+                break
+
+            completed, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in completed:
+                job, cores = running.pop(future)
+                available += cores
+                job.running = False
+
+                try:
+                    future.result()
+                except Exception as e:
+                    job.attempts += 1
+                    job.log(f"[{job.stage.name}] failed: {e}")
+                    if job.attempts <= retries:
+                        job.log(f"retrying ({job.attempts}/{retries})")
+                        job.start()
+                    else:
+                        job.failed = True
+                    continue
+
+                job.advance()
+                if job.finished:
+                    job.log("done")
+
+    return [job.scene for job in jobs if job.failed]
+
+def read_scenes(scenes, scene_file):
+    scenes = list(scenes)
+    if scene_file is not None:
+        with open(scene_file, 'r') as sf:
+            scenes += [l.strip() for l in sf if l.strip() and l[0] != '#']
+    return scenes
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    scenes = read_scenes(args.scenes, args.scene_file)
+    if not scenes:
+        parser.error("no scenes given; use --scenes or --scene_file")
+
+    colmap = args.colmap
+    if args.fake_colmap:
+        colmap = f"{sys.executable} {os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_colmap.py')}"
+    colmap_threads = args.colmap_threads if args.colmap_threads is not None else max(1, args.cpus // 2)
+
+    log_dir = args.log_dir if args.log_dir is not None else os.path.join(args.data_path, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+
+    jobs = []
+    for scene in scenes:
+        paths = scene_paths(args.dataset, args.data_path, scene)
+        os.makedirs(paths["colmap_path"], exist_ok=True)
+        stages = build_stages(
+            paths,
+            args.max_error,
+            args.min_track_len,
+            args.matcher,
+            args.top_k_pairs,
+            args.workers,
+            colmap,
+            colmap_threads,
+            args.incremental,
+        )
+        jobs.append(SceneJob(scene, stages, os.path.join(paths["colmap_path"], STATE_FILE), os.path.join(log_dir, f"{scene}.log")))
+
+    if args.dry_run:
+        for job in jobs:
+            for stage in pipeline_steps(job.stages, job.state_file, dry_run=True, log=lambda message: None):
+                print(f"[{job.scene}] [{stage.name}] would run on {stage_cores(stage, args.cpus)} core(s)")
+        return
+
+    failed = schedule(jobs, args.cpus, args.retries)
+    if failed:
+        sys.exit(f"failed scenes: {' '.join(failed)}")
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,79 @@
+import sys, os
+import time
+import tempfile
+import numpy as np
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import COLMAPDatabase
+
+def make_data(num_images, num_keypoints, pairs_per_image, seed=0):
+    rng = np.random.default_rng(seed)
+    names = [f"{i:08d}.png" for i in range(num_images)]
+    keypoints = [rng.uniform(0, 1000, (num_keypoints, 2)).astype(np.float32) for _ in range(num_images)]
+    pairs = [(i+1, j+1) for i in range(num_images) for j in range(i+1, min(i+1+pairs_per_image, num_images))]
+    matches = [rng.integers(0, num_keypoints, (num_keypoints // 4, 2)) for _ in pairs]
+    return names, keypoints, pairs, matches
+
+def insert_per_row_commits(db, camera_id, names, keypoints, pairs, matches):
+    # baseline: one committed transaction per row with the default PRAGMAs
+    for i,name in enumerate(names):
+        db.add_image(name=name, camera_id=camera_id, image_id=i+1)
+        db.commit()
+    for i,kps in enumerate(keypoints):
+        db.add_keypoints(i+1, kps)
+        db.commit()
+    for (id1, id2),m in zip(pairs, matches):
+        db.add_matches(id1, id2, m)
+        db.commit()
+
+def insert_per_row(db, camera_id, names, keypoints, pairs, matches):
+    # per-row statements in one transaction with the default PRAGMAs
+    for i,name in enumerate(names):
+        db.add_image(name=name, camera_id=camera_id, image_id=i+1)
+    for i,kps in enumerate(keypoints):
+        db.add_keypoints(i+1, kps)
+    for (id1, id2),m in zip(pairs, matches):
+        db.add_matches(id1, id2, m)
+    db.commit()
+
+def insert_bulk(db, camera_id, names, keypoints, pairs, matches):
+    with db.bulk_transaction():
+        db.add_images_bulk(names, camera_id, image_ids=np.arange(1, len(names)+1))
+        db.add_keypoints_bulk((i+1, kps) for i,kps in enumerate(keypoints))
+        db.add_matches_bulk((id1, id2, m) for (id1, id2),m in zip(pairs, matches))
+
+def run(insert_fn, data, db_dir=None):
+    with tempfile.TemporaryDirectory(dir=db_dir) as tmp_dir:
+        db = COLMAPDatabase.connect(os.path.join(tmp_dir, "database.db"))
+        db.create_tables()
+        camera_id = db.add_camera(1, 1600, 1200, np.array([1000.0, 1000.0, 800.0, 600.0]))
+        db.commit()
+
+        start = time.perf_counter()
+        insert_fn(db, camera_id, *data)
+        elapsed = time.perf_counter() - start
+        db.close()
+
+    return elapsed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark comparing per-row and bulk COLMAPDatabase inserts.')
+    parser.add_argument('--num_images', type=int, help='Number of images to insert.', default=2000)
+    parser.add_argument('--num_keypoints', type=int, help='Number of keypoints per image.', default=500)
+    parser.add_argument('--pairs_per_image', type=int, help='Number of matched pairs per image.', default=10)
+    parser.add_argument('--db_dir', type=str, help='Directory of the benchmark databases (system temporary directory by default; commit costs depend on its filesystem).')
+    args = parser.parse_args(argv)
+
+    data = make_data(args.num_images, args.num_keypoints, args.pairs_per_image)
+    per_row_commits = run(insert_per_row_commits, data, args.db_dir)
+    per_row = run(insert_per_row, data, args.db_dir)
+    bulk = run(insert_bulk, data, args.db_dir)
+
+    print(f"images: {args.num_images}, pairs: {len(data[2])}")
+    print(f"per-row commits:            {per_row_commits:.3f}s")
+    print(f"per-row, one transaction:   {per_row:.3f}s ({per_row_commits / per_row:.1f}x)")
+    print(f"bulk:                       {bulk:.3f}s ({per_row_commits / bulk:.1f}x, {per_row / bulk:.2f}x over one transaction)")
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,44 @@
+import sys, os
+import time
+import numpy as np
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import project_points, zbuffer_project, observation_project
+
+def make_view(num_points, width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    pose = np.eye(4)
+    K = np.array([[width, 0, width / 2], [0, width, height / 2], [0, 0, 1.0]])
+    points = rng.uniform(-0.5, 0.5, (num_points, 3)) * np.array([width / height, 1, 1])
+    points[:,2] += 2.0
+    u, v, _ = project_points(pose, K, points)
+    xys = np.stack([u, v], axis=1) + rng.normal(0, 0.3, (num_points, 2))
+    return pose, K, points, xys
+
+def timeit(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return np.median(times)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark comparing the rendering and observation (tracks) sparse depth paths.')
+    parser.add_argument('--num_points', type=int, help='Number of points observed by the view.', default=200000)
+    parser.add_argument('--width', type=int, help='Image width.', default=1920)
+    parser.add_argument('--height', type=int, help='Image height.', default=1080)
+    parser.add_argument('--repeats', type=int, help='Number of timed repetitions.', default=10)
+    args = parser.parse_args(argv)
+
+    pose, K, points, xys = make_view(args.num_points, args.width, args.height)
+    render = timeit(lambda: zbuffer_project(pose, K, points, args.width, args.height), args.repeats)
+    tracks = timeit(lambda: observation_project(pose, xys, points, args.width, args.height), args.repeats)
+
+    print(f"points per view: {args.num_points}, image: {args.width}x{args.height}")
+    print(f"render (zbuffer_project):      {render * 1e3:.2f} ms")
+    print(f"tracks (observation_project):  {tracks * 1e3:.2f} ms ({render / tracks:.2f}x)")
+
+if __name__=="__main__":
+    main()
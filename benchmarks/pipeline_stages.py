@@ -0,0 +1,170 @@
+import sys, os
+import time
+import json
+import shutil
+import platform
+import tempfile
+import subprocess
+import numpy as np
+import argparse
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_PATH)
+import colmap_io
+from visibility import VisibilityIndex
+from utils import zbuffer_depth, write_pfm, read_cams_sfm
+from database import gen_database
+from ply_io import write_ply
+from colmap2sparse import build_index
+from synthetic_scene import generate_scene
+
+def timeit(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_PATH, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_PATH, capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+def run_script(script, args, report_file):
+    # the scripts report their own per-stage timings (see instrument.py)
+    command = [sys.executable, os.path.join(REPO_PATH, script), *args, "--no_cache", "--report_file", report_file]
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with open(report_file, 'r') as rf:
+        report = json.load(rf)
+
+    results = {f"{script[:-3]}.total": report["wall_time_s"]}
+    for stage in report["stages"]:
+        results[f"{script[:-3]}.{stage['name']}"] = stage["wall_time_s"]
+    return results
+
+def bench_scale(scene_path, num_points, num_cams, args):
+    scene = generate_scene(scene_path, num_points, num_cams, args.track_len, args.width, args.height)
+    results = {}
+
+    # library functions
+    points_bin = os.path.join(scene["model_path"], "points3D.bin")
+    images_bin = os.path.join(scene["model_path"], "images.bin")
+    results["load_points.text"] = timeit(lambda: colmap_io.load_points(scene["points_file"], args.max_error, args.min_track_len), args.repeats)
+    results["load_points.binary"] = timeit(lambda: colmap_io.load_points(points_bin, args.max_error, args.min_track_len), args.repeats)
+    results["read_images.text"] = timeit(lambda: colmap_io.read_images(scene["images_file"]), args.repeats)
+    results["read_images.binary"] = timeit(lambda: colmap_io.read_images(images_bin), args.repeats)
+    results["build_index.text"] = timeit(lambda: build_index(scene["images_file"]), args.repeats)
+    results["build_index.binary"] = timeit(lambda: build_index(images_bin), args.repeats)
+
+    points = colmap_io.load_points(points_bin, args.max_error, args.min_track_len)
+    results["visibility_index"] = timeit(lambda: VisibilityIndex.from_points(points), args.repeats)
+    visibility = VisibilityIndex.from_points(points)
+
+    cams = read_cams_sfm(scene["cam_path"])
+    views = range(min(args.repeats, num_cams))
+    depths = {}
+    def render(view):
+        depths[view] = zbuffer_depth(cams[view,0], cams[view,1,:3,:3], visibility.points(view+1), args.width, args.height)
+    results["render_depth.per_view"] = float(np.median([timeit(lambda: render(view), 1) for view in views]))
+
+    with tempfile.TemporaryDirectory() as tmp_path:
+        pfm_file = os.path.join(tmp_path, "depth.pfm")
+        results["write_pfm.per_view"] = float(np.median([timeit(lambda: write_pfm(pfm_file, depths[view]), 1) for view in views]))
+
+        cam_params = np.asarray([cams[0,1,0,0], cams[0,1,1,1], cams[0,1,0,2], cams[0,1,1,2]])
+        image_files = sorted(os.listdir(scene["image_path"]))
+        database_file = os.path.join(tmp_path, "database.db")
+        def database():
+            if os.path.exists(database_file):
+                os.remove(database_file)
+            gen_database(database_file, cam_params, args.height, args.width, image_files)
+        results["gen_database"] = timeit(database, args.repeats)
+
+        ply_file = os.path.join(tmp_path, "points.ply")
+        results["write_ply.binary"] = timeit(lambda: write_ply(ply_file, points["xyz"], points["rgb"], "binary"), args.repeats)
+        results["write_ply.ascii"] = timeit(lambda: write_ply(ply_file, points["xyz"], points["rgb"], "ascii"), args.repeats)
+
+        # end-to-end script runs
+        if not args.skip_scripts:
+            common = ["--model_path", scene["model_path"], "--max_error", str(args.max_error), "--min_track_len", str(args.min_track_len)]
+            depth_path = os.path.join(tmp_path, "depths")
+            os.makedirs(depth_path)
+            sparse_args = [*common, "--cam_path", scene["cam_path"], "--image_path", scene["image_path"], "--output_path", depth_path]
+            results.update(run_script("colmap2sparse.py", sparse_args, os.path.join(tmp_path, "sparse.json")))
+            if args.open3d:
+                renders = run_script("colmap2sparse.py", [*sparse_args, "--renderer", "open3d"], os.path.join(tmp_path, "open3d.json"))
+                results.update({key.replace("colmap2sparse", "colmap2sparse_open3d"): value for key, value in renders.items()})
+            results.update(run_script("colmap2ply.py", [*common, "--output_file", ply_file], os.path.join(tmp_path, "ply.json")))
+
+    return results
+
+def compare(results, baseline):
+    print(f"\ncompared to {baseline['commit'][:10]}:")
+    for scale, timings in results.items():
+        if scale not in baseline["results"]:
+            continue
+        print(f"  {scale}")
+        for name, value in timings.items():
+            before = baseline["results"][scale].get(name)
+            if before is None:
+                continue
+            print(f"    {name:36s} {before * 1e3:10.2f} ms -> {value * 1e3:10.2f} ms ({before / max(value, 1e-12):.2f}x)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark of the sparse depth pipeline stages on synthetic scenes.')
+    parser.add_argument('--scales', type=str, nargs='+', help='Scene sizes as <num_points>:<num_cams>.', default=['10000:10', '100000:49', '1000000:49'])
+    parser.add_argument('--track_len', type=int, help='Number of observations per point.', default=4)
+    parser.add_argument('--width', type=int, help='Image width.', default=1600)
+    parser.add_argument('--height', type=int, help='Image height.', default=1200)
+    parser.add_argument('--max_error', type=float, help='Maximum point error threshold.', default=2.0)
+    parser.add_argument('--min_track_len', type=int, help='Minimum required point track length.', default=3)
+    parser.add_argument('--repeats', type=int, help='Number of timed repetitions (or views) per stage.', default=3)
+    parser.add_argument('--work_path', type=str, help='Directory of the generated scenes (temporary by default).')
+    parser.add_argument('--output_file', type=str, help='Output JSON results (defaults to benchmarks/results/<commit>.json).')
+    parser.add_argument('--compare', type=str, help='Previous JSON results to compare against.')
+    parser.add_argument('--skip_scripts', action='store_true', help='Only time the library functions, not the colmap2sparse/colmap2ply runs.')
+    parser.add_argument('--open3d', action='store_true', help='Also time colmap2sparse with the Open3D renderer.')
+    args = parser.parse_args(argv)
+
+    commit, dirty = git_revision()
+    work_path = args.work_path if args.work_path is not None else tempfile.mkdtemp(prefix="colmap_bench_")
+
+    results = {}
+    try:
+        for scale in args.scales:
+            num_points, num_cams = (int(v) for v in scale.split(":"))
+            print(f"{num_points} points, {num_cams} cameras")
+            results[scale] = bench_scale(os.path.join(work_path, scale.replace(":", "x")), num_points, num_cams, args)
+            for name, value in results[scale].items():
+                print(f"  {name:36s} {value * 1e3:10.2f} ms")
+    finally:
+        if args.work_path is None:
+            shutil.rmtree(work_path, ignore_errors=True)
+
+    output_file = args.output_file
+    if output_file is None:
+        output_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", f"{commit[:10]}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    with open(output_file, 'w') as of:
+        json.dump({
+            "commit": commit,
+            "dirty": dirty,
+            "time": time.time(),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "config": {k: v for k, v in vars(args).items() if k not in ["output_file", "compare", "work_path"]},
+            "results": results,
+        }, of, indent=2)
+    print(f"results written to {output_file}")
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as cf:
+            compare(results, json.load(cf))
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,176 @@
+import sys, os
+import struct
+import shutil
+import zlib
+import numpy as np
+from scipy.spatial.transform import Rotation
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import colmap_io
+
+def look_at_poses(num_cams, radius=3.0, height=0.5):
+    """Builds world-to-camera poses on a ring looking at the origin (Nx4x4)."""
+    angles = np.linspace(0, 2 * np.pi, num_cams, endpoint=False)
+    centers = np.stack([radius * np.cos(angles), np.full(num_cams, height), radius * np.sin(angles)], axis=1)
+
+    z = -centers / np.linalg.norm(centers, axis=1, keepdims=True)
+    x = np.cross(np.array([0.0, -1.0, 0.0]), z)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    y = np.cross(z, x)
+
+    poses = np.tile(np.eye(4), (num_cams, 1, 1))
+    poses[:,:3,:3] = np.stack([x, y, z], axis=1)
+    poses[:,:3,3] = -np.einsum("nij,nj->ni", poses[:,:3,:3], centers)
+    return poses
+
+def write_png(png_file, width, height):
+    """Writes a black 8-bit grayscale PNG without any imaging dependency."""
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    raw = b"".join(b"\x00" + bytes(width) for _ in range(height))
+    with open(png_file, 'wb') as pf:
+        pf.write(b"\x89PNG\r\n\x1a\n")
+        pf.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)))
+        pf.write(chunk(b"IDAT", zlib.compress(raw, 9)))
+        pf.write(chunk(b"IEND", b""))
+
+def write_cam_file(cam_file, pose, K, depth_min=0.5, depth_interval=0.01):
+    with open(cam_file, 'w') as cf:
+        cf.write("extrinsic\n")
+        cf.writelines(" ".join(str(v) for v in row) + "\n" for row in pose)
+        cf.write("\nintrinsic\n")
+        cf.writelines(" ".join(str(v) for v in row) + "\n" for row in K)
+        cf.write(f"\n{depth_min} {depth_interval}\n")
+
+def generate_scene(output_path, num_points, num_cams, track_len=4, width=640, height=480, seed=0):
+    """Generates a synthetic scene in the layout consumed by the sparse depth scripts.
+
+    Cameras are placed on a ring around a unit cube of points, so every point is visible
+    in every view. Each point is observed by track_len random views at its (noisy)
+    projection.
+
+    Parameters:
+        output_path: Output scene directory (cams/, imgs/, points3D.txt, images.txt, sparse/).
+        num_points: Number of 3D points.
+        num_cams: Number of cameras.
+        track_len: Number of observations per point.
+        width: Image width.
+        height: Image height.
+        seed: Random seed.
+
+    Returns:
+        Dictionary with the paths of the generated files.
+    """
+    rng = np.random.default_rng(seed)
+    track_len = min(track_len, num_cams)
+    cam_path = os.path.join(output_path, "cams")
+    image_path = os.path.join(output_path, "imgs")
+    sparse_path = os.path.join(output_path, "sparse")
+    for path in [cam_path, image_path, sparse_path]:
+        os.makedirs(path, exist_ok=True)
+
+    # cameras
+    poses = look_at_poses(num_cams)
+    focal = 0.8 * width
+    K = np.array([[focal, 0, width / 2], [0, focal, height / 2], [0, 0, 1.0]])
+    names = [f"{i:08d}.png" for i in range(num_cams)]
+    for i in range(num_cams):
+        write_cam_file(os.path.join(cam_path, f"{i:08d}_cam.txt"), poses[i], K)
+    write_png(os.path.join(image_path, names[0]), width, height)
+    for name in names[1:]:
+        shutil.copyfile(os.path.join(image_path, names[0]), os.path.join(image_path, name))
+
+    # points and their tracks (random distinct views per point)
+    xyz = rng.uniform(-0.5, 0.5, (num_points, 3))
+    track_views = np.argsort(rng.random((num_points, num_cams)), axis=1)[:,:track_len]
+    track_image_ids = (track_views + 1).astype(np.int32).ravel()
+    track_point_rows = np.repeat(np.arange(num_points), track_len)
+
+    # observations, grouped per image in point order
+    R = poses[track_views.ravel(),:3,:3]
+    t = poses[track_views.ravel(),:3,3]
+    cam_points = np.einsum("nij,nj->ni", R, xyz[track_point_rows]) + t
+    proj = cam_points @ K.T
+    xys = proj[:,:2] / proj[:,2:3] + rng.normal(0, 0.3, (proj.shape[0], 2))
+
+    order = np.argsort(track_image_ids, kind="stable")
+    counts = np.bincount(track_image_ids, minlength=num_cams+1)[1:]
+    points2d_offsets = np.concatenate([[0], np.cumsum(counts)])
+    point2d_ids = np.empty(order.shape[0], dtype=np.int32)
+    point2d_ids[order] = np.arange(order.shape[0]) - np.repeat(points2d_offsets[:-1], counts)
+
+    points = {
+        "ids": np.arange(1, num_points+1, dtype=np.int64),
+        "xyz": xyz,
+        "rgb": rng.integers(0, 256, (num_points, 3), dtype=np.uint8),
+        "error": rng.gamma(2.0, 0.5, num_points),
+        "track_offsets": np.arange(0, (num_points+1) * track_len, track_len, dtype=np.int64),
+        "track_image_ids": track_image_ids,
+        "track_point2d_ids": point2d_ids,
+    }
+    quats = Rotation.from_matrix(poses[:,:3,:3]).as_quat()
+    images = {
+        "ids": np.arange(1, num_cams+1, dtype=np.int32),
+        "qvec": quats[:,[3,0,1,2]],
+        "tvec": poses[:,:3,3],
+        "camera_ids": np.ones(num_cams, dtype=np.int32),
+        "names": names,
+        "points2d_offsets": points2d_offsets,
+        "xys": xys[order],
+        "point3d_ids": points["ids"][track_point_rows[order]],
+    }
+    cameras = {1: {"model": 1, "width": width, "height": height, "params": [focal, focal, width / 2, height / 2]}}
+
+    # text model
+    points_file = os.path.join(output_path, "points3D.txt")
+    with open(points_file, 'w') as pf:
+        pf.write("# 3D point list with one line of data per point:\n")
+        pf.write("#   POINT3D_ID, X, Y, Z, R, G, B, ERROR, TRACK[] as (IMAGE_ID, POINT2D_IDX)\n")
+        pf.write(f"# Number of points: {num_points}\n")
+        tracks = np.stack([track_image_ids, point2d_ids], axis=1).reshape(num_points, -1)
+        for i in range(num_points):
+            x, y, z = xyz[i]
+            r, g, b = points["rgb"][i]
+            pf.write(f"{i+1} {x} {y} {z} {r} {g} {b} {points['error'][i]} {' '.join(map(str, tracks[i]))}\n")
+
+    images_file = os.path.join(output_path, "images.txt")
+    with open(images_file, 'w') as imf:
+        imf.write("# Image list with two lines of data per image:\n")
+        imf.write("#   IMAGE_ID, QW, QX, QY, QZ, TX, TY, TZ, CAMERA_ID, NAME\n")
+        imf.write("#   POINTS2D[] as (X, Y, POINT3D_ID)\n")
+        imf.write(f"# Number of images: {num_cams}\n")
+        for i in range(num_cams):
+            start, end = points2d_offsets[i:i+2]
+            imf.write(f"{i+1} {' '.join(map(str, images['qvec'][i]))} {' '.join(map(str, images['tvec'][i]))} 1 {names[i]}\n")
+            imf.write(" ".join(f"{x} {y} {pid}" for (x, y), pid in zip(images["xys"][start:end], images["point3d_ids"][start:end])) + "\n")
+
+    # binary model
+    colmap_io.write_points3d_binary(os.path.join(sparse_path, "points3D.bin"), points)
+    colmap_io.write_images_binary(os.path.join(sparse_path, "images.bin"), images)
+    colmap_io.write_cameras_binary(os.path.join(sparse_path, "cameras.bin"), cameras)
+
+    return {
+        "cam_path": cam_path,
+        "image_path": image_path,
+        "points_file": points_file,
+        "images_file": images_file,
+        "model_path": sparse_path,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Script for generating a synthetic colmap scene.')
+    parser.add_argument('--output_path', type=str, help='Output scene directory.', required=True)
+    parser.add_argument('--num_points', type=int, help='Number of 3D points.', default=100000)
+    parser.add_argument('--num_cams', type=int, help='Number of cameras.', default=49)
+    parser.add_argument('--track_len', type=int, help='Number of observations per point.', default=4)
+    parser.add_argument('--width', type=int, help='Image width.', default=640)
+    parser.add_argument('--height', type=int, help='Image height.', default=480)
+    parser.add_argument('--seed', type=int, help='Random seed.', default=0)
+    args = parser.parse_args()
+
+    generate_scene(args.output_path, args.num_points, args.num_cams, args.track_len, args.width, args.height, args.seed)
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,31 @@
+import sys, os
+import importlib
+import argparse
+
+# subcommand -> (module, description); modules are only imported when their command runs
+COMMANDS = {
+    "database": ("database", "Create the colmap database and text model of a scene with known cameras."),
+    "pairs": ("pair_selection", "Select image pairs to match from known camera poses."),
+    "depth": ("colmap2sparse", "Convert colmap points into sparse depth maps."),
+    "ply": ("colmap2ply", "Export filtered colmap points as a PLY point cloud."),
+    "pipeline": ("pipeline", "Run the cached sparse depth pipeline on a scene."),
+    "batch": ("batch", "Run the pipeline on several scenes under a shared CPU budget."),
+}
+
+def main(argv=None):
+    epilog = "commands:\n" + "\n".join(f"  {name:10s}{description}" for name, (_, description) in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        description='Command line interface of the colmap sparse depth scripts.',
+        epilog=epilog,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('command', type=str, help='Command to run.', choices=COMMANDS, metavar='command')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='Arguments of the command (see <command> --help).')
+    args = parser.parse_args(argv)
+
+    module = importlib.import_module(COMMANDS[args.command][0])
+    module.parser.prog = f"{os.path.basename(sys.argv[0])} {args.command}"
+    module.main(args.args)
+
+if __name__=="__main__":
+    main()
@@ -1,53 +1,154 @@
-import sys, os
-import numpy as np
+import os
 import argparse
+import shutil
+import tempfile
 
-parser = argparse.ArgumentParser(description='Script for converting colmap points into sparse depth maps.')
-parser.add_argument('--points_file', type=str, help='Path to colmap points3d.txt file.', required=True)
+import colmap_io
+import model_cache
+import point_store
+import consistency
+from instrument import RunReport
+from ply_io import write_ply, write_tiles, voxel_downsample, PLY_CHUNK_SIZE
+from utils import list_images, common_image_size
+
+parser = argparse.ArgumentParser(description='Script for exporting filtered colmap points as a colored PLY point cloud.')
+parser.add_argument('--points_file', type=str, help='Path to colmap points3d.txt file.')
+parser.add_argument('--model_path', type=str, help='Path to colmap binary sparse model (replaces --points_file and --images_file).')
+parser.add_argument('--images_file', type=str, help='Path to colmap images.txt file (for --geometric_filter).')
+parser.add_argument('--cam_path', type=str, help='Path to scene cameras (for --geometric_filter).')
+parser.add_argument('--image_path', type=str, help='Path to scene images (for --geometric_filter).')
 parser.add_argument('--output_file', type=str, help='Output PLY file.', required=True)
 parser.add_argument('--max_error', type=float, help='Maximum point error threshold.', required=True)
 parser.add_argument('--min_track_len', type=int, help='Minimum required point track length.', required=True)
+parser.add_argument('--cache_dir', type=str, help='Directory of the parsed model cache.', default=model_cache.DEFAULT_CACHE_DIR)
+parser.add_argument('--cache_size', type=float, help='Maximum size of the parsed model cache (GB).', default=model_cache.DEFAULT_CACHE_SIZE / (1 << 30))
+parser.add_argument('--no_cache', action='store_true', help='Parse the model from scratch without using the cache.')
+parser.add_argument('--format', type=str, help='Output PLY encoding.', choices=['ascii', 'binary'], default='binary')
+parser.add_argument('--voxel_size', type=float, help='Replace the points of every voxel of this size by their centroid and mean color.')
+parser.add_argument('--tile_size', type=float, help='Also split the cloud into cubic tiles of this size (<output>_tiles/, indexed by tiles.json).')
+parser.add_argument('--chunk_size', type=int, help='Stream the points in chunks of this many points into on-disk columns instead of loading the whole model (bounds memory for models larger than RAM).')
+parser.add_argument('--spill_dir', type=str, help='Directory of the on-disk point columns used with --chunk_size (system temporary directory by default).')
+parser.add_argument('--geometric_filter', action='store_true', help='Also remove points behind or outside the cameras of their track, with a small triangulation angle, or isolated from their neighbors.')
+parser.add_argument('--min_tri_angle', type=float, help='Minimum triangulation angle of the geometric filter (degrees).', default=consistency.DEFAULT_MIN_TRI_ANGLE)
+parser.add_argument('--sor_neighbors', type=int, help='Number of neighbors of the statistical outlier test of the geometric filter (0 to skip it).', default=consistency.DEFAULT_SOR_NEIGHBORS)
+parser.add_argument('--sor_std_ratio', type=float, help='Number of standard deviations above the mean neighbor distance tolerated by the statistical outlier test.', default=consistency.DEFAULT_SOR_STD_RATIO)
+parser.add_argument('--report_file', type=str, help='Output JSON file of per-stage timings, memory and counts.')
+parser.add_argument('--profile_stage', type=str, help='Stage to run under cProfile (dumped to <report_file>.prof).')
+
+def load_points(points_file, output_file, max_error, min_track_len, ply_format="binary", cache_dir=None, cache_bytes=model_cache.DEFAULT_CACHE_SIZE, report=None, chunk_size=None, store_path=None, geometric=None, voxel_size=None, tile_size=None):
+    if report is None:
+        report = RunReport("colmap2ply")
+
+    if chunk_size is not None:
+        # out-of-core: filter chunk by chunk into memory-mapped columns under store_path
+        with report.stage("stream", chunk_size=chunk_size):
+            points, num_loaded = point_store.write_point_store(points_file, store_path, max_error, min_track_len, chunk_size)
+        report.count("points_loaded", num_loaded)
+        report.count("points_kept", int(points["xyz"].shape[0]))
+    else:
+        with report.stage("parse"):
+            points = model_cache.read_model(points_file, colmap_io.read_points3d, cache_dir, cache_bytes)
+        report.count("points_loaded", int(points["xyz"].shape[0]))
+
+        with report.stage("filter"):
+            points = colmap_io.filter_points(points, max_error, min_track_len)
+        report.count("points_kept", int(points["xyz"].shape[0]))
+
+        if geometric is not None:
+            # geometric is the keyword arguments of consistency.geometric_filter (cameras, image index, size, thresholds)
+            with report.stage("consistency"):
+                points, removed = consistency.geometric_filter(points, **geometric)
+            for criterion, count in removed.items():
+                report.count(f"points_removed_{criterion}", count)
+            report.count("points_kept", int(points["xyz"].shape[0]))
+
+    xyz, rgb = points["xyz"], points["rgb"]
+    write_chunk = chunk_size if chunk_size is not None else PLY_CHUNK_SIZE
+    if voxel_size is not None:
+        with report.stage("voxelize", voxel_size=voxel_size):
+            xyz, rgb = voxel_downsample(xyz, rgb, voxel_size, write_chunk)
+        report.count("voxels", int(xyz.shape[0]))
+
+    with report.stage("write", format=ply_format):
+        write_ply(output_file, xyz, rgb, ply_format, write_chunk)
+    report.count("bytes_written", os.path.getsize(output_file))
+
+    if tile_size is not None:
+        # tiles (and their index) go to <output>_tiles/ next to the full cloud
+        with report.stage("tiles", tile_size=tile_size):
+            tiles = write_tiles(tile_path(output_file), xyz, rgb, tile_size, ply_format, write_chunk)
+        report.count("tiles", len(tiles))
+
+    return points
+
+def tile_path(output_file):
+    return f"{os.path.splitext(output_file)[0]}_tiles"
+
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    if args.model_path is not None:
+        args.points_file = os.path.join(args.model_path, "points3D.bin")
+        args.images_file = os.path.join(args.model_path, "images.bin")
+    elif args.points_file is None:
+        parser.error("either --model_path or --points_file is required")
+    if args.geometric_filter and (args.images_file is None or args.cam_path is None or args.image_path is None):
+        parser.error("--geometric_filter requires --cam_path, --image_path and either --model_path or --images_file")
+    if args.voxel_size is not None and args.voxel_size <= 0:
+        parser.error("--voxel_size must be positive")
+    if args.tile_size is not None and args.tile_size <= 0:
+        parser.error("--tile_size must be positive")
+    if args.geometric_filter and args.chunk_size is not None:
+        parser.error("--geometric_filter cannot be combined with --chunk_size")
+    if args.chunk_size is not None and args.chunk_size < 1:
+        parser.error("--chunk_size must be positive")
+    if args.profile_stage is not None and args.report_file is None:
+        parser.error("--profile_stage requires --report_file")
+
+    report = RunReport("colmap2ply", args.profile_stage, f"{args.report_file}.prof" if args.report_file else None)
+    cache_dir = None if args.no_cache else args.cache_dir
+    cache_bytes = int(args.cache_size * (1 << 30))
+
+    geometric = None
+    if args.geometric_filter:
+        with report.stage("cameras"):
+            height, width = common_image_size(args.image_path, list_images(args.image_path))
+            cams = model_cache.read_cams(args.cam_path, cache_dir, cache_bytes)
+            images = model_cache.read_model(args.images_file, colmap_io.read_images, cache_dir, cache_bytes)
+        image_index = {int(name[:-4]): int(database_id) for database_id, name in zip(images["ids"], images["names"])}
+        geometric = {
+            "cams": cams,
+            "image_index": image_index,
+            "width": width,
+            "height": height,
+            "min_tri_angle": args.min_tri_angle,
+            "sor_neighbors": args.sor_neighbors,
+            "sor_std_ratio": args.sor_std_ratio,
+        }
+
+    store_path = tempfile.mkdtemp(prefix="colmap2ply_", dir=args.spill_dir) if args.chunk_size is not None else None
+    try:
+        points = load_points(
+            args.points_file,
+            args.output_file,
+            args.max_error,
+            args.min_track_len,
+            args.format,
+            cache_dir=cache_dir,
+            cache_bytes=cache_bytes,
+            report=report,
+            chunk_size=args.chunk_size,
+            store_path=store_path,
+            geometric=geometric,
+            voxel_size=args.voxel_size,
+            tile_size=args.tile_size,
+        )
+    finally:
+        if store_path is not None:
+            shutil.rmtree(store_path, ignore_errors=True)
 
-ARGS = parser.parse_args()
-
-def load_points(points_file, output_file, max_error, min_track_len):
-    points = []
-    with open(points_file, 'r') as pf:
-        lines = pf.readlines()[3:]
-
-        for i, l in enumerate(lines):
-            l = l.strip().split()
-            point = l[1:7]
-            error = float(l[7])
-            track = l[8:]
-            track_len = len(track) // 2
-            
-            if error <= max_error and track_len >= min_track_len:
-                points.append(np.asarray(point))
-
-    # write header meta-data
-    ply_str = ""
-    ply_str += "ply\n"
-    ply_str += "format ascii 1.0\n"
-    ply_str += "comment Right-Handed System\n"
-    ply_str += f"element vertex {len(points)}\n"
-    ply_str += "property float x\n"
-    ply_str += "property float y\n"
-    ply_str += "property float z\n"
-    ply_str += "property uchar red\n"
-    ply_str += "property uchar green\n"
-    ply_str += "property uchar blue\n"
-    ply_str += "end_header\n"
-
-    for point in points:
-        ply_str += f"{point[0]} {point[1]} {point[2]} {point[3]} {point[4]} {point[5]}\n"
-
-    with open(output_file, 'w') as of:
-        of.write(ply_str)
-
-
-def main():
-    points = load_points(ARGS.points_file, ARGS.output_file, ARGS.max_error, ARGS.min_track_len)
+    if args.report_file is not None:
+        report.write(args.report_file)
 
 
 if __name__=="__main__":
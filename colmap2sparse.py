@@ -1,73 +1,122 @@
-import sys, os
+import os
+import json
+import hashlib
 import numpy as np
-import cv2
-import open3d as o3d
 from tqdm import tqdm
-from numpy import inf
 import argparse
+import time
+import shutil
+import tempfile
+from multiprocessing import Pool, shared_memory
 
-from utils import render_point_cloud
-from utils import read_cams_sfm, read_point_cloud, write_pfm
+import colmap_io
+import model_cache
+import point_store
+import consistency
+from instrument import RunReport
+from visibility import VisibilityIndex
+from sparse_depth import write_sparse_depth
+from utils import zbuffer_pyramid, observation_pyramid
+from utils import list_images, common_image_size, scale_intrinsics, write_cam_sfm, write_pfm, DEFAULT_POINT_SIZE
 
 parser = argparse.ArgumentParser(description='Script for converting colmap points into sparse depth maps.')
-parser.add_argument('--points_file', type=str, help='Path to colmap points3d.txt file.', required=True)
+parser.add_argument('--points_file', type=str, help='Path to colmap points3d.txt file.')
 parser.add_argument('--cam_path', type=str, help='Path to scene cameras.', required=True)
 parser.add_argument('--image_path', type=str, help='Path to scene images.', required=True)
-parser.add_argument('--images_file', type=str, help='Path to colmap images.txt file.', required=True)
+parser.add_argument('--images_file', type=str, help='Path to colmap images.txt file.')
+parser.add_argument('--model_path', type=str, help='Path to colmap binary sparse model (replaces --points_file and --images_file).')
 parser.add_argument('--output_path', type=str, help='Sparse depth output path.', required=True)
 parser.add_argument('--max_error', type=float, help='Maximum point error threshold.', required=True)
 parser.add_argument('--min_track_len', type=int, help='Minimum required point track length.', required=True)
+parser.add_argument('--cache_dir', type=str, help='Directory of the parsed model cache.', default=model_cache.DEFAULT_CACHE_DIR)
+parser.add_argument('--cache_size', type=float, help='Maximum size of the parsed model cache (GB).', default=model_cache.DEFAULT_CACHE_SIZE / (1 << 30))
+parser.add_argument('--no_cache', action='store_true', help='Parse the model from scratch without using the cache.')
+parser.add_argument('--chunk_size', type=int, help='Stream the points in chunks of this many points into on-disk columns instead of loading the whole model (bounds memory for models larger than RAM).')
+parser.add_argument('--spill_dir', type=str, help='Directory of the on-disk point columns used with --chunk_size (system temporary directory by default).')
+parser.add_argument('--geometric_filter', action='store_true', help='Also remove points behind or outside the cameras of their track, with a small triangulation angle, or isolated from their neighbors.')
+parser.add_argument('--min_tri_angle', type=float, help='Minimum triangulation angle of the geometric filter (degrees).', default=consistency.DEFAULT_MIN_TRI_ANGLE)
+parser.add_argument('--sor_neighbors', type=int, help='Number of neighbors of the statistical outlier test of the geometric filter (0 to skip it).', default=consistency.DEFAULT_SOR_NEIGHBORS)
+parser.add_argument('--sor_std_ratio', type=float, help='Number of standard deviations above the mean neighbor distance tolerated by the statistical outlier test.', default=consistency.DEFAULT_SOR_STD_RATIO)
+parser.add_argument('--workers', type=int, help='Number of worker processes used to render the depth maps.', default=1)
+parser.add_argument('--depth_format', type=str, help='Output format of the depth maps.', choices=['pfm', 'sparse'], default='pfm')
+parser.add_argument('--point_info', action='store_true', help='Also store the point id, reprojection error and track length of each pixel (a sparse <view>_aux.npz next to each PFM).')
+parser.add_argument('--report_file', type=str, help='Output JSON file of per-stage timings, memory and counts.')
+parser.add_argument('--profile_stage', type=str, help='Stage to run under cProfile (dumped to <report_file>.prof).')
+parser.add_argument('--incremental', action='store_true', help='Only regenerate the depth maps of views whose points, pose or options changed since the last run.')
+parser.add_argument('--scales', type=int, nargs='+', help='Downscaling factors of the written depth maps (levels other than 1 go to <output_path>/scale_<factor>/ with their scaled cameras).', default=[1])
+parser.add_argument('--point_size', type=int, help='Splat size of every point in pixels (the point size of the Open3D renderer by default, 1 for one pixel per point).', default=DEFAULT_POINT_SIZE)
+parser.add_argument('--renderer', type=str, help="Depth rendering backend ('tracks' places each observation at its measured keypoint).", choices=['numpy', 'open3d', 'tracks'], default='numpy')
 
-ARGS = parser.parse_args()
+def load_points(points_file, max_error, min_track_len, cache_dir=None, cache_bytes=model_cache.DEFAULT_CACHE_SIZE, report=None, chunk_size=None, store_path=None, geometric=None):
+    if report is None:
+        report = RunReport("load_points")
 
+    if chunk_size is not None:
+        # out-of-core: filter chunk by chunk into memory-mapped columns under store_path
+        with report.stage("stream", chunk_size=chunk_size):
+            points, num_loaded = point_store.write_point_store(points_file, store_path, max_error, min_track_len, chunk_size)
+        report.count("points_loaded", num_loaded)
+        report.count("points_kept", int(points["xyz"].shape[0]))
+        report.count("points_filtered", num_loaded - report.counters["points_kept"])
 
+        with report.stage("index"):
+            visibility = point_store.build_visibility(points, store_path, chunk_size)
+        report.count("observations", int(visibility.point_inds.shape[0]))
+        return visibility, points
 
+    with report.stage("parse"):
+        points = model_cache.read_model(points_file, colmap_io.read_points3d, cache_dir, cache_bytes)
+    report.count("points_loaded", int(points["xyz"].shape[0]))
 
-def load_points(points_file, max_error, min_track_len):
-    points = {}
-    tracks = {}
-    points_per_id = {}
-    with open(points_file, 'r') as pf:
-        lines = pf.readlines()[3:]
+    with report.stage("filter"):
+        points = colmap_io.filter_points(points, max_error, min_track_len)
+    report.count("points_kept", int(points["xyz"].shape[0]))
+    report.count("points_filtered", report.counters["points_loaded"] - report.counters["points_kept"])
 
-        ind = 0
-        for l in lines:
-            l = l.strip().split()
-            point = np.asarray(l[1:4]).astype(np.float32)
-            error = float(l[7])
-            track = np.asarray(l[8::2]).astype(np.int16)
-            track_len = track.shape[0]
-            
-            if error <= max_error and track_len >= min_track_len:
-                points[ind] = point
-                tracks[ind] = track
-                ind += 1
+    if geometric is not None:
+        # geometric is the keyword arguments of consistency.geometric_filter (cameras, image index, size, thresholds)
+        with report.stage("consistency"):
+            points, removed = consistency.geometric_filter(points, **geometric)
+        for criterion, count in removed.items():
+            report.count(f"points_removed_{criterion}", count)
+        report.count("points_kept", int(points["xyz"].shape[0]))
+        report.count("points_filtered", report.counters["points_loaded"] - report.counters["points_kept"])
 
-                for ind in track:
-                    if ind in points_per_id.keys():
-                        points_per_id[ind].append(point)
-                    else:
-                        points_per_id[ind] = [point]
+    with report.stage("index"):
+        visibility = VisibilityIndex.from_points(points)
+    report.count("observations", int(visibility.point_inds.shape[0]))
 
-    return points_per_id, points, tracks
+    return visibility, points
 
 def build_index(images_file):
+    if images_file.endswith(".bin"):
+        images = colmap_io.read_images_binary(images_file)
+        image_index = {int(name[:-4]): int(database_id) for database_id, name in zip(images["ids"], images["names"])}
+        return len(image_index), image_index
+
+    num_images = None
+    image_index = {}
     with open(images_file, 'r') as imf:
-        lines = imf.readlines()
-        num_images = lines[3]
-        lines = lines[4::2]
-        image_index = {}
+        data_lines = 0
+        for line in imf:
+            if data_lines == 0 and line.startswith('#'):
+                # e.g. "# Number of images: 49, mean observations per image: 1234.5"
+                if line.startswith("# Number of images:"):
+                    num_images = int(line.split(':')[1].split(',')[0])
+                continue
+
+            # every image has a header line followed by its (possibly empty) POINTS2D line
+            if data_lines % 2 == 0 and line.strip():
+                fields = line.split()
+                image_index[int(fields[-1][:-4])] = int(fields[0])
+            data_lines += 1
 
-        for line in lines:
-            line = line.strip().split()
-            database_id = int(line[0])
-            image_id = int(line[-1][:-4])
-            image_index[image_id] = database_id
+    return (num_images if num_images is not None else len(image_index)), image_index
 
-    return num_images, image_index
 
+def render_depth(pose, K, points, width, height, point_size=DEFAULT_POINT_SIZE):
+    import open3d as o3d
 
-def render_depth(pose, K, points, width, height):
     # create open3d point cloud
     cloud = o3d.geometry.PointCloud()
     cloud.points = o3d.utility.Vector3dVector(points)
@@ -76,6 +125,7 @@ def render_depth(pose, K, points, width, height):
     render = o3d.visualization.rendering.OffscreenRenderer(width, height)
     mat = o3d.visualization.rendering.MaterialRecord()
     mat.shader = 'defaultUnlit'
+    mat.point_size = point_size
     render.scene.add_geometry("cloud", cloud, mat)
     render.scene.set_background(np.asarray([0,0,0,1])) #r,g,b,a
     intrins = o3d.camera.PinholeCameraIntrinsic(width, height, K[0,0], K[1,1], K[0,2], K[1,2])
@@ -84,30 +134,429 @@ def render_depth(pose, K, points, width, height):
 
     return depth
 
-def main():
-    # get image shape
-    images = os.listdir(ARGS.image_path)
-    images.sort()
-    img = cv2.imread(os.path.join(ARGS.image_path,images[0]))
-    h,w,_ = img.shape
+def write_atomic(write_fn, output_file, *args, **kwargs):
+    # write to a temporary file first so readers never see a partial depth map
+    tmp_file = f"{output_file}.tmp"
+    write_fn(tmp_file, *args, **kwargs)
+    os.replace(tmp_file, output_file)
 
-    # read in data
-    cams = read_cams_sfm(ARGS.cam_path)
-
-    # read point cloud
-    _, image_index = build_index(ARGS.images_file)
-    points_per_id, _, _ = load_points(ARGS.points_file, ARGS.max_error, ARGS.min_track_len)
-
-    for i,cam in enumerate(cams):
-        pose = cam[0]
-        K = cam[1]
-        
-        database_id = image_index[i]
-        points = np.asarray(points_per_id[database_id]).astype(np.float64)
-        depth = render_depth(pose, K, points, w, h)
+def share_array(array):
+    if isinstance(array, np.memmap) and array.base is not None:
+        # on-disk columns are reopened by the workers instead of copied into memory
+        return None, (array.filename, array.shape, array.dtype.str, array.offset)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    shared[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str, None)
+
+def attach_array(spec):
+    name, shape, dtype, offset = spec
+    if offset is not None:
+        return None, np.memmap(name, dtype=np.dtype(dtype), mode='r', shape=shape, offset=offset)
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+def match_observations(obs_point_ids, point_ids):
+    # row of each observation's 3D point in the filtered point table, -1 if filtered out
+    point_rows = np.full(obs_point_ids.shape[0], -1, dtype=np.int64)
+    if point_ids.shape[0] == 0:
+        return point_rows
+
+    sorter = np.argsort(point_ids)
+    pos = np.searchsorted(point_ids, obs_point_ids, sorter=sorter)
+    rows = sorter[np.minimum(pos, point_ids.shape[0]-1)]
+    found = point_ids[rows] == obs_point_ids
+    point_rows[found] = rows[found]
+    return point_rows
+
+# per-process state used by process_view
+WORKER_STATE = {}
+
+def set_worker_state(arrays, options):
+    WORKER_STATE["arrays"] = arrays
+    WORKER_STATE["visibility"] = VisibilityIndex.from_csr(arrays["xyz"], arrays["image_ids"], arrays["row_ptr"], arrays["point_inds"])
+    WORKER_STATE["options"] = options
+
+def init_worker(specs, options):
+    handles = {}
+    arrays = {}
+    for key, spec in specs.items():
+        handles[key], arrays[key] = attach_array(spec)
+    WORKER_STATE["handles"] = handles
+    set_worker_state(arrays, options)
+
+def project_view(pose, K, database_id, image_row):
+    options = WORKER_STATE["options"]
+    arrays = WORKER_STATE["arrays"]
+    visibility = WORKER_STATE["visibility"]
+    width, height, renderer = options["width"], options["height"], options["renderer"]
+    scales, point_size = options["scales"], options["point_size"]
+
+    if renderer == 'open3d':
+        depth = render_depth(pose, K, visibility.points(database_id), width, height, point_size)
         depth = np.nan_to_num(depth)
         depth[depth>=1e5] = 0.0
-        write_pfm(os.path.join(ARGS.output_path,f"{i:08d}.pfm"), depth)
+        pixels = np.flatnonzero(depth)
+        return [(pixels, depth.flat[pixels], None)]
+
+    if renderer == 'tracks':
+        # observed keypoints of this view joined against the filtered points
+        start, end = arrays["obs_offsets"][image_row:image_row+2]
+        point_rows = arrays["obs_point_rows"][start:end]
+        valid = point_rows >= 0
+        candidates = point_rows[valid]
+        xys = arrays["obs_xys"][start:end][valid]
+        levels = observation_pyramid(pose, xys, visibility.xyz[candidates], width, height, scales, point_size)
+    else:
+        # a single projection shared by every level
+        candidates = visibility.point_indices(database_id)
+        levels = zbuffer_pyramid(pose, K, visibility.xyz[candidates], width, height, scales, point_size)
+
+    return [(pixels, z, candidates[winners]) for pixels, z, winners in levels]
+
+def write_view(output_file, pixels, z, point_inds, width, height):
+    options = WORKER_STATE["options"]
+    arrays = WORKER_STATE["arrays"]
+
+    # auxiliary maps of the same nearest-depth winners
+    point_info = {}
+    if point_inds is not None and "point_ids" in arrays:
+        point_info = {
+            "point_ids": arrays["point_ids"][point_inds],
+            "errors": arrays["errors"][point_inds],
+            "track_lens": arrays["track_lens"][point_inds],
+        }
+
+    if options["depth_format"] == 'pfm':
+        depth = np.zeros((height, width), dtype=np.float32)
+        depth.flat[pixels] = z
+        write_atomic(write_pfm, output_file, depth)
+        if point_info:
+            write_atomic(write_sparse_depth, aux_file(output_file), pixels, z, (height, width), **point_info)
+        return
+
+    # sparse output stores only the covered pixels
+    write_atomic(write_sparse_depth, output_file, pixels, z, (height, width), **point_info)
+
+def aux_file(output_file):
+    return f"{os.path.splitext(output_file)[0]}_aux.npz"
+
+def level_file(output_file, scale):
+    # full resolution maps stay in the output path, other levels go to scale_<factor>/
+    if scale == 1:
+        return output_file
+    return os.path.join(os.path.dirname(output_file), f"scale_{scale}", os.path.basename(output_file))
+
+def level_cam_file(output_file, scale):
+    return f"{os.path.splitext(level_file(output_file, scale))[0]}_cam.txt"
+
+def view_outputs(output_file, options, point_info):
+    outputs = []
+    for scale in options["scales"]:
+        outputs.append(level_file(output_file, scale))
+        if point_info and options["depth_format"] == 'pfm':
+            outputs.append(aux_file(level_file(output_file, scale)))
+        if scale != 1:
+            outputs.append(level_cam_file(output_file, scale))
+    return outputs
+
+def process_view(task):
+    i, pose, K, database_id, image_row, output_file = task
+    options = WORKER_STATE["options"]
+
+    start = time.perf_counter()
+    levels = project_view(pose, K, database_id, image_row)
+    projected = time.perf_counter()
+    for scale, (pixels, z, point_inds) in zip(options["scales"], levels):
+        write_view(level_file(output_file, scale), pixels, z, point_inds, options["width"] // scale, options["height"] // scale)
+        if scale != 1:
+            write_atomic(write_cam_sfm, level_cam_file(output_file, scale), np.stack([pose, scale_intrinsics(K, scale)]))
+    written = time.perf_counter()
+
+    return i, {"project_time_s": projected - start, "write_time_s": written - projected, "pixels_written": sum(int(level[0].shape[0]) for level in levels)}
+
+# signature of every written view, used to skip unchanged views in incremental runs
+DEPTH_MANIFEST = "depth_manifest.json"
+
+# number of written views between two saves of the manifest during an incremental run
+MANIFEST_SAVE_INTERVAL = 64
+
+def view_signature(task, arrays, options, visibility):
+    # hash of everything the depth map of a view is computed from
+    i, pose, K, database_id, image_row, output_file = task
+    h = hashlib.sha256(json.dumps(options, sort_keys=True).encode())
+    h.update(np.ascontiguousarray(pose, dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(K, dtype=np.float64).tobytes())
+
+    if options["renderer"] == 'tracks':
+        start, end = arrays["obs_offsets"][image_row:image_row+2]
+        point_rows = arrays["obs_point_rows"][start:end]
+        h.update(np.ascontiguousarray(arrays["obs_xys"][start:end]).tobytes())
+        h.update((point_rows >= 0).tobytes())
+        candidates = point_rows[point_rows >= 0]
+    else:
+        candidates = visibility.point_indices(database_id)
+
+    h.update(visibility.xyz[candidates].tobytes())
+    if "point_ids" in arrays:
+        h.update(arrays["point_ids"][candidates].tobytes())
+        h.update(arrays["errors"][candidates].tobytes())
+        h.update(arrays["track_lens"][candidates].tobytes())
+    return h.hexdigest()
+
+def load_manifest(manifest_file):
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, 'r') as mf:
+        return json.load(mf)
+
+def save_manifest(manifest_file, manifest):
+    tmp_file = f"{manifest_file}.tmp"
+    with open(tmp_file, 'w') as mf:
+        json.dump(manifest, mf)
+    os.replace(tmp_file, manifest_file)
+
+def record_view(report, stats):
+    for key, value in stats.items():
+        report.count(key, value, accumulate=True)
+    report.count("views_written", 1, accumulate=True)
+
+def generate_depths(
+    points_file,
+    images_file,
+    cam_path,
+    image_path,
+    output_path,
+    max_error,
+    min_track_len,
+    workers=1,
+    depth_format="pfm",
+    point_info=False,
+    renderer="numpy",
+    scales=(1,),
+    point_size=DEFAULT_POINT_SIZE,
+    cache_dir=None,
+    cache_bytes=model_cache.DEFAULT_CACHE_SIZE,
+    incremental=False,
+    chunk_size=None,
+    spill_dir=None,
+    geometric_filter=False,
+    min_tri_angle=consistency.DEFAULT_MIN_TRI_ANGLE,
+    sor_neighbors=consistency.DEFAULT_SOR_NEIGHBORS,
+    sor_std_ratio=consistency.DEFAULT_SOR_STD_RATIO,
+    report=None,
+):
+    """Writes the sparse depth map of every camera of a scene.
+
+    Parameters:
+        points_file: Colmap points3D file (text or binary).
+        images_file: Colmap images file (text or binary).
+        cam_path: Path to scene cameras.
+        image_path: Path to scene images.
+        output_path: Sparse depth output path.
+        max_error: Maximum point error threshold.
+        min_track_len: Minimum required point track length.
+        workers: Number of worker processes used to render the depth maps.
+        depth_format: Output format of the depth maps ('pfm' or 'sparse').
+        point_info: Store the point id, error and track length of each pixel (a sparse <view>_aux.npz next to each PFM).
+        renderer: Depth rendering backend ('numpy', 'open3d' or 'tracks').
+        scales: Downscaling factors of the written depth maps (levels other than 1 go to <output_path>/scale_<factor>/).
+        point_size: Splat size of every point in pixels (nearest depth over the footprint).
+        incremental: Only regenerate the views whose inputs changed since the last run.
+        cache_dir: Directory of the parsed model cache (None to disable the cache).
+        cache_bytes: Maximum size of the parsed model cache.
+        chunk_size: Stream the points in chunks of this many points into on-disk columns (None to load the whole model).
+        spill_dir: Directory of the on-disk point columns (system temporary directory if None).
+        geometric_filter: Also remove the points that fail the checks of consistency.geometric_filter.
+        min_tri_angle: Minimum triangulation angle of the geometric filter (degrees).
+        sor_neighbors: Number of neighbors of the statistical outlier test (0 to skip it).
+        sor_std_ratio: Number of standard deviations above the mean neighbor distance tolerated.
+        report: Run report collecting the stage timings.
+    """
+    if report is None:
+        report = RunReport("colmap2sparse")
+
+    # get image shape (from the headers of all images, which must share a size)
+    images = list_images(image_path)
+    with report.stage("image_size"):
+        h,w = common_image_size(image_path, images)
+
+    # read in data
+    with report.stage("cameras"):
+        cams = model_cache.read_cams(cam_path, cache_dir, cache_bytes)
+    report.count("views", len(cams))
+
+    store_path = tempfile.mkdtemp(prefix="colmap2sparse_", dir=spill_dir) if chunk_size is not None else None
+    try:
+        if renderer == 'tracks':
+            # stream the POINTS2D rows instead of re-projecting the points
+            with report.stage("images"):
+                images = model_cache.read_model(images_file, colmap_io.read_images, cache_dir, cache_bytes)
+            image_index = {int(name[:-4]): int(database_id) for database_id, name in zip(images["ids"], images["names"])}
+            image_rows = {int(database_id): row for row, database_id in enumerate(images["ids"])}
+        else:
+            with report.stage("images"):
+                _, image_index = build_index(images_file)
+            image_rows = {}
+
+        geometric = None
+        if geometric_filter:
+            geometric = {
+                "cams": cams,
+                "image_index": image_index,
+                "width": w,
+                "height": h,
+                "min_tri_angle": min_tri_angle,
+                "sor_neighbors": sor_neighbors,
+                "sor_std_ratio": sor_std_ratio,
+            }
+
+        # read point cloud
+        visibility, points = load_points(points_file, max_error, min_track_len, cache_dir, cache_bytes, report, chunk_size, store_path, geometric)
+        arrays = {
+            "xyz": visibility.xyz,
+            "image_ids": visibility.image_ids,
+            "row_ptr": visibility.row_ptr,
+            "point_inds": visibility.point_inds,
+        }
+        if point_info:
+            arrays["point_ids"] = points["ids"]
+            arrays["errors"] = points["error"]
+            arrays["track_lens"] = points["track_lens"] if "track_lens" in points else np.diff(points["track_offsets"])
+
+        if renderer == 'tracks':
+            arrays["obs_offsets"] = images["points2d_offsets"]
+            arrays["obs_xys"] = images["xys"]
+            with report.stage("join"):
+                arrays["obs_point_rows"] = match_observations(images["point3d_ids"], points["ids"])
+
+        extension = "pfm" if depth_format == 'pfm' else "npz"
+        tasks = [
+            (i, cam[0], cam[1], image_index[i], image_rows.get(image_index[i]), os.path.join(output_path,f"{i:08d}.{extension}"))
+            for i,cam in enumerate(cams)
+        ]
+        options = {
+            "width": w,
+            "height": h,
+            "renderer": renderer,
+            "depth_format": depth_format,
+            "scales": [int(scale) for scale in scales],
+            "point_size": int(point_size),
+        }
+        for scale in options["scales"]:
+            if scale != 1:
+                os.makedirs(os.path.join(output_path, f"scale_{scale}"), exist_ok=True)
+
+        if incremental:
+            # skip views whose points, pose and options are unchanged since the last run
+            manifest_file = os.path.join(output_path, DEPTH_MANIFEST)
+            with report.stage("signatures"):
+                previous = load_manifest(manifest_file)
+                signatures = {str(task[0]): view_signature(task, arrays, options, visibility) for task in tasks}
+            outputs_exist = lambda output_file: all(os.path.exists(output) for output in view_outputs(output_file, options, point_info))
+            tasks = [task for task in tasks if previous.get(str(task[0])) != signatures[str(task[0])] or not outputs_exist(task[5])]
+            report.count("views_skipped", len(signatures) - len(tasks))
+
+            # views are only recorded once written, so an interrupted run resumes correctly
+            manifest = {key: value for key, value in previous.items() if key in signatures and value == signatures[key]}
+            save_manifest(manifest_file, manifest)
+
+            def view_written(i):
+                manifest[str(i)] = signatures[str(i)]
+                if len(manifest) % MANIFEST_SAVE_INTERVAL == 0:
+                    save_manifest(manifest_file, manifest)
+        else:
+            view_written = None
+
+        with report.stage("views", workers=workers):
+            render_views(tasks, arrays, options, workers, report, view_written)
+
+        if incremental:
+            save_manifest(manifest_file, signatures)
+    finally:
+        if store_path is not None:
+            shutil.rmtree(store_path, ignore_errors=True)
+
+def render_views(tasks, arrays, options, workers, report, view_written=None):
+    # view_written is called with the index of every view once its outputs are written
+    if workers <= 1:
+        set_worker_state(arrays, options)
+        for task in tqdm(tasks, desc="Sparse depths", unit="view"):
+            i, stats = process_view(task)
+            record_view(report, stats)
+            if view_written is not None:
+                view_written(i)
+        return
+
+    # share the index arrays with the workers instead of pickling them per task
+    handles = {}
+    specs = {}
+    for key, array in arrays.items():
+        handles[key], specs[key] = share_array(array if isinstance(array, np.memmap) else np.ascontiguousarray(array))
+    try:
+        with Pool(workers, initializer=init_worker, initargs=(specs, options)) as pool:
+            for i, stats in tqdm(pool.imap(process_view, tasks), total=len(tasks), desc="Sparse depths", unit="view"):
+                record_view(report, stats)
+                if view_written is not None:
+                    view_written(i)
+    finally:
+        for shm in handles.values():
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    if args.model_path is not None:
+        args.points_file = os.path.join(args.model_path, "points3D.bin")
+        args.images_file = os.path.join(args.model_path, "images.bin")
+    elif args.points_file is None or args.images_file is None:
+        parser.error("either --model_path or both --points_file and --images_file are required")
+    if args.point_info and args.renderer == 'open3d':
+        parser.error("--point_info requires the numpy or tracks renderer")
+    if any(scale < 1 for scale in args.scales):
+        parser.error("--scales must be positive integers")
+    if args.point_size < 1:
+        parser.error("--point_size must be positive")
+    if args.scales != [1] and args.renderer == 'open3d':
+        parser.error("--scales requires the numpy or tracks renderer")
+    if args.chunk_size is not None and args.chunk_size < 1:
+        parser.error("--chunk_size must be positive")
+    if args.geometric_filter and args.chunk_size is not None:
+        parser.error("--geometric_filter cannot be combined with --chunk_size")
+    if args.profile_stage is not None and args.report_file is None:
+        parser.error("--profile_stage requires --report_file")
+
+    report = RunReport("colmap2sparse", args.profile_stage, f"{args.report_file}.prof" if args.report_file else None)
+    generate_depths(
+        args.points_file,
+        args.images_file,
+        args.cam_path,
+        args.image_path,
+        args.output_path,
+        args.max_error,
+        args.min_track_len,
+        workers=args.workers,
+        depth_format=args.depth_format,
+        point_info=args.point_info,
+        renderer=args.renderer,
+        scales=list(dict.fromkeys(args.scales)),
+        point_size=args.point_size,
+        incremental=args.incremental,
+        chunk_size=args.chunk_size,
+        spill_dir=args.spill_dir,
+        geometric_filter=args.geometric_filter,
+        min_tri_angle=args.min_tri_angle,
+        sor_neighbors=args.sor_neighbors,
+        sor_std_ratio=args.sor_std_ratio,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        cache_bytes=int(args.cache_size * (1 << 30)),
+        report=report,
+    )
+
+    if args.report_file is not None:
+        report.write(args.report_file)
 
 if __name__=="__main__":
     main()
@@ -0,0 +1,532 @@
+import mmap
+import struct
+import itertools
+import warnings
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# number of intrinsic parameters per colmap camera model id
+CAMERA_MODEL_NUM_PARAMS = {
+    0: 3,   # SIMPLE_PINHOLE
+    1: 4,   # PINHOLE
+    2: 4,   # SIMPLE_RADIAL
+    3: 5,   # RADIAL
+    4: 8,   # OPENCV
+    5: 8,   # OPENCV_FISHEYE
+    6: 12,  # FULL_OPENCV
+    7: 5,   # FOV
+    8: 4,   # SIMPLE_RADIAL_FISHEYE
+    9: 5,   # RADIAL_FISHEYE
+    10: 12, # THIN_PRISM_FISHEYE
+    11: 16, # RAD_TAN_THIN_PRISM_FISHEYE
+}
+
+POINT3D_HEADER_DTYPE = np.dtype([
+    ("id", "<u8"),
+    ("xyz", "<f8", (3,)),
+    ("rgb", "u1", (3,)),
+    ("error", "<f8"),
+    ("track_len", "<u8"),
+])
+
+TRACK_ELEM_DTYPE = np.dtype([("image_id", "<i4"), ("point2d_id", "<i4")])
+
+POINT2D_DTYPE = np.dtype([("xy", "<f8", (2,)), ("point3d_id", "<i8")])
+
+IMAGE_HEADER_DTYPE = np.dtype([
+    ("id", "<i4"),
+    ("qvec", "<f8", (4,)),
+    ("tvec", "<f8", (3,)),
+    ("camera_id", "<i4"),
+])
+
+# number of points3D.txt lines parsed at a time, which bounds the size of the token buffers
+TEXT_BLOCK_SIZE = 1 << 16
+
+def _map_file(model_file: str) -> mmap.mmap:
+    """Memory-maps a binary model file for reading."""
+    with open(model_file, 'rb') as mf:
+        return mmap.mmap(mf.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _gather_records(buf: np.ndarray, starts: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    """Gathers fixed-size records stored at arbitrary byte offsets of a buffer."""
+    if starts.shape[0] == 0:
+        return np.zeros(0, dtype=dtype)
+    # every record is one row of a sliding window over the bytes, so whole rows are copied at once
+    return sliding_window_view(buf, dtype.itemsize)[starts].view(dtype)[:,0]
+
+def _gather_runs(buf: np.ndarray, starts: np.ndarray, counts: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    """Concatenates the runs of counts[i] consecutive records of dtype stored from byte offsets starts[i]."""
+    offsets = np.zeros(starts.shape[0] + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    record_starts = np.repeat(starts - (dtype.itemsize * offsets[:-1]), counts)
+    record_starts += np.arange(0, dtype.itemsize * offsets[-1], dtype.itemsize)
+    return _gather_records(buf, record_starts, dtype)
+
+def read_points3d_text(points_file: str) -> dict:
+    """Reads a colmap points3D.txt file into columnar arrays.
+
+    The point tracks are stored in CSR layout: the track of point i is given by
+    track_image_ids[track_offsets[i]:track_offsets[i+1]].
+
+    Parameters:
+        points_file: Path to the colmap points3D.txt file.
+
+    Returns:
+        Dictionary of point ids (N), xyz (Nx3), rgb (Nx3), error (N), track_offsets (N+1),
+        track_image_ids (T) and track_point2d_ids (T).
+    """
+    return concat_points3d(list(iter_points3d_text(points_file, TEXT_BLOCK_SIZE)))
+
+def _parse_points3d_lines(lines: list) -> dict:
+    """Parses stripped, non-comment points3D.txt lines into columnar arrays."""
+    if not lines:
+        return _empty_points3d()
+
+    # parse every token of the block in a single pass (any run of whitespace separates tokens)
+    counts = np.fromiter((len(l.split()) for l in lines), dtype=np.int64, count=len(lines))
+    with warnings.catch_warnings():
+        # a non-numeric token ends the parse early (checked below)
+        warnings.simplefilter("ignore", DeprecationWarning)
+        tokens = np.fromstring(' '.join(lines), dtype=np.float64, sep=' ')
+    if tokens.shape[0] != counts.sum():
+        raise ValueError("points3D.txt contains non-numeric tokens")
+
+    starts = np.zeros(counts.shape[0], dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+
+    # per-point columns sit at fixed offsets from the start of each line
+    ids = tokens[starts].astype(np.int64)
+    xyz = tokens[starts[:,None] + np.arange(1,4)]
+    rgb = tokens[starts[:,None] + np.arange(4,7)].astype(np.uint8)
+    error = tokens[starts + 7]
+
+    # track entries are (IMAGE_ID, POINT2D_IDX) pairs following the error column
+    track_lens = (counts - 8) // 2
+    track_offsets = np.zeros(counts.shape[0] + 1, dtype=np.int64)
+    np.cumsum(track_lens, out=track_offsets[1:])
+    local = np.arange(track_offsets[-1]) - np.repeat(track_offsets[:-1], track_lens)
+    track_starts = np.repeat(starts + 8, track_lens) + (2 * local)
+
+    return {
+        "ids": ids,
+        "xyz": xyz,
+        "rgb": rgb,
+        "error": error,
+        "track_offsets": track_offsets,
+        "track_image_ids": tokens[track_starts].astype(np.int32),
+        "track_point2d_ids": tokens[track_starts + 1].astype(np.int32),
+    }
+
+def _empty_points3d() -> dict:
+    return {
+        "ids": np.zeros(0, dtype=np.int64),
+        "xyz": np.zeros((0, 3), dtype=np.float64),
+        "rgb": np.zeros((0, 3), dtype=np.uint8),
+        "error": np.zeros(0, dtype=np.float64),
+        "track_offsets": np.zeros(1, dtype=np.int64),
+        "track_image_ids": np.zeros(0, dtype=np.int32),
+        "track_point2d_ids": np.zeros(0, dtype=np.int32),
+    }
+
+def concat_points3d(chunks: list) -> dict:
+    """Concatenates chunks of columnar points, such as those of iter_points3d.
+
+    Parameters:
+        chunks: Columnar points in the same layout as read_points3d_text.
+
+    Returns:
+        Columnar points of all chunks, in order.
+    """
+    if not chunks:
+        return _empty_points3d()
+    if len(chunks) == 1:
+        return chunks[0]
+
+    # track offsets of every chunk continue from the observations of the previous ones
+    obs_starts = np.cumsum([0] + [chunk["track_offsets"][-1] for chunk in chunks[:-1]])
+    points = {
+        key: np.concatenate([chunk[key] for chunk in chunks])
+        for key in chunks[0] if key != "track_offsets"
+    }
+    points["track_offsets"] = np.concatenate([np.zeros(1, dtype=np.int64)] + [chunk["track_offsets"][1:] + start for chunk, start in zip(chunks, obs_starts)])
+    return points
+
+def iter_points3d_text(points_file: str, chunk_size: int) -> dict:
+    """Reads a colmap points3D.txt file in chunks of at most chunk_size points.
+
+    Parameters:
+        points_file: Path to the colmap points3D.txt file.
+        chunk_size: Maximum number of points per chunk.
+
+    Returns:
+        Generator of columnar points in the same layout as read_points3d_text.
+    """
+    with open(points_file, 'r') as pf:
+        lines = (l.strip() for l in pf)
+        lines = (l for l in lines if l and l[0] != '#')
+        while True:
+            chunk = list(itertools.islice(lines, chunk_size))
+            if not chunk:
+                return
+            yield _parse_points3d_lines(chunk)
+
+def _points3d_starts(buf: np.ndarray, pos: int, count: int) -> np.ndarray:
+    """Byte offsets of the next count point records of a points3D.bin buffer, followed by the offset after them.
+
+    Records are variable length and every offset depends on the track length of the previous
+    record, so this scan is the only sequential step. It reads one integer per point, and
+    _points3d_records decodes all the fields in bulk.
+    """
+    header_size = POINT3D_HEADER_DTYPE.itemsize
+    len_offset = POINT3D_HEADER_DTYPE.fields["track_len"][1]
+    elem_size = TRACK_ELEM_DTYPE.itemsize
+    unpack_len = struct.Struct("<Q").unpack_from
+
+    starts = []
+    for _ in range(count):
+        starts.append(pos)
+        pos += header_size + (elem_size * unpack_len(buf, pos + len_offset)[0])
+    starts.append(pos)
+    return np.array(starts, dtype=np.int64)
+
+def _points3d_records(buf: np.ndarray, starts: np.ndarray) -> dict:
+    """Decodes the point records at the byte offsets returned by _points3d_starts."""
+    header_size = POINT3D_HEADER_DTYPE.itemsize
+    starts, record_sizes = starts[:-1], np.diff(starts)
+    track_lens = (record_sizes - header_size) // TRACK_ELEM_DTYPE.itemsize
+
+    headers = _gather_records(buf, starts, POINT3D_HEADER_DTYPE)
+    tracks = _gather_runs(buf, starts + header_size, track_lens, TRACK_ELEM_DTYPE)
+
+    track_offsets = np.zeros(starts.shape[0] + 1, dtype=np.int64)
+    np.cumsum(track_lens, out=track_offsets[1:])
+
+    return {
+        "ids": headers["id"].astype(np.int64),
+        "xyz": headers["xyz"].copy(),
+        "rgb": headers["rgb"].copy(),
+        "error": headers["error"].copy(),
+        "track_offsets": track_offsets,
+        "track_image_ids": tracks["image_id"].astype(np.int32),
+        "track_point2d_ids": tracks["point2d_id"].astype(np.int32),
+    }
+
+def iter_points3d_binary(points_file: str, chunk_size: int) -> dict:
+    """Reads a colmap points3D.bin file in chunks of at most chunk_size points.
+
+    Parameters:
+        points_file: Path to the colmap points3D.bin file.
+        chunk_size: Maximum number of points per chunk.
+
+    Returns:
+        Generator of columnar points in the same layout as read_points3d_text.
+    """
+    buf = np.frombuffer(_map_file(points_file), dtype=np.uint8)
+    num_points = struct.unpack_from("<Q", buf, 0)[0]
+
+    pos = 8
+    for chunk_start in range(0, num_points, chunk_size):
+        starts = _points3d_starts(buf, pos, min(chunk_size, num_points - chunk_start))
+        pos = int(starts[-1])
+        yield _points3d_records(buf, starts)
+
+def iter_points3d(points_file: str, chunk_size: int) -> dict:
+    """Reads a colmap points3D file in either format in chunks of at most chunk_size points.
+
+    Parameters:
+        points_file: Path to the colmap points3D.txt or points3D.bin file.
+        chunk_size: Maximum number of points per chunk.
+
+    Returns:
+        Generator of columnar points in the same layout as read_points3d_text.
+    """
+    if points_file.endswith(".bin"):
+        return iter_points3d_binary(points_file, chunk_size)
+    return iter_points3d_text(points_file, chunk_size)
+
+def read_points3d_binary(points_file: str) -> dict:
+    """Reads a colmap points3D.bin file into columnar arrays.
+
+    Parameters:
+        points_file: Path to the colmap points3D.bin file.
+
+    Returns:
+        Columnar points in the same layout as read_points3d_text.
+    """
+    buf = np.frombuffer(_map_file(points_file), dtype=np.uint8)
+    num_points = struct.unpack_from("<Q", buf, 0)[0]
+
+    return _points3d_records(buf, _points3d_starts(buf, 8, num_points))
+
+def read_points3d(points_file: str) -> dict:
+    """Reads a colmap points3D file in either text or binary format.
+
+    Parameters:
+        points_file: Path to the colmap points3D.txt or points3D.bin file.
+
+    Returns:
+        Columnar points in the same layout as read_points3d_text.
+    """
+    if points_file.endswith(".bin"):
+        return read_points3d_binary(points_file)
+    return read_points3d_text(points_file)
+
+def read_images_binary(images_file: str) -> dict:
+    """Reads a colmap images.bin file into columnar arrays.
+
+    The 2D observations are stored in CSR layout: the keypoints of image i are given
+    by xys[points2d_offsets[i]:points2d_offsets[i+1]].
+
+    Parameters:
+        images_file: Path to the colmap images.bin file.
+
+    Returns:
+        Dictionary of image ids (N), qvec (Nx4), tvec (Nx3), camera_ids (N), names (N),
+        points2d_offsets (N+1), xys (Px2) and point3d_ids (P).
+    """
+    mm = _map_file(images_file)
+    buf = np.frombuffer(mm, dtype=np.uint8)
+    num_images = struct.unpack_from("<Q", buf, 0)[0]
+
+    # like points3D.bin, only the record boundaries are found sequentially (the name
+    # terminator and the POINTS2D count of every image), then the fields are decoded in bulk
+    header_size = IMAGE_HEADER_DTYPE.itemsize
+    unpack_count = struct.Struct("<Q").unpack_from
+    starts = []
+    name_ends = []
+    pos = 8
+    for _ in range(num_images):
+        starts.append(pos)
+        name_end = mm.find(b"\x00", pos + header_size)
+        name_ends.append(name_end)
+        pos = name_end + 9 + (POINT2D_DTYPE.itemsize * unpack_count(mm, name_end + 1)[0])
+    starts.append(pos)
+    starts = np.array(starts, dtype=np.int64)
+    name_ends = np.array(name_ends, dtype=np.int64)
+
+    headers = _gather_records(buf, starts[:-1], IMAGE_HEADER_DTYPE)
+    names = [mm[start:end].decode("utf-8") for start, end in zip((starts[:-1] + header_size).tolist(), name_ends.tolist())]
+    num_points2d = (starts[1:] - (name_ends + 9)) // POINT2D_DTYPE.itemsize
+    points2d = _gather_runs(buf, name_ends + 9, num_points2d, POINT2D_DTYPE)
+    points2d_offsets = np.zeros(num_images + 1, dtype=np.int64)
+    np.cumsum(num_points2d, out=points2d_offsets[1:])
+
+    return {
+        "ids": headers["id"].astype(np.int64),
+        "qvec": headers["qvec"].copy(),
+        "tvec": headers["tvec"].copy(),
+        "camera_ids": headers["camera_id"].astype(np.int64),
+        "names": names,
+        "points2d_offsets": points2d_offsets,
+        "xys": points2d["xy"],
+        "point3d_ids": points2d["point3d_id"],
+    }
+
+def read_images_text(images_file: str) -> dict:
+    """Reads a colmap images.txt file, including its POINTS2D rows, into columnar arrays.
+
+    Parameters:
+        images_file: Path to the colmap images.txt file.
+
+    Returns:
+        Columnar images in the same layout as read_images_binary.
+    """
+    with open(images_file, 'r') as imf:
+        lines = [l.strip() for l in imf if l[0] != '#']
+    if len(lines) % 2:
+        lines.append('')
+
+    # every image has a header line followed by a (possibly empty) POINTS2D line
+    headers = [l.split() for l in lines[0::2]]
+    points2d_lines = lines[1::2]
+    num_images = len(headers)
+
+    counts = np.fromiter(((l.count(' ') + 1) // 3 if l else 0 for l in points2d_lines), dtype=np.int64, count=num_images)
+    points2d_offsets = np.zeros(num_images + 1, dtype=np.int64)
+    np.cumsum(counts, out=points2d_offsets[1:])
+    points2d = np.asarray(' '.join(points2d_lines).split(), dtype=np.float64).reshape(-1, 3)
+
+    return {
+        "ids": np.asarray([int(h[0]) for h in headers], dtype=np.int64),
+        "qvec": np.asarray([h[1:5] for h in headers], dtype=np.float64).reshape(num_images, 4),
+        "tvec": np.asarray([h[5:8] for h in headers], dtype=np.float64).reshape(num_images, 3),
+        "camera_ids": np.asarray([int(h[8]) for h in headers], dtype=np.int64),
+        "names": [h[9] for h in headers],
+        "points2d_offsets": points2d_offsets,
+        "xys": points2d[:,:2],
+        "point3d_ids": points2d[:,2].astype(np.int64),
+    }
+
+def read_images(images_file: str) -> dict:
+    """Reads a colmap images file in either text or binary format.
+
+    Parameters:
+        images_file: Path to the colmap images.txt or images.bin file.
+
+    Returns:
+        Columnar images in the same layout as read_images_binary.
+    """
+    if images_file.endswith(".bin"):
+        return read_images_binary(images_file)
+    return read_images_text(images_file)
+
+def read_cameras_binary(cameras_file: str) -> dict:
+    """Reads a colmap cameras.bin file.
+
+    Parameters:
+        cameras_file: Path to the colmap cameras.bin file.
+
+    Returns:
+        Dictionary mapping each camera id to its model id, width, height and parameters.
+    """
+    buf = np.frombuffer(_map_file(cameras_file), dtype=np.uint8)
+    num_cameras = struct.unpack_from("<Q", buf, 0)[0]
+
+    cameras = {}
+    pos = 8
+    for _ in range(num_cameras):
+        camera_id, model_id, width, height = struct.unpack_from("<iiQQ", buf, pos)
+        pos += 24
+        num_params = CAMERA_MODEL_NUM_PARAMS[model_id]
+        params = np.frombuffer(buf, dtype="<f8", count=num_params, offset=pos).copy()
+        pos += 8 * num_params
+        cameras[camera_id] = {
+            "model": model_id,
+            "width": width,
+            "height": height,
+            "params": params,
+        }
+
+    return cameras
+
+def _scatter_records(out: np.ndarray, starts: np.ndarray, records: np.ndarray) -> None:
+    """Scatters fixed-size records to arbitrary byte offsets of a buffer."""
+    byte_inds = starts[:,None] + np.arange(records.dtype.itemsize)
+    out[byte_inds] = records.view(np.uint8).reshape(-1, records.dtype.itemsize)
+
+def write_points3d_binary(points_file: str, points: dict) -> None:
+    """Writes columnar points to a colmap points3D.bin file.
+
+    Parameters:
+        points_file: Output points3D.bin file.
+        points: Columnar points in the layout of read_points3d_text.
+    """
+    num_points = points["xyz"].shape[0]
+    track_offsets = points["track_offsets"]
+    track_lens = np.diff(track_offsets)
+
+    headers = np.empty(num_points, dtype=POINT3D_HEADER_DTYPE)
+    headers["id"] = points["ids"]
+    headers["xyz"] = points["xyz"]
+    headers["rgb"] = points["rgb"]
+    headers["error"] = points["error"]
+    headers["track_len"] = track_lens
+
+    tracks = np.empty(track_offsets[-1], dtype=TRACK_ELEM_DTYPE)
+    tracks["image_id"] = points["track_image_ids"]
+    tracks["point2d_id"] = points["track_point2d_ids"]
+
+    header_size = POINT3D_HEADER_DTYPE.itemsize
+    elem_size = TRACK_ELEM_DTYPE.itemsize
+    starts = 8 + (header_size * np.arange(num_points)) + (elem_size * track_offsets[:-1])
+    local = np.arange(track_offsets[-1]) - np.repeat(track_offsets[:-1], track_lens)
+    track_starts = np.repeat(starts + header_size, track_lens) + (elem_size * local)
+
+    out = np.empty(8 + (header_size * num_points) + (elem_size * track_offsets[-1]), dtype=np.uint8)
+    out[:8] = np.frombuffer(struct.pack("<Q", num_points), dtype=np.uint8)
+    _scatter_records(out, starts, headers)
+    _scatter_records(out, track_starts, tracks)
+
+    with open(points_file, 'wb') as pf:
+        pf.write(out.tobytes())
+
+def write_images_binary(images_file: str, images: dict) -> None:
+    """Writes columnar images to a colmap images.bin file.
+
+    Parameters:
+        images_file: Output images.bin file.
+        images: Columnar images in the layout of read_images_binary.
+    """
+    num_images = len(images["names"])
+    offsets = images["points2d_offsets"]
+    points2d = np.empty(offsets[-1], dtype=POINT2D_DTYPE)
+    points2d["xy"] = images["xys"]
+    points2d["point3d_id"] = images["point3d_ids"]
+
+    with open(images_file, 'wb') as imf:
+        imf.write(struct.pack("<Q", num_images))
+        for i in range(num_images):
+            imf.write(struct.pack("<i4d3di", images["ids"][i], *images["qvec"][i], *images["tvec"][i], images["camera_ids"][i]))
+            imf.write(images["names"][i].encode("utf-8") + b"\x00")
+            imf.write(struct.pack("<Q", offsets[i+1] - offsets[i]))
+            imf.write(points2d[offsets[i]:offsets[i+1]].tobytes())
+
+def write_cameras_binary(cameras_file: str, cameras: dict) -> None:
+    """Writes cameras to a colmap cameras.bin file.
+
+    Parameters:
+        cameras_file: Output cameras.bin file.
+        cameras: Dictionary mapping each camera id to its model id, width, height and parameters.
+    """
+    with open(cameras_file, 'wb') as cf:
+        cf.write(struct.pack("<Q", len(cameras)))
+        for camera_id, camera in cameras.items():
+            params = np.asarray(camera["params"], dtype="<f8")
+            assert params.shape[0] == CAMERA_MODEL_NUM_PARAMS[camera["model"]]
+            cf.write(struct.pack("<iiQQ", camera_id, camera["model"], camera["width"], camera["height"]))
+            cf.write(params.tobytes())
+
+def filter_points(points: dict, max_error: float, min_track_len: int) -> dict:
+    """Removes points with a large reprojection error or a short track.
+
+    Parameters:
+        points: Columnar points as returned by read_points3d_text.
+        max_error: Maximum point error threshold.
+        min_track_len: Minimum required point track length.
+
+    Returns:
+        Columnar points containing only the points that pass both thresholds.
+    """
+    track_lens = np.diff(points["track_offsets"])
+    keep = (points["error"] <= max_error) & (track_lens >= min_track_len)
+    return select_points(points, keep)
+
+def select_points(points: dict, keep: np.ndarray) -> dict:
+    """Selects a subset of columnar points along with their tracks.
+
+    Parameters:
+        points: Columnar points as returned by read_points3d_text.
+        keep: Boolean mask of the points to keep (N).
+
+    Returns:
+        Columnar points containing only the selected points.
+    """
+    track_lens = np.diff(points["track_offsets"])
+    track_keep = np.repeat(keep, track_lens)
+
+    track_offsets = np.zeros(int(keep.sum()) + 1, dtype=np.int64)
+    np.cumsum(track_lens[keep], out=track_offsets[1:])
+
+    return {
+        "ids": points["ids"][keep],
+        "xyz": points["xyz"][keep],
+        "rgb": points["rgb"][keep],
+        "error": points["error"][keep],
+        "track_offsets": track_offsets,
+        "track_image_ids": points["track_image_ids"][track_keep],
+        "track_point2d_ids": points["track_point2d_ids"][track_keep],
+    }
+
+def load_points(points_file: str, max_error: float, min_track_len: int) -> dict:
+    """Reads a colmap points3D file and applies the point thresholds.
+
+    Parameters:
+        points_file: Path to the colmap points3D.txt or points3D.bin file.
+        max_error: Maximum point error threshold.
+        min_track_len: Minimum required point track length.
+
+    Returns:
+        Columnar points containing only the points that pass both thresholds.
+    """
+    return filter_points(read_points3d(points_file), max_error, min_track_len)
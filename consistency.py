@@ -0,0 +1,245 @@
+import os
+import numpy as np
+from scipy.spatial import cKDTree
+from concurrent.futures import ThreadPoolExecutor
+
+import colmap_io
+from utils import camera_centers
+
+DEFAULT_MIN_TRI_ANGLE = 1.5
+DEFAULT_SOR_NEIGHBORS = 16
+DEFAULT_SOR_STD_RATIO = 2.0
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+# number of viewing ray pairs compared at a time by the triangulation angle check
+DEFAULT_MAX_PAIRS = 1 << 20
+
+# criteria in the order they are applied; each point is counted by the first one it fails
+CRITERIA = ["depth", "frustum", "angle", "outlier"]
+
+def view_rows(cams: np.ndarray, image_index: dict) -> np.ndarray:
+    """Maps colmap image ids to rows of the camera array.
+
+    Parameters:
+        cams: Camera extrinsics, intrinsics, and view metadata (Nx2x4x4).
+        image_index: Colmap image id of each camera row (view index -> image id).
+
+    Returns:
+        Row of every image id up to the largest one (-1 for images without a camera).
+    """
+    max_id = max(image_index.values(), default=0)
+    rows = np.full(max_id + 1, -1, dtype=np.int64)
+    for row, image_id in image_index.items():
+        if row < cams.shape[0]:
+            rows[image_id] = row
+    return rows
+
+def pair_chunks(track_lens: np.ndarray, chunk_size: int, max_pairs: int) -> list:
+    """Splits points into chunks whose track checks need a bounded amount of memory.
+
+    Parameters:
+        track_lens: Track length of every point (N).
+        chunk_size: Maximum number of points per chunk.
+        max_pairs: Approximate number of observations and ray pairs per chunk.
+
+    Returns:
+        (start, end) point ranges covering all points.
+    """
+    track_lens = np.asarray(track_lens, dtype=np.int64)
+    num_points = track_lens.shape[0]
+    pairs = track_lens * (track_lens - 1) // 2
+
+    # tracks with more pairs than the budget are compared block by block (see track_checks)
+    cost = np.cumsum(np.where(pairs > max_pairs, 0, pairs) + track_lens)
+    chunks = []
+    start = 0
+    while start < num_points:
+        base = cost[start-1] if start > 0 else 0
+        end = int(np.searchsorted(cost, base + max_pairs, side='right'))
+        end = min(max(end, start + 1), start + chunk_size, num_points)
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+def max_ray_angles(rays: np.ndarray, obs_points: np.ndarray, num: int, max_pairs: int) -> np.ndarray:
+    """Computes the cosine of the largest angle between any two viewing rays of each point.
+
+    Parameters:
+        rays: Unit viewing ray of every observation, grouped by point (Mx3).
+        obs_points: Point of every observation, in ascending order (M).
+        num: Number of points.
+        max_pairs: Maximum number of ray pairs compared at a time.
+
+    Returns:
+        Smallest pairwise cosine of every point (1 for points with fewer than two rays).
+    """
+    obs_lens = np.bincount(obs_points, minlength=num)
+    obs_starts = np.cumsum(obs_lens) - obs_lens
+    min_cos = np.ones(num)
+
+    # short tracks: all pairs of all points at once
+    long = obs_lens * (obs_lens - 1) // 2 > max_pairs
+    short_obs = np.flatnonzero(~long[obs_points])
+    points = obs_points[short_obs]
+    local = short_obs - obs_starts[points]
+    partners = obs_lens[points] - local - 1
+    first = np.repeat(short_obs, partners)
+    pair_starts = np.cumsum(partners) - partners
+    second = first + 1 + (np.arange(first.shape[0]) - np.repeat(pair_starts, partners))
+    cos = np.einsum("ni,ni->n", rays[first], rays[second])
+    np.minimum.at(min_cos, obs_points[first], cos)
+
+    # long tracks: blocks of rows of the Gram matrix of their rays
+    for point in np.flatnonzero(long):
+        point_rays = rays[obs_starts[point]:obs_starts[point] + obs_lens[point]]
+        block = max(1, max_pairs // point_rays.shape[0])
+        for row in range(0, point_rays.shape[0], block):
+            gram = point_rays[row:row+block] @ point_rays.T
+            gram[np.arange(gram.shape[0]), np.arange(row, row + gram.shape[0])] = np.inf
+            min_cos[point] = min(min_cos[point], gram.min())
+
+    return min_cos
+
+def track_checks(points: dict, cams: np.ndarray, rows: np.ndarray, width: int, height: int, min_tri_angle: float, start: int, end: int, max_pairs: int = DEFAULT_MAX_PAIRS) -> dict:
+    """Checks the points start:end against every camera of their tracks.
+
+    Parameters:
+        points: Columnar points as returned by colmap_io.load_points.
+        cams: Camera extrinsics, intrinsics, and view metadata (Nx2x4x4).
+        rows: Camera row of every image id (see view_rows).
+        width: Width of the images.
+        height: Height of the images.
+        min_tri_angle: Minimum triangulation angle (degrees).
+        start: First point of the chunk.
+        end: End of the chunk (exclusive).
+        max_pairs: Maximum number of ray pairs compared at a time.
+
+    Returns:
+        Boolean failure masks (end-start) of the 'depth', 'frustum' and 'angle' criteria.
+    """
+    track_offsets = points["track_offsets"][start:end+1]
+    track_lens = np.diff(track_offsets)
+    track_ids = np.asarray(points["track_image_ids"][track_offsets[0]:track_offsets[-1]])
+    obs_points = np.repeat(np.arange(end - start), track_lens)
+
+    # observations in images without a known camera are ignored
+    obs_rows = np.full(track_ids.shape[0], -1, dtype=np.int64)
+    known = track_ids < rows.shape[0]
+    obs_rows[known] = rows[track_ids[known]]
+    known = obs_rows >= 0
+    obs_points = obs_points[known]
+    obs_rows = obs_rows[known]
+    xyz = np.asarray(points["xyz"][start:end], dtype=np.float64)[obs_points]
+
+    # view-space coordinates of every observation
+    poses = cams[obs_rows,0]
+    cam_xyz = np.einsum("nij,nj->ni", poses[:,:3,:3], xyz) + poses[:,:3,3]
+    z = cam_xyz[:,2]
+    behind = z <= 0
+
+    K = cams[obs_rows,1,:3,:3]
+    proj = np.einsum("nij,nj->ni", K, cam_xyz)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        u = np.round(proj[:,0] / proj[:,2])
+        v = np.round(proj[:,1] / proj[:,2])
+    outside = ~((u >= 0) & (u < width) & (v >= 0) & (v < height))
+
+    num = end - start
+    depth_fail = np.bincount(obs_points, weights=behind, minlength=num) > 0
+    frustum_fail = np.bincount(obs_points, weights=outside & ~behind, minlength=num) > 0
+
+    # largest angle between any two viewing rays of a point, from all pairs of its track
+    rays = xyz - camera_centers(cams)[obs_rows]
+    rays /= np.maximum(np.linalg.norm(rays, axis=1, keepdims=True), 1e-12)
+    min_cos = max_ray_angles(rays, obs_points, num, max_pairs)
+    angle_fail = min_cos > np.cos(np.deg2rad(min_tri_angle))
+
+    return {"depth": depth_fail, "frustum": frustum_fail, "angle": angle_fail}
+
+def statistical_outliers(xyz: np.ndarray, neighbors: int, std_ratio: float, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = -1) -> np.ndarray:
+    """Finds points whose mean distance to their nearest neighbors is unusually large.
+
+    Parameters:
+        xyz: Point positions (Nx3).
+        neighbors: Number of nearest neighbors averaged per point.
+        std_ratio: Number of standard deviations above the mean distance tolerated.
+        chunk_size: Number of points queried at a time.
+        workers: Number of threads of the KD-tree queries (-1 for all cores).
+
+    Returns:
+        Boolean mask of the outliers (N).
+    """
+    num_points = xyz.shape[0]
+    if num_points <= neighbors:
+        return np.zeros(num_points, dtype=bool)
+
+    tree = cKDTree(xyz)
+    mean_dists = np.empty(num_points, dtype=np.float64)
+    for start in range(0, num_points, chunk_size):
+        # the nearest neighbor of every point is the point itself
+        dists, _ = tree.query(xyz[start:start+chunk_size], k=neighbors+1, workers=workers)
+        mean_dists[start:start+chunk_size] = dists[:,1:].mean(axis=1)
+
+    return mean_dists > mean_dists.mean() + (std_ratio * mean_dists.std())
+
+def geometric_filter(
+    points: dict,
+    cams: np.ndarray,
+    image_index: dict,
+    width: int,
+    height: int,
+    min_tri_angle: float = DEFAULT_MIN_TRI_ANGLE,
+    sor_neighbors: int = DEFAULT_SOR_NEIGHBORS,
+    sor_std_ratio: float = DEFAULT_SOR_STD_RATIO,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_pairs: int = DEFAULT_MAX_PAIRS,
+    workers: int = None,
+) -> tuple:
+    """Removes points that are inconsistent with the known cameras of their tracks.
+
+    A point is removed if it lies behind (depth) or projects outside (frustum) any camera
+    of its track, if its largest triangulation angle is below min_tri_angle (angle), or if
+    it is a statistical outlier of its neighborhood (outlier). The track checks run in
+    chunks of points on a thread pool, sized so that every chunk compares about max_pairs
+    pairs of viewing rays.
+
+    Parameters:
+        points: Columnar points as returned by colmap_io.load_points.
+        cams: Camera extrinsics, intrinsics, and view metadata (Nx2x4x4).
+        image_index: Colmap image id of each camera row (view index -> image id).
+        width: Width of the images.
+        height: Height of the images.
+        min_tri_angle: Minimum triangulation angle (degrees).
+        sor_neighbors: Number of neighbors of the outlier test (0 to skip it).
+        sor_std_ratio: Number of standard deviations above the mean neighbor distance tolerated.
+        chunk_size: Maximum number of points checked at a time.
+        max_pairs: Approximate number of observations and ray pairs checked at a time per thread.
+        workers: Number of threads (all cores if None).
+
+    Returns:
+        Columnar points that pass every criterion, and the number of points removed by each criterion.
+    """
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    num_points = points["xyz"].shape[0]
+    rows = view_rows(cams, image_index)
+
+    chunks = pair_chunks(np.diff(points["track_offsets"]), chunk_size, max_pairs)
+    with ThreadPoolExecutor(max(1, workers)) as executor:
+        results = list(executor.map(lambda chunk: track_checks(points, cams, rows, width, height, min_tri_angle, *chunk, max_pairs), chunks))
+
+    removed = {}
+    keep = np.ones(num_points, dtype=bool)
+    for criterion in CRITERIA[:-1]:
+        fail = np.concatenate([r[criterion] for r in results]) if results else np.zeros(0, dtype=bool)
+        removed[criterion] = int((fail & keep).sum())
+        keep &= ~fail
+
+    # the outlier test only considers the points that passed the track checks
+    removed["outlier"] = 0
+    if sor_neighbors > 0:
+        kept = np.flatnonzero(keep)
+        outliers = statistical_outliers(np.asarray(points["xyz"])[kept], sor_neighbors, sor_std_ratio, chunk_size, workers)
+        keep[kept[outliers]] = False
+        removed["outlier"] = int(outliers.sum())
+
+    return colmap_io.select_points(points, keep), removed
@@ -1,18 +1,29 @@
 import sys, os
 import sqlite3
+from contextlib import contextmanager
+from itertools import chain
 import numpy as np
 from scipy.spatial.transform import Rotation as R
-import cv2
 import argparse
 
-from utils import read_cams_sfm
+import model_cache
+from utils import list_images, common_image_size, camera_centers
+from pair_selection import select_pairs, write_match_list
+from instrument import RunReport
 
 parser = argparse.ArgumentParser(description='Script for initializing colmap sparse model from a known trajectory.')
 parser.add_argument('--cam_path', type=str, help='Path to scene cameras.', required=True)
 parser.add_argument('--image_path', type=str, help='Path to scene images.', required=True)
 parser.add_argument('--database_file', type=str, help='Path to desired colmap database.db file.', required=True)
 parser.add_argument('--output_path', type=str, help='Sparse depth output path.', required=True)
-ARGS = parser.parse_args()
+parser.add_argument('--cache_dir', type=str, help='Directory of the parsed camera cache.', default=model_cache.DEFAULT_CACHE_DIR)
+parser.add_argument('--no_cache', action='store_true', help='Parse the cameras from scratch without using the cache.')
+parser.add_argument('--pose_priors', action='store_true', help='Store the known camera centers as position priors in the pose_priors table.')
+parser.add_argument('--incremental', action='store_true', help='Add only the new images to an existing database instead of recreating it.')
+parser.add_argument('--pairs_file', type=str, help='Output match list of the pairs involving new images (incremental mode).')
+parser.add_argument('--top_k_pairs', type=int, help='Number of pairs per image in the match list of new images.', default=20)
+parser.add_argument('--report_file', type=str, help='Output JSON file of per-stage timings, memory and counts.')
+parser.add_argument('--profile_stage', type=str, help='Stage to run under cProfile (dumped to <report_file>.prof).')
 
 IS_PYTHON3 = sys.version_info[0] >= 3
 
@@ -84,6 +95,14 @@ CREATE_MATCHES_TABLE = """CREATE TABLE IF NOT EXISTS matches (
     cols INTEGER NOT NULL,
     data BLOB)"""
 
+# coordinate systems of the pose_priors table
+POSE_PRIOR_UNDEFINED = -1
+POSE_PRIOR_WGS84 = 0
+POSE_PRIOR_CARTESIAN = 1
+
+# number of images formatted per write of images.txt
+IMAGES_FILE_CHUNK_SIZE = 10000
+
 CREATE_NAME_INDEX = (
     "CREATE UNIQUE INDEX IF NOT EXISTS index_name ON images(name)"
 )
@@ -107,8 +126,9 @@ def image_ids_to_pair_id(image_id1, image_id2):
 
 
 def pair_id_to_image_ids(pair_id):
+    # works on python ints as well as numpy integer arrays
     image_id2 = pair_id % MAX_IMAGE_ID
-    image_id1 = (pair_id - image_id2) / MAX_IMAGE_ID
+    image_id1 = (pair_id - image_id2) // MAX_IMAGE_ID
     return image_id1, image_id2
 
 
@@ -120,10 +140,10 @@ def array_to_blob(array):
 
 
 def blob_to_array(blob, dtype, shape=(-1,)):
-    if IS_PYTHON3:
-        return np.fromstring(blob, dtype=dtype).reshape(*shape)
-    else:
-        return np.frombuffer(blob, dtype=dtype).reshape(*shape)
+    # zero-copy, read-only view of the blob
+    if blob is None:
+        return np.zeros(0, dtype=dtype).reshape(*shape)
+    return np.frombuffer(blob, dtype=dtype).reshape(*shape)
 
 
 class COLMAPDatabase(sqlite3.Connection):
@@ -284,8 +304,190 @@ class COLMAPDatabase(sqlite3.Connection):
             ),
         )
 
+    @contextmanager
+    def bulk_transaction(self, journal_mode="MEMORY", synchronous="OFF"):
+        """Runs the enclosed inserts in a single transaction with relaxed durability.
+
+        The previous journal_mode and synchronous settings are restored on exit and
+        the transaction is rolled back if an exception is raised.
+        """
+        self.commit()
+        prev_journal_mode = self.execute("PRAGMA journal_mode").fetchone()[0]
+        prev_synchronous = self.execute("PRAGMA synchronous").fetchone()[0]
+        self.execute(f"PRAGMA journal_mode={journal_mode}")
+        self.execute(f"PRAGMA synchronous={synchronous}")
+        try:
+            self.execute("BEGIN")
+            yield self
+            self.commit()
+        except BaseException:
+            self.rollback()
+            raise
+        finally:
+            self.execute(f"PRAGMA journal_mode={prev_journal_mode}")
+            self.execute(f"PRAGMA synchronous={prev_synchronous}")
+
+    def add_images_bulk(
+        self,
+        names,
+        camera_ids,
+        prior_qs=None,
+        prior_ts=None,
+        image_ids=None,
+    ):
+        num_images = len(names)
+        camera_ids = np.broadcast_to(np.asarray(camera_ids, np.int64), (num_images,))
+        prior_qs = np.full((num_images, 4), np.nan) if prior_qs is None else np.asarray(prior_qs, np.float64)
+        prior_ts = np.full((num_images, 3), np.nan) if prior_ts is None else np.asarray(prior_ts, np.float64)
+        image_ids = [None] * num_images if image_ids is None else np.asarray(image_ids, np.int64).tolist()
+
+        rows = zip(
+            image_ids,
+            names,
+            camera_ids.tolist(),
+            *prior_qs.T.tolist(),
+            *prior_ts.T.tolist(),
+        )
+        self.executemany(
+            "INSERT INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+
+    def add_pose_priors_bulk(self, image_ids, positions, coordinate_system=POSE_PRIOR_UNDEFINED):
+        positions = np.ascontiguousarray(positions, dtype=np.float64)
+        rows = zip(
+            np.asarray(image_ids, np.int64).tolist(),
+            (position.tobytes() for position in positions),
+            [coordinate_system] * positions.shape[0],
+        )
+        self.executemany("INSERT INTO pose_priors VALUES (?, ?, ?)", rows)
+
+    def add_keypoints_bulk(self, keypoints_iter):
+        def rows():
+            for image_id, keypoints in keypoints_iter:
+                assert len(keypoints.shape) == 2
+                assert keypoints.shape[1] in [2, 4, 6]
+                keypoints = np.asarray(keypoints, np.float32)
+                yield (image_id,) + keypoints.shape + (array_to_blob(keypoints),)
+
+        self.executemany("INSERT INTO keypoints VALUES (?, ?, ?, ?)", rows())
+
+    def add_descriptors_bulk(self, descriptors_iter):
+        def rows():
+            for image_id, descriptors in descriptors_iter:
+                descriptors = np.ascontiguousarray(descriptors, np.uint8)
+                yield (image_id,) + descriptors.shape + (array_to_blob(descriptors),)
+
+        self.executemany("INSERT INTO descriptors VALUES (?, ?, ?, ?)", rows())
+
+    def add_matches_bulk(self, matches_iter):
+        def rows():
+            for image_id1, image_id2, matches in matches_iter:
+                assert len(matches.shape) == 2
+                assert matches.shape[1] == 2
+
+                if image_id1 > image_id2:
+                    matches = matches[:, ::-1]
+
+                pair_id = image_ids_to_pair_id(image_id1, image_id2)
+                matches = np.asarray(matches, np.uint32)
+                yield (pair_id,) + matches.shape + (array_to_blob(matches),)
+
+        self.executemany("INSERT INTO matches VALUES (?, ?, ?, ?)", rows())
+
+    def add_two_view_geometries_bulk(self, matches_iter, config=2):
+        F = array_to_blob(np.eye(3))
+        qvec = array_to_blob(np.array([1.0, 0.0, 0.0, 0.0]))
+        tvec = array_to_blob(np.zeros(3))
+
+        def rows():
+            for image_id1, image_id2, matches in matches_iter:
+                assert len(matches.shape) == 2
+                assert matches.shape[1] == 2
+
+                if image_id1 > image_id2:
+                    matches = matches[:, ::-1]
+
+                pair_id = image_ids_to_pair_id(image_id1, image_id2)
+                matches = np.asarray(matches, np.uint32)
+                yield (pair_id,) + matches.shape + (
+                    array_to_blob(matches),
+                    config,
+                    F,
+                    F,
+                    F,
+                    qvec,
+                    tvec,
+                )
+
+        self.executemany(
+            "INSERT INTO two_view_geometries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows(),
+        )
 
-def gen_database(database_file, cam_params, height, width, image_files, model=1):
+
+    def _iter_rows(self, query, batch_size=1024):
+        cursor = self.execute(query)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+    def iter_keypoints(self, batch_size=1024):
+        for image_id, rows, cols, data in self._iter_rows(
+            "SELECT image_id, rows, cols, data FROM keypoints", batch_size
+        ):
+            yield image_id, blob_to_array(data, np.float32, (rows, cols))
+
+    def iter_descriptors(self, batch_size=1024):
+        for image_id, rows, cols, data in self._iter_rows(
+            "SELECT image_id, rows, cols, data FROM descriptors", batch_size
+        ):
+            yield image_id, blob_to_array(data, np.uint8, (rows, cols))
+
+    def iter_matches(self, batch_size=1024):
+        for pair_id, rows, cols, data in self._iter_rows(
+            "SELECT pair_id, rows, cols, data FROM matches", batch_size
+        ):
+            image_id1, image_id2 = pair_id_to_image_ids(pair_id)
+            yield image_id1, image_id2, blob_to_array(data, np.uint32, (rows, cols))
+
+    def iter_two_view_geometries(self, batch_size=1024):
+        for pair_id, rows, cols, data, config, F, E, H, qvec, tvec in self._iter_rows(
+            "SELECT pair_id, rows, cols, data, config, F, E, H, qvec, tvec FROM two_view_geometries",
+            batch_size,
+        ):
+            image_id1, image_id2 = pair_id_to_image_ids(pair_id)
+            yield {
+                "image_id1": image_id1,
+                "image_id2": image_id2,
+                "matches": blob_to_array(data, np.uint32, (rows, cols)),
+                "config": config,
+                "F": blob_to_array(F, np.float64, (-1, 3)),
+                "E": blob_to_array(E, np.float64, (-1, 3)),
+                "H": blob_to_array(H, np.float64, (-1, 3)),
+                "qvec": blob_to_array(qvec, np.float64),
+                "tvec": blob_to_array(tvec, np.float64),
+            }
+
+    def read_pair_match_counts(self, table="matches", batch_size=1024):
+        assert table in ["matches", "two_view_geometries"]
+
+        # only the pair ids and row counts are read, the match blobs are never loaded
+        counts = np.fromiter(
+            chain.from_iterable(
+                self._iter_rows(f"SELECT pair_id, rows FROM {table}", batch_size)
+            ),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        image_ids1, image_ids2 = pair_id_to_image_ids(counts[:, 0])
+        return image_ids1, image_ids2, counts[:, 1]
+
+
+def gen_database(database_file, cam_params, height, width, image_files, model=1, prior_positions=None):
     # Open the database.
     db = COLMAPDatabase.connect(database_file)
 
@@ -296,11 +498,18 @@ def gen_database(database_file, cam_params, height, width, image_files, model=1)
     camera_id = db.add_camera(model, width, height, cam_params)
 
     # Create dummy images.
-    for i,img in enumerate(image_files):
-        _ = db.add_image(name=img, camera_id=camera_id, image_id=int(i+1))
+    image_ids = np.arange(1, len(image_files)+1)
+
+    # executescript commits, so the table is created outside of the transaction
+    if prior_positions is not None:
+        db.create_pose_priors_table()
+
+    with db.bulk_transaction():
+        db.add_images_bulk(image_files, camera_id, image_ids=image_ids)
 
-    # Commit the data to the file.
-    db.commit()
+        # known camera centers as position priors
+        if prior_positions is not None:
+            db.add_pose_priors_bulk(image_ids, prior_positions, POSE_PRIOR_CARTESIAN)
 
     # Clean up.
     db.close()
@@ -317,45 +526,185 @@ def gen_cameras_file(cams, h, w, output_path, cam_file="cameras.txt"):
 
     return cam_params
 
-def gen_images_file(cams, image_files, num_cams, output_path, image_file="images.txt"):
+def gen_images_file(cams, image_files, num_cams, output_path, image_file="images.txt", chunk_size=IMAGES_FILE_CHUNK_SIZE, image_ids=None):
     img_str = "# Image list with two lines of data per image:\n"
     img_str += "#   IMAGE_ID, QW, QX, QY, QZ, TX, TY, TZ, CAMERA_ID, NAME\n"
     img_str += "#   POINTS2D[] as (X, Y, POINT3D_ID)\n"
     img_str += f"# Number of images: {num_cams}, mean observations per image: \n"
-    for i, img in enumerate(image_files):
-        qx,qy,qz,qw = (R.from_matrix(cams[i,0,:3,:3])).as_quat()
-        tx,ty,tz = cams[i,0,:3,3]
-        img_str += f"{int(i+1)} {qw} {qx} {qy} {qz} {tx} {ty} {tz} 1 {img}\n\n"
+
+    # convert the whole trajectory at once
+    num_images = len(image_files)
+    quats = R.from_matrix(cams[:num_images,0,:3,:3]).as_quat()
+    trans = cams[:num_images,0,:3,3]
+    image_ids = range(1, num_images+1) if image_ids is None else np.asarray(image_ids, np.int64).tolist()
 
     with open(os.path.join(output_path,image_file),'w') as of:
         of.write(img_str)
-
-def main():
-    if os.path.exists(ARGS.database_file):
-        os.remove(ARGS.database_file)
-
-    # read in data
-    cams = read_cams_sfm(ARGS.cam_path)
+        for start in range(0, num_images, chunk_size):
+            end = min(start + chunk_size, num_images)
+            of.write("".join(
+                f"{i} {qw} {qx} {qy} {qz} {tx} {ty} {tz} 1 {img}\n\n"
+                for i, (qx, qy, qz, qw), (tx, ty, tz), img in zip(
+                    image_ids[start:end],
+                    quats[start:end].tolist(),
+                    trans[start:end].tolist(),
+                    image_files[start:end],
+                )
+            ))
+
+def read_scene(cam_path, image_path, cache_dir, report):
+    # cameras and the images they belong to (matched in sorted order)
+    with report.stage("cameras"):
+        cams = model_cache.read_cams(cam_path, cache_dir)
     num_cams = cams.shape[0]
-    image_files = os.listdir(ARGS.image_path)
-    image_files = [img for img in image_files if img[-3:] == "png" ]
-    image_files.sort()
+    image_files = list_images(image_path, (".png",))
     image_files = image_files[:num_cams]
 
+    with report.stage("image_size"):
+        height, width = common_image_size(image_path, image_files)
+
+    return cams, image_files, height, width
+
+def gen_text_model(cams, image_files, height, width, output_path, image_ids=None):
     # create cameras file
-    img = cv2.imread(os.path.join(ARGS.image_path,image_files[0]))
-    height, width, _ = img.shape
-    cam_params = gen_cameras_file(cams, height, width, ARGS.output_path)
+    cam_params = gen_cameras_file(cams, height, width, output_path)
 
     # create images file
-    gen_images_file(cams, image_files, num_cams, ARGS.output_path)
+    gen_images_file(cams, image_files, cams.shape[0], output_path, image_ids=image_ids)
 
     # create points3D file
-    fp = open(os.path.join(ARGS.output_path,"points3D.txt"),'w')
+    fp = open(os.path.join(output_path,"points3D.txt"),'w')
     fp.close()
 
+    return cam_params
+
+def create_scene(cam_path, image_path, database_file, output_path, cache_dir=None, pose_priors=False, report=None):
+    """Creates the colmap database and text model of a scene with known cameras.
+
+    Parameters:
+        cam_path: Path to scene cameras.
+        image_path: Path to scene images.
+        database_file: Output colmap database file (replaced if it exists).
+        output_path: Output path of the cameras.txt, images.txt and points3D.txt files.
+        cache_dir: Directory of the parsed camera cache (None to disable the cache).
+        pose_priors: Store the known camera centers in the pose_priors table.
+        report: Run report collecting the stage timings.
+    """
+    if report is None:
+        report = RunReport("database")
+
+    if os.path.exists(database_file):
+        os.remove(database_file)
+
+    # read in data
+    cams, image_files, height, width = read_scene(cam_path, image_path, cache_dir, report)
+
+    with report.stage("text_model"):
+        cam_params = gen_text_model(cams, image_files, height, width, output_path)
+
     # generate the database.db file
-    gen_database(ARGS.database_file, cam_params, height, width, image_files)
+    with report.stage("database"):
+        prior_positions = camera_centers(cams[:len(image_files)]) if pose_priors else None
+        gen_database(database_file, cam_params, height, width, image_files, prior_positions=prior_positions)
+    report.count("images", len(image_files))
+
+def update_scene(cam_path, image_path, database_file, output_path, pairs_file=None, top_k_pairs=20, cache_dir=None, pose_priors=False, report=None):
+    """Adds the new frames of a scene to an existing colmap database and text model.
+
+    Images already in the database keep their ids, new images are appended after the
+    largest existing id and images.txt is regenerated with these ids. The pairs to
+    match are the pose-based pairs (see pair_selection.py) involving at least one new
+    image. Without an existing database the scene is created from scratch.
+
+    Parameters:
+        cam_path: Path to scene cameras.
+        image_path: Path to scene images.
+        database_file: Existing colmap database file.
+        output_path: Output path of the cameras.txt, images.txt and points3D.txt files.
+        pairs_file: Output match list of the new image pairs (skipped if None).
+        top_k_pairs: Number of pairs to keep per image.
+        cache_dir: Directory of the parsed camera cache (None to disable the cache).
+        pose_priors: Store the known camera centers of the new images in the pose_priors table.
+        report: Run report collecting the stage timings.
+
+    Returns:
+        Names of the new images.
+    """
+    if report is None:
+        report = RunReport("database")
+
+    cams, image_files, height, width = read_scene(cam_path, image_path, cache_dir, report)
+    cams = cams[:len(image_files)]
+
+    if not os.path.exists(database_file):
+        new = np.ones(len(image_files), dtype=bool)
+        with report.stage("text_model"):
+            cam_params = gen_text_model(cams, image_files, height, width, output_path)
+        with report.stage("database"):
+            prior_positions = camera_centers(cams) if pose_priors else None
+            gen_database(database_file, cam_params, height, width, image_files, prior_positions=prior_positions)
+    else:
+        with report.stage("database"):
+            db = COLMAPDatabase.connect(database_file)
+            existing = dict(db.execute("SELECT name, image_id FROM images"))
+            cameras = db.execute("SELECT camera_id, width, height, params FROM cameras").fetchall()
+            if not cameras:
+                db.close()
+                raise ValueError(f"{database_file} has no camera to add the new images to")
+
+            # new frames must share the intrinsics of the existing camera
+            cam_params = np.asarray([cams[0,1,0,0], cams[0,1,1,1], cams[0,1,0,2], cams[0,1,1,2]])
+            camera_id, db_width, db_height, db_params = cameras[0]
+            if (db_width, db_height) != (width, height) or not np.allclose(blob_to_array(db_params, np.float64), cam_params):
+                db.close()
+                raise ValueError(f"the cameras in {cam_path} do not match the camera of {database_file}")
+
+            new = np.asarray([img not in existing for img in image_files], dtype=bool)
+            new_files = [img for img, is_new in zip(image_files, new) if is_new]
+            next_id = max(existing.values(), default=0) + 1
+            new_ids = np.arange(next_id, next_id + len(new_files))
+
+            # executescript commits, so the table is created outside of the transaction
+            if pose_priors and new_files:
+                db.create_pose_priors_table()
+
+            with db.bulk_transaction():
+                db.add_images_bulk(new_files, camera_id, image_ids=new_ids)
+                if pose_priors and new_files:
+                    db.add_pose_priors_bulk(new_ids, camera_centers(cams[new]), POSE_PRIOR_CARTESIAN)
+            db.close()
+
+        existing.update(zip(new_files, new_ids.tolist()))
+        with report.stage("text_model"):
+            gen_text_model(cams, image_files, height, width, output_path, image_ids=[existing[img] for img in image_files])
+
+    report.count("images", len(image_files))
+    report.count("images_new", int(new.sum()))
+
+    # pairs between new images and any other image
+    if pairs_file is not None:
+        with report.stage("pairs"):
+            pairs = select_pairs(cams, height, width, top_k_pairs)
+            pairs = pairs[new[pairs].any(axis=1)]
+            write_match_list(pairs, image_files, pairs_file)
+        report.count("pairs_new", int(pairs.shape[0]))
+
+    return [img for img, is_new in zip(image_files, new) if is_new]
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    if args.profile_stage is not None and args.report_file is None:
+        parser.error("--profile_stage requires --report_file")
+
+    report = RunReport("database", args.profile_stage, f"{args.report_file}.prof" if args.report_file else None)
+    cache_dir = None if args.no_cache else args.cache_dir
+    if args.incremental:
+        update_scene(args.cam_path, args.image_path, args.database_file, args.output_path, args.pairs_file, args.top_k_pairs, cache_dir, args.pose_priors, report)
+    else:
+        create_scene(args.cam_path, args.image_path, args.database_file, args.output_path, cache_dir, args.pose_priors, report)
+
+    if args.report_file is not None:
+        report.write(args.report_file)
 
 if __name__=="__main__":
     main()
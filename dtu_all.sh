@@ -1,24 +1,29 @@
 #!/bin/bash
 
-./dtu_sparse_depth.sh ~/data/DTU scan001
-./dtu_sparse_depth.sh ~/data/DTU scan004
-./dtu_sparse_depth.sh ~/data/DTU scan009
-./dtu_sparse_depth.sh ~/data/DTU scan010
-./dtu_sparse_depth.sh ~/data/DTU scan011
-./dtu_sparse_depth.sh ~/data/DTU scan012
-./dtu_sparse_depth.sh ~/data/DTU scan013
-./dtu_sparse_depth.sh ~/data/DTU scan015
-./dtu_sparse_depth.sh ~/data/DTU scan023
-./dtu_sparse_depth.sh ~/data/DTU scan024
-./dtu_sparse_depth.sh ~/data/DTU scan029
-./dtu_sparse_depth.sh ~/data/DTU scan032
-./dtu_sparse_depth.sh ~/data/DTU scan033
-./dtu_sparse_depth.sh ~/data/DTU scan034
-./dtu_sparse_depth.sh ~/data/DTU scan048
-./dtu_sparse_depth.sh ~/data/DTU scan049
-./dtu_sparse_depth.sh ~/data/DTU scan062
-./dtu_sparse_depth.sh ~/data/DTU scan075
-./dtu_sparse_depth.sh ~/data/DTU scan077
-./dtu_sparse_depth.sh ~/data/DTU scan110
-./dtu_sparse_depth.sh ~/data/DTU scan114
-./dtu_sparse_depth.sh ~/data/DTU scan118
+# run all scenes concurrently under a shared CPU budget; see batch.py --help
+python batch.py \
+    --dataset dtu \
+    --data_path ~/data/DTU \
+    --scenes \
+        scan001 \
+        scan004 \
+        scan009 \
+        scan010 \
+        scan011 \
+        scan012 \
+        scan013 \
+        scan015 \
+        scan023 \
+        scan024 \
+        scan029 \
+        scan032 \
+        scan033 \
+        scan034 \
+        scan048 \
+        scan049 \
+        scan062 \
+        scan075 \
+        scan077 \
+        scan110 \
+        scan114 \
+        scan118
@@ -0,0 +1,76 @@
+import sys, os
+import time
+import numpy as np
+import argparse
+
+import colmap_io
+
+# stand-in for the colmap executable so the pipeline and scheduler can run without colmap;
+# FAKE_COLMAP_DELAY adds a per-command sleep and FAKE_COLMAP_FAIL_FILE makes the first
+# command fail (creating the file) to exercise retries
+parser = argparse.ArgumentParser(description='Fake colmap executable for testing the pipeline without colmap.')
+parser.add_argument('command', type=str, help='Colmap subcommand.')
+parser.add_argument('--input_path', type=str, help='Input sparse model path (point_triangulator).')
+parser.add_argument('--output_path', type=str, help='Output sparse model path (point_triangulator).')
+
+CAMERA_MODEL_IDS = {"SIMPLE_PINHOLE": 0, "PINHOLE": 1, "SIMPLE_RADIAL": 2, "RADIAL": 3, "OPENCV": 4}
+
+def data_lines(text_file):
+    with open(text_file, 'r') as tf:
+        return [l.strip().split() for l in tf if l.strip() and l[0] != '#']
+
+def triangulate(input_path, output_path):
+    # copy the known cameras and poses into a binary model without any points
+    cameras = {}
+    for words in data_lines(os.path.join(input_path, "cameras.txt")):
+        cameras[int(words[0])] = {
+            "model": CAMERA_MODEL_IDS[words[1]],
+            "width": int(words[2]),
+            "height": int(words[3]),
+            "params": np.asarray(words[4:], dtype=np.float64),
+        }
+
+    lines = data_lines(os.path.join(input_path, "images.txt"))
+    num_images = len(lines)
+    images = {
+        "ids": np.asarray([int(l[0]) for l in lines], dtype=np.int64),
+        "qvec": np.asarray([l[1:5] for l in lines], dtype=np.float64).reshape(num_images, 4),
+        "tvec": np.asarray([l[5:8] for l in lines], dtype=np.float64).reshape(num_images, 3),
+        "camera_ids": np.asarray([int(l[8]) for l in lines], dtype=np.int64),
+        "names": [l[9] for l in lines],
+        "points2d_offsets": np.zeros(num_images + 1, dtype=np.int64),
+        "xys": np.zeros((0, 2)),
+        "point3d_ids": np.zeros(0, dtype=np.int64),
+    }
+
+    points = {
+        "ids": np.zeros(0, dtype=np.int64),
+        "xyz": np.zeros((0, 3)),
+        "rgb": np.zeros((0, 3), dtype=np.uint8),
+        "error": np.zeros(0),
+        "track_offsets": np.zeros(1, dtype=np.int64),
+        "track_image_ids": np.zeros(0, dtype=np.int32),
+        "track_point2d_ids": np.zeros(0, dtype=np.int32),
+    }
+
+    os.makedirs(output_path, exist_ok=True)
+    colmap_io.write_cameras_binary(os.path.join(output_path, "cameras.bin"), cameras)
+    colmap_io.write_images_binary(os.path.join(output_path, "images.bin"), images)
+    colmap_io.write_points3d_binary(os.path.join(output_path, "points3D.bin"), points)
+
+def main():
+    args, _ = parser.parse_known_args()
+
+    fail_file = os.environ.get("FAKE_COLMAP_FAIL_FILE")
+    if fail_file and not os.path.exists(fail_file):
+        open(fail_file, 'w').close()
+        sys.exit(f"fake colmap: simulated failure of '{args.command}'")
+
+    time.sleep(float(os.environ.get("FAKE_COLMAP_DELAY", 0)))
+    print(f"fake colmap: {args.command}")
+
+    if args.command == "point_triangulator":
+        triangulate(args.input_path, args.output_path)
+
+if __name__=="__main__":
+    main()
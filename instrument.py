@@ -0,0 +1,147 @@
+import sys, os
+import json
+import time
+import cProfile
+import platform
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# interval between two samples of the resident set size during a stage (seconds)
+RSS_SAMPLE_INTERVAL = 0.01
+
+def peak_rss_mb() -> float:
+    """Returns the peak resident set size of this process and its children in MB."""
+    if resource is None:
+        return 0.0
+
+    # ru_maxrss is reported in KB on Linux and in bytes on macOS
+    unit = 1.0 if sys.platform == "darwin" else 1024.0
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * unit / (1 << 20)
+
+def current_rss_mb() -> float:
+    """Returns the current resident set size of this process in MB (0 if unavailable)."""
+    try:
+        with open("/proc/self/statm", 'r') as sf:
+            return int(sf.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+    except (OSError, ValueError):
+        return 0.0
+
+@contextmanager
+def sampled_peak_rss(interval: float = RSS_SAMPLE_INTERVAL):
+    """Samples the resident set size of this process on a background thread.
+
+    Unlike peak_rss_mb, which never decreases over the life of the process, this measures
+    the peak of the enclosed block only. Allocations that live shorter than the sampling
+    interval may be missed.
+
+    Parameters:
+        interval: Time between two samples (seconds).
+
+    Returns:
+        Context manager yielding a one-element list holding the largest sample in MB,
+        final once the block exits.
+    """
+    peak = [current_rss_mb()]
+    stop = threading.Event()
+
+    def sample():
+        while not stop.wait(interval):
+            peak[0] = max(peak[0], current_rss_mb())
+
+    sampler = threading.Thread(target=sample, name="rss-sampler", daemon=True)
+    sampler.start()
+    try:
+        yield peak
+    finally:
+        stop.set()
+        sampler.join()
+        peak[0] = max(peak[0], current_rss_mb())
+
+class RunReport:
+    """Collects per-stage wall time, memory usage and item counts of a run.
+
+    Stages are timed with the stage() context manager, counters are set or accumulated
+    with count(), and the report is written as JSON with write().
+    """
+    def __init__(self, name, profile_stage=None, profile_file=None):
+        """Creates an empty report.
+
+        Parameters:
+            name: Name of the instrumented run (usually the script name).
+            profile_stage: Name of a stage to run under cProfile.
+            profile_file: Output file of the cProfile dump.
+        """
+        self.name = name
+        self.profile_stage = profile_stage
+        self.profile_file = profile_file
+        self.stages = []
+        self.counters = {}
+        self.start_time = time.time()
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, **counters):
+        """Times the enclosed block and records its memory usage as a stage.
+
+        peak_rss_mb is the largest resident set size of this process sampled during the
+        stage (see sampled_peak_rss), while process_peak_rss_mb is the peak of the process
+        and its children since they started, as reported by the OS.
+        """
+        record = {
+            "name": name,
+            "rss_before_mb": current_rss_mb(),
+        }
+        profiler = None
+        if name == self.profile_stage:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        start = time.perf_counter()
+        peak = [record["rss_before_mb"]]
+        try:
+            with sampled_peak_rss() as peak:
+                try:
+                    yield record
+                finally:
+                    record["wall_time_s"] = time.perf_counter() - start
+                    if profiler is not None:
+                        profiler.disable()
+                        if self.profile_file is not None:
+                            profiler.dump_stats(self.profile_file)
+        finally:
+            record["rss_after_mb"] = current_rss_mb()
+            record["peak_rss_mb"] = peak[0]
+            record["process_peak_rss_mb"] = peak_rss_mb()
+            record.update(counters)
+            self.stages.append(record)
+
+    def count(self, name, value, accumulate=False):
+        """Sets (or adds to) a named counter of the run."""
+        if accumulate:
+            value = self.counters.get(name, 0) + value
+        self.counters[name] = value
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "argv": sys.argv,
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "start_time": self.start_time,
+            "wall_time_s": time.perf_counter() - self.start,
+            "process_peak_rss_mb": peak_rss_mb(),
+            "stages": self.stages,
+            "counters": self.counters,
+        }
+
+    def write(self, report_file):
+        """Writes the report as JSON."""
+        with open(report_file, 'w') as rf:
+            json.dump(self.to_dict(), rf, indent=2)
@@ -0,0 +1,290 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from utils import read_cams_sfm, DEFAULT_DEPTH_PLANES
+
+DEFAULT_CACHE_DIR = os.environ.get("COLMAP_SCRIPTS_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "colmap_scripts"))
+DEFAULT_CACHE_SIZE = 20 * (1 << 30)
+
+# number of bytes hashed at each end of a model file
+HASH_BLOCK_SIZE = 1 << 20
+
+META_FILE = "meta.json"
+LOCK_FILE = ".lock"
+
+# bumped whenever the entry layout changes, so older entries are never loaded
+CACHE_VERSION = 2
+
+# prefixes of the directories that are not (yet or anymore) valid entries
+TMP_PREFIX = ".tmp-"
+TRASH_PREFIX = ".trash-"
+
+# age (seconds) after which temporary directories are assumed to be left over by a crashed process
+STALE_TMP_AGE = 3600
+
+def file_key(model_file: str) -> str:
+    """Computes the cache key of a model file from its size, mtime and content hash.
+
+    Only the first and last HASH_BLOCK_SIZE bytes are hashed, so keys of large models
+    are cheap to compute. Directories (e.g. of camera files) are keyed by the name, size
+    and mtime of their files.
+
+    Parameters:
+        model_file: Path to the model file or directory.
+
+    Returns:
+        Hex digest identifying the current version of the file.
+    """
+    if os.path.isdir(model_file):
+        return _dir_key(model_file)
+
+    st = os.stat(model_file)
+    h = hashlib.sha256()
+    h.update(f"{st.st_size}:{st.st_mtime_ns}".encode())
+    with open(model_file, 'rb') as mf:
+        h.update(mf.read(HASH_BLOCK_SIZE))
+        if st.st_size > HASH_BLOCK_SIZE:
+            mf.seek(max(HASH_BLOCK_SIZE, st.st_size - HASH_BLOCK_SIZE))
+            h.update(mf.read())
+    return h.hexdigest()
+
+def _dir_key(model_path):
+    h = hashlib.sha256()
+    with os.scandir(model_path) as it:
+        for entry in sorted(it, key=lambda e: e.name):
+            st = entry.stat()
+            h.update(f"{entry.name}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+def _entry_size(entry_path):
+    return sum(os.path.getsize(os.path.join(entry_path, f)) for f in os.listdir(entry_path))
+
+def _read_meta(entry_path):
+    with open(os.path.join(entry_path, META_FILE), 'r') as mf:
+        return json.load(mf)
+
+def _write_meta(entry_path, meta):
+    # unique temporary name, so concurrent writers never share (or replace) a partial file
+    fd, tmp_file = tempfile.mkstemp(prefix=f"{META_FILE}.", suffix=".tmp", dir=entry_path)
+    try:
+        with os.fdopen(fd, 'w') as mf:
+            json.dump(meta, mf)
+        os.replace(tmp_file, os.path.join(entry_path, META_FILE))
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+def _remove_entry(entry_path):
+    # move the entry out of the way atomically first, so readers see it either whole or gone
+    trash_path = os.path.join(os.path.dirname(entry_path), f"{TRASH_PREFIX}{os.path.basename(entry_path)}-{os.getpid()}-{time.time_ns()}")
+    try:
+        os.rename(entry_path, trash_path)
+    except OSError:
+        return
+    shutil.rmtree(trash_path, ignore_errors=True)
+
+def _is_stale(path):
+    try:
+        return time.time() - os.path.getmtime(path) > STALE_TMP_AGE
+    except OSError:
+        return False
+
+class _CacheLock:
+    """Exclusive lock of a cache directory, held while entries are removed."""
+    def __init__(self, cache_dir):
+        self.lock_file = os.path.join(cache_dir, LOCK_FILE)
+        self.fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+def list_entries(cache_dir: str) -> list:
+    """Lists the valid cache entries as (path, meta, size) tuples."""
+    if not os.path.isdir(cache_dir):
+        return []
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.startswith("."):
+            continue
+        entry_path = os.path.join(cache_dir, name)
+        try:
+            entries.append((entry_path, _read_meta(entry_path), _entry_size(entry_path)))
+        except (OSError, ValueError):
+            # incomplete, or removed by another process meanwhile
+            continue
+    return entries
+
+def evict(cache_dir: str, max_bytes: int, keep: str = None) -> None:
+    """Removes the least recently used entries until the cache fits in max_bytes.
+
+    Parameters:
+        cache_dir: Cache directory.
+        max_bytes: Maximum total size of the cache.
+        keep: Entry path that must not be evicted.
+    """
+    with _CacheLock(cache_dir):
+        # leftovers of interrupted stores and removals
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if name.startswith(TRASH_PREFIX) or (name.startswith(TMP_PREFIX) and _is_stale(path)):
+                shutil.rmtree(path, ignore_errors=True)
+
+        entries = sorted(list_entries(cache_dir), key=lambda e: e[1].get("last_used", 0))
+        total = sum(size for _, _, size in entries)
+        for entry_path, _, size in entries:
+            if total <= max_bytes:
+                break
+            if entry_path == keep:
+                continue
+            _remove_entry(entry_path)
+            total -= size
+
+def invalidate(cache_dir: str, model_file: str = None) -> None:
+    """Removes the cached entries of a model file, or the whole cache.
+
+    Parameters:
+        cache_dir: Cache directory.
+        model_file: Model file whose entries are removed (all entries if None).
+    """
+    source = os.path.realpath(model_file) if model_file is not None else None
+    if not os.path.isdir(cache_dir):
+        return
+    with _CacheLock(cache_dir):
+        for entry_path, meta, _ in list_entries(cache_dir):
+            if source is None or meta.get("source") == source:
+                _remove_entry(entry_path)
+
+def _store(entry_path, data, meta):
+    # build the entry in a unique temporary directory and publish it with one atomic rename
+    cache_dir = os.path.dirname(entry_path)
+    tmp_path = tempfile.mkdtemp(prefix=f"{TMP_PREFIX}{os.path.basename(entry_path)}-", dir=cache_dir)
+    try:
+        arrays = []
+        lists = {}
+        for key, value in data.items():
+            if isinstance(value, np.ndarray):
+                np.save(os.path.join(tmp_path, f"{key}.npy"), value)
+                arrays.append(key)
+            else:
+                lists[key] = list(value)
+        meta["arrays"] = arrays
+        meta["lists"] = lists
+        _write_meta(tmp_path, meta)
+        os.rename(tmp_path, entry_path)
+    except OSError:
+        # another process stored the same entry first (or the cache is not writable)
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+def _load(entry_path):
+    """Loads a cache entry, returning None if it is missing, incomplete or being removed."""
+    try:
+        meta = _read_meta(entry_path)
+        if meta.get("version") != CACHE_VERSION:
+            return None
+        data = {key: np.load(os.path.join(entry_path, f"{key}.npy"), mmap_mode='r') for key in meta["arrays"]}
+        data.update(meta["lists"])
+    except (OSError, ValueError, KeyError):
+        return None
+    return data, meta
+
+def cached_read(model_file: str, reader, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_SIZE, tag: str = "") -> dict:
+    """Reads a model file through the cache of unfiltered, columnar models.
+
+    On a hit the cached columns are memory-mapped; on a miss the file is parsed with
+    the given reader, stored, and any older entries of the same file are dropped.
+
+    Parameters:
+        model_file: Path to the model file (e.g. points3D.txt or images.bin).
+        reader: Function parsing the model file into a dictionary of arrays (and lists).
+        cache_dir: Cache directory.
+        max_bytes: Maximum total size of the cache.
+        tag: Suffix of the reader name separating entries read with different settings.
+
+    Returns:
+        Dictionary of (read-only, memory-mapped) arrays as produced by the reader.
+    """
+    source = os.path.realpath(model_file)
+    key = file_key(model_file)
+    reader_name = f"{reader.__name__}{tag}"
+    entry_path = os.path.join(cache_dir, f"{reader_name}-{key[:32]}-v{CACHE_VERSION}")
+
+    loaded = _load(entry_path)
+    if loaded is not None:
+        data, meta = loaded
+        meta["last_used"] = time.time()
+        try:
+            _write_meta(entry_path, meta)
+        except OSError:
+            # evicted by another process meanwhile, the mapped arrays stay valid
+            pass
+        return data
+
+    data = reader(model_file)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    _store(entry_path, data, {"version": CACHE_VERSION, "source": source, "reader": reader_name, "key": key, "last_used": time.time()})
+
+    # drop the entries of older versions of the file, but never the one just stored
+    with _CacheLock(cache_dir):
+        for old_path, meta, _ in list_entries(cache_dir):
+            if old_path != entry_path and meta.get("source") == source and meta.get("reader") == reader_name and meta.get("key") != key:
+                _remove_entry(old_path)
+    evict(cache_dir, max_bytes, keep=entry_path)
+
+    return data
+
+def read_model(model_file: str, reader, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_SIZE, tag: str = "") -> dict:
+    """Reads a model file, going through the cache unless cache_dir is None.
+
+    Parameters:
+        model_file: Path to the model file.
+        reader: Function parsing the model file into a dictionary of arrays (and lists).
+        cache_dir: Cache directory (None to always parse the file).
+        max_bytes: Maximum total size of the cache.
+        tag: Suffix of the reader name separating entries read with different settings.
+
+    Returns:
+        Dictionary of arrays as produced by the reader.
+    """
+    if cache_dir is None:
+        return reader(model_file)
+    return cached_read(model_file, reader, cache_dir, max_bytes, tag)
+
+def read_cams(cam_path: str, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_SIZE, depth_planes: int = DEFAULT_DEPTH_PLANES) -> np.ndarray:
+    """Reads a directory of SFM camera files, cached as a single Nx2x4x4 array.
+
+    Parameters:
+        cam_path: Path to the directory of camera files.
+        cache_dir: Cache directory (None to always parse the files).
+        max_bytes: Maximum total size of the cache.
+        depth_planes: Number of depth planes for camera files without a depth plane count.
+
+    Returns:
+        Array of camera extrinsics, intrinsics, and view metadata (Nx2x4x4).
+    """
+    def read_cams_sfm_array(cam_path):
+        return {"cams": read_cams_sfm(cam_path, depth_planes=depth_planes)}
+
+    # the array is small, so hand out a writable copy instead of the memory map
+    return np.array(read_model(cam_path, read_cams_sfm_array, cache_dir, max_bytes, tag=f"-{depth_planes}")["cams"])
@@ -0,0 +1,136 @@
+import numpy as np
+from scipy.spatial import cKDTree
+import argparse
+
+import model_cache
+from utils import list_images, common_image_size, camera_centers, DEFAULT_DEPTH_PLANES
+
+parser = argparse.ArgumentParser(description='Script for selecting image pairs to match from known camera poses.')
+parser.add_argument('--cam_path', type=str, help='Path to scene cameras.', required=True)
+parser.add_argument('--image_path', type=str, help='Path to scene images.', required=True)
+parser.add_argument('--output_file', type=str, help='Output match list for colmap matches_importer.', required=True)
+parser.add_argument('--top_k', type=int, help='Number of pairs to keep per image.', default=20)
+parser.add_argument('--max_angle', type=float, help='Maximum viewing direction angle between paired images (degrees).', default=60.0)
+parser.add_argument('--num_candidates', type=int, help='Number of nearest camera centers considered per image.', default=100)
+parser.add_argument('--depth_planes', type=int, help='Number of depth planes of camera files that only store the depth min and interval.', default=DEFAULT_DEPTH_PLANES)
+parser.add_argument('--cache_dir', type=str, help='Directory of the parsed camera cache.', default=model_cache.DEFAULT_CACHE_DIR)
+parser.add_argument('--no_cache', action='store_true', help='Parse the cameras from scratch without using the cache.')
+
+def viewing_directions(cams):
+    # third row of the world-to-camera rotation is the camera z-axis in world coordinates
+    return cams[:,0,2,:3]
+
+def scene_depths(cams, centers, neighbors):
+    depth_min = cams[:,1,3,0]
+    depth_max = cams[:,1,3,3]
+    depths = 0.5 * (depth_min + depth_max)
+
+    # fall back to the typical camera spacing for cameras without depth metadata
+    missing = depths <= 0
+    if missing.any():
+        spacing = np.linalg.norm(centers[neighbors[:,0]] - centers, axis=1)
+        depths[missing] = 5.0 * np.median(spacing)
+
+    return depths
+
+def frustum_samples(cams, depths, height, width, grid=3):
+    # back-project a grid of pixels at each camera's scene depth into world space
+    us, vs = np.meshgrid(np.linspace(0, width, grid+2)[1:-1], np.linspace(0, height, grid+2)[1:-1])
+    pixels = np.stack([us.ravel(), vs.ravel(), np.ones(us.size)], axis=0)
+    K_inv = np.linalg.inv(cams[:,1,:3,:3])
+    rays = np.einsum("nij,jp->npi", K_inv, pixels)
+    cam_points = rays * (depths[:,None,None] / rays[:,:,2:3])
+    R = cams[:,0,:3,:3]
+    t = cams[:,0,:3,3]
+    return np.einsum("nji,npj->npi", R, cam_points - t[:,None,:])
+
+def frustum_overlap(cams, samples, src, tgt, height, width):
+    # fraction of the source frustum samples that project inside the target image
+    R = cams[tgt,0,:3,:3]
+    t = cams[tgt,0,:3,3]
+    K = cams[tgt,1,:3,:3]
+    cam_points = np.einsum("pij,pkj->pki", R, samples[src]) + t[:,None,:]
+    z = cam_points[:,:,2]
+    proj = np.einsum("pij,pkj->pki", K, cam_points)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        u = proj[:,:,0] / z
+        v = proj[:,:,1] / z
+    inside = (z > 0) & (u >= 0) & (u < width) & (v >= 0) & (v < height)
+    return inside.mean(axis=1)
+
+def select_pairs(cams, height, width, top_k=20, max_angle=60.0, num_candidates=100):
+    """Ranks candidate image pairs using known camera poses.
+
+    Parameters:
+        cams: Camera extrinsics and intrinsics (Nx2x4x4).
+        height: Image height.
+        width: Image width.
+        top_k: Number of pairs to keep per image.
+        max_angle: Maximum viewing direction angle between paired images (degrees).
+        num_candidates: Number of nearest camera centers considered per image.
+
+    Returns:
+        Unique image index pairs (Px2) with the first index smaller than the second.
+    """
+    num_cams = cams.shape[0]
+    if num_cams < 2:
+        return np.zeros((0,2), dtype=np.int64)
+
+    centers = camera_centers(cams)
+    directions = viewing_directions(cams)
+    directions = directions / np.linalg.norm(directions, axis=1, keepdims=True)
+
+    # candidate pairs from the nearest camera centers
+    k = min(num_candidates, num_cams-1)
+    distances, neighbors = cKDTree(centers).query(centers, k=k+1)
+    distances = distances[:,1:].reshape(num_cams, k)
+    neighbors = neighbors[:,1:].reshape(num_cams, k)
+    src = np.repeat(np.arange(num_cams), k)
+    tgt = neighbors.ravel()
+
+    # viewing direction angle
+    cos_angle = np.einsum("pi,pi->p", directions[src], directions[tgt])
+    valid = cos_angle >= np.cos(np.deg2rad(max_angle))
+
+    # symmetric frustum overlap
+    depths = scene_depths(cams, centers, neighbors)
+    samples = frustum_samples(cams, depths, height, width)
+    overlap = 0.5 * (frustum_overlap(cams, samples, src, tgt, height, width) + frustum_overlap(cams, samples, tgt, src, height, width))
+    valid &= overlap > 0
+
+    # favor overlapping, similarly oriented and nearby cameras
+    scale = np.median(distances[:,0]) + 1e-12
+    score = overlap * cos_angle / (1.0 + (distances.ravel() / scale))
+    score[~valid] = -np.inf
+    score = score.reshape(num_cams, k)
+
+    top = min(top_k, k)
+    best = np.argsort(-score, axis=1)[:,:top]
+    rows = np.repeat(np.arange(num_cams), top)
+    keep = np.isfinite(score[rows, best.ravel()])
+    pairs = np.stack([rows[keep], neighbors[rows, best.ravel()][keep]], axis=1)
+
+    pairs = np.sort(pairs, axis=1)
+    return np.unique(pairs, axis=0)
+
+def write_match_list(pairs, image_files, output_file):
+    with open(output_file, 'w') as of:
+        of.writelines(f"{image_files[i]} {image_files[j]}\n" for i,j in pairs)
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+
+    # read in data
+    cams = model_cache.read_cams(args.cam_path, None if args.no_cache else args.cache_dir, depth_planes=args.depth_planes)
+    num_cams = cams.shape[0]
+    image_files = list_images(args.image_path, (".png",))
+    image_files = image_files[:num_cams]
+
+    # get image shape
+    height, width = common_image_size(args.image_path, image_files)
+
+    pairs = select_pairs(cams, height, width, args.top_k, args.max_angle, args.num_candidates)
+    write_match_list(pairs, image_files, args.output_file)
+
+if __name__=="__main__":
+    main()
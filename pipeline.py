@@ -0,0 +1,403 @@
+import sys, os
+import ast
+import json
+import hashlib
+import shlex
+import subprocess
+import argparse
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+parser = argparse.ArgumentParser(description='Script for running the colmap sparse depth pipeline with stage-level caching.')
+parser.add_argument('--dataset', type=str, help='Dataset layout profile.', choices=['dtu', 'tnt'], required=True)
+parser.add_argument('--data_path', type=str, help='Path to the dataset root.', required=True)
+parser.add_argument('--scene', type=str, help='Scene to process.', required=True)
+parser.add_argument('--max_error', type=float, help='Maximum point error threshold.', default=2.0)
+parser.add_argument('--min_track_len', type=int, help='Minimum required point track length.', default=3)
+parser.add_argument('--matcher', type=str, help='Image pair matching strategy.', choices=['exhaustive', 'pose'], default='exhaustive')
+parser.add_argument('--top_k_pairs', type=int, help='Number of pairs per image for the pose matcher.', default=20)
+parser.add_argument('--workers', type=int, help='Number of worker processes used to render the depth maps.', default=1)
+parser.add_argument('--colmap', type=str, help='Colmap executable (may include leading arguments).', default='colmap')
+parser.add_argument('--colmap_threads', type=int, help='Number of threads used by each colmap stage (-1 uses all cores).', default=-1)
+parser.add_argument('--incremental', action='store_true', help='Add new frames to the existing database instead of rebuilding the scene.')
+parser.add_argument('--force', type=str, nargs='*', help='Stages to rerun even if their outputs are current.', default=[])
+parser.add_argument('--dry_run', action='store_true', help='Only report which stages would run.')
+
+# dataset layout profiles: path templates filled with the data path and scene
+PROFILES = {
+    "dtu": {
+        "cam_path": "{data_path}/Cameras",
+        "image_path": "{data_path}/Images/{scene}",
+        "colmap_path": "{data_path}/colmap/{scene}",
+        "depth_path": "{data_path}/Sparse_Depths/{scene}",
+        "ply_file": "{data_path}/Sparse_Points/{scene}_sparse.ply",
+    },
+    "tnt": {
+        "cam_path": "{data_path}/{scene}/Cameras",
+        "image_path": "{data_path}/{scene}/Images",
+        "colmap_path": "{data_path}/{scene}/colmap",
+        "depth_path": "{data_path}/{scene}/Depths_Sparse",
+        "ply_file": "{data_path}/{scene}/{scene}_sparse.ply",
+    },
+}
+
+STATE_FILE = "pipeline_state.json"
+
+class Stage:
+    """A pipeline step with declared inputs, outputs and upstream stages.
+
+    Stages are fingerprinted by hashing their commands together with the signatures
+    of their input paths and the fingerprints of the stages they depend on. The number
+    of cores a stage occupies is used by the multi-scene scheduler.
+    """
+    def __init__(self, name, commands, inputs=(), outputs=(), deps=(), kind="python", cores=1):
+        self.name = name
+        self.commands = commands
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.deps = list(deps)
+        self.kind = kind
+        self.cores = cores
+
+def path_signature(path):
+    """Summarizes a file or directory by the names, sizes and mtimes of its files."""
+    if not os.path.exists(path):
+        return None
+    if os.path.isfile(path):
+        st = os.stat(path)
+        return [os.path.basename(path), st.st_size, st.st_mtime_ns]
+
+    entries = []
+    for root, _, files in os.walk(path):
+        for f in sorted(files):
+            st = os.stat(os.path.join(root, f))
+            entries.append([os.path.relpath(os.path.join(root, f), path), st.st_size, st.st_mtime_ns])
+    entries.sort()
+    return entries
+
+def script_sources(name, script_dir=SCRIPT_DIR):
+    """Lists a script and every repository module it imports, directly or transitively.
+
+    Imports are found in the source of each module, including the ones made inside
+    functions, so the stage fingerprints follow the code that actually runs.
+    """
+    sources = []
+    pending = [name]
+    while pending:
+        path = os.path.join(script_dir, pending.pop())
+        if path in sources or not os.path.isfile(path):
+            continue
+        sources.append(path)
+        with open(path, 'r') as sf:
+            tree = ast.parse(sf.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                modules = [node.module]
+            else:
+                continue
+            pending.extend(f"{module.split('.')[0]}.py" for module in modules)
+    return sorted(sources)
+
+def stage_fingerprint(stage, dep_fingerprints):
+    h = hashlib.sha256()
+    h.update(json.dumps(stage.commands).encode())
+    for path in stage.inputs:
+        h.update(json.dumps([path, path_signature(path)]).encode())
+    for dep in stage.deps:
+        h.update(dep_fingerprints[dep].encode())
+    return h.hexdigest()
+
+def topological_order(stages):
+    by_name = {stage.name: stage for stage in stages}
+    order = []
+    visiting = set()
+    done = set()
+
+    def visit(stage):
+        if stage.name in done:
+            return
+        if stage.name in visiting:
+            raise Exception(f"Pipeline has a dependency cycle through stage '{stage.name}'.")
+        visiting.add(stage.name)
+        for dep in stage.deps:
+            visit(by_name[dep])
+        visiting.remove(stage.name)
+        done.add(stage.name)
+        order.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return order
+
+def downstream(stages, name):
+    """Returns the names of all stages that transitively depend on the given stage."""
+    affected = set()
+    for stage in topological_order(stages):
+        if name in stage.deps or affected.intersection(stage.deps):
+            affected.add(stage.name)
+    return affected
+
+def load_state(state_file):
+    if not os.path.exists(state_file):
+        return {}
+    with open(state_file, 'r') as sf:
+        return json.load(sf)
+
+def save_state(state_file, state):
+    tmp_file = f"{state_file}.tmp"
+    with open(tmp_file, 'w') as sf:
+        json.dump(state, sf, indent=2)
+    os.replace(tmp_file, state_file)
+
+def scene_paths(dataset, data_path, scene):
+    return {key: template.format(data_path=data_path, scene=scene) for key, template in PROFILES[dataset].items()}
+
+def build_stages(paths, max_error, min_track_len, matcher="exhaustive", top_k_pairs=20, workers=1, colmap="colmap", colmap_threads=-1, incremental=False):
+    """Builds the sparse depth pipeline for a single scene.
+
+    Parameters:
+        paths: Scene paths as returned by scene_paths.
+        max_error: Maximum point error threshold.
+        min_track_len: Minimum required point track length.
+        matcher: Image pair matching strategy ('exhaustive' or 'pose').
+        top_k_pairs: Number of pairs per image for the pose matcher.
+        workers: Number of worker processes used to render the depth maps.
+        colmap: Colmap executable, optionally followed by leading arguments.
+        colmap_threads: Number of threads used by each colmap stage (-1 uses all cores).
+        incremental: Add new frames to the existing database and only match and render what they affect.
+
+    Returns:
+        List of pipeline stages.
+    """
+    python = sys.executable
+    script = lambda name: os.path.join(SCRIPT_DIR, name)
+    database_file = os.path.join(paths["colmap_path"], "database.db")
+    text_path = os.path.join(paths["colmap_path"], "sparse", "text")
+    sparse_path = os.path.join(paths["colmap_path"], "sparse")
+    pairs_file = os.path.join(paths["colmap_path"], "pairs.txt")
+    new_pairs_file = os.path.join(paths["colmap_path"], "new_pairs.txt")
+
+    colmap = shlex.split(colmap) if isinstance(colmap, str) else list(colmap)
+    colmap_cores = colmap_threads if colmap_threads > 0 else (os.cpu_count() or 1)
+    threads = lambda option: [option, str(colmap_threads)] if colmap_threads > 0 else []
+
+    if incremental and matcher == "pose":
+        # the database stage lists the pairs involving new images
+        match_commands = [
+            [*colmap, "matches_importer",
+                "--database_path", database_file,
+                "--match_list_path", new_pairs_file,
+                "--match_type", "pairs",
+                *threads("--SiftMatching.num_threads")],
+        ]
+        match_inputs = []
+    elif matcher == "pose":
+        match_commands = [
+            [python, script("pair_selection.py"),
+                "--cam_path", paths["cam_path"],
+                "--image_path", paths["image_path"],
+                "--output_file", pairs_file,
+                "--top_k", str(top_k_pairs)],
+            [*colmap, "matches_importer",
+                "--database_path", database_file,
+                "--match_list_path", pairs_file,
+                "--match_type", "pairs",
+                *threads("--SiftMatching.num_threads")],
+        ]
+        match_inputs = [paths["cam_path"], *script_sources("pair_selection.py")]
+    else:
+        match_commands = [[*colmap, "exhaustive_matcher", "--database_path", database_file, *threads("--SiftMatching.num_threads")]]
+        match_inputs = []
+
+    report_path = os.path.join(paths["colmap_path"], "reports")
+    report = lambda name: os.path.join(report_path, f"{name}.json")
+
+    # colmap skips the features and pairs that are already in the database
+    database_options = ["--incremental", "--pairs_file", new_pairs_file, "--top_k_pairs", str(top_k_pairs)] if incremental else []
+    database_outputs = [new_pairs_file] if incremental else []
+    depth_options = ["--incremental"] if incremental else []
+
+    return [
+        Stage(
+            "database",
+            [[python, script("database.py"),
+                "--cam_path", paths["cam_path"],
+                "--image_path", paths["image_path"],
+                "--database_file", database_file,
+                "--output_path", text_path,
+                "--report_file", report("database"),
+                *database_options]],
+            inputs=[paths["cam_path"], paths["image_path"], *script_sources("database.py")],
+            outputs=[database_file, text_path, report("database"), *database_outputs],
+        ),
+        Stage(
+            "features",
+            [[*colmap, "feature_extractor",
+                "--database_path", database_file,
+                "--image_path", paths["image_path"],
+                *threads("--SiftExtraction.num_threads")]],
+            inputs=[paths["image_path"]],
+            outputs=[database_file],
+            deps=["database"],
+            kind="colmap",
+            cores=colmap_cores,
+        ),
+        Stage(
+            "matching",
+            match_commands,
+            inputs=match_inputs,
+            outputs=[database_file],
+            deps=["features"],
+            kind="colmap",
+            cores=colmap_cores,
+        ),
+        Stage(
+            "triangulation",
+            [[*colmap, "point_triangulator",
+                "--database_path", database_file,
+                "--image_path", paths["image_path"],
+                "--input_path", text_path,
+                "--output_path", sparse_path,
+                *threads("--Mapper.num_threads")]],
+            outputs=[os.path.join(sparse_path, "points3D.bin"), os.path.join(sparse_path, "images.bin")],
+            deps=["matching"],
+            kind="colmap",
+            cores=colmap_cores,
+        ),
+        Stage(
+            "depth",
+            [[python, script("colmap2sparse.py"),
+                "--model_path", sparse_path,
+                "--cam_path", paths["cam_path"],
+                "--image_path", paths["image_path"],
+                "--output_path", paths["depth_path"],
+                "--max_error", str(max_error),
+                "--min_track_len", str(min_track_len),
+                "--workers", str(workers),
+                "--report_file", report("depth"),
+                *depth_options]],
+            inputs=[paths["cam_path"], *script_sources("colmap2sparse.py")],
+            outputs=[paths["depth_path"], report("depth")],
+            deps=["triangulation"],
+            cores=workers,
+        ),
+        Stage(
+            "ply",
+            [[python, script("colmap2ply.py"),
+                "--model_path", sparse_path,
+                "--output_file", paths["ply_file"],
+                "--max_error", str(max_error),
+                "--min_track_len", str(min_track_len),
+                "--report_file", report("ply")]],
+            inputs=script_sources("colmap2ply.py"),
+            outputs=[paths["ply_file"], report("ply")],
+            deps=["triangulation"],
+        ),
+    ]
+
+def prepare_outputs(stage):
+    # directories are created as-is, files get their parent directory created
+    for path in stage.outputs:
+        if os.path.splitext(path)[1]:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        else:
+            os.makedirs(path, exist_ok=True)
+
+def pipeline_steps(stages, state_file, force=(), dry_run=False, log=print):
+    """Walks the stages in dependency order, yielding every stage that must be run.
+
+    The caller runs each yielded stage and resumes the generator once the stage has
+    succeeded, at which point its fingerprint is recorded. Stages whose fingerprint
+    matches the recorded one and whose outputs exist are skipped.
+
+    Parameters:
+        stages: Pipeline stages.
+        state_file: JSON file recording the fingerprint of every completed stage.
+        force: Names of stages to rerun regardless of their fingerprint.
+        dry_run: Do not modify the recorded state.
+        log: Callable used to report the status of each stage.
+    """
+    state = load_state(state_file)
+    fingerprints = {}
+    executed = []
+
+    for stage in topological_order(stages):
+        fingerprint = stage_fingerprint(stage, fingerprints)
+        fingerprints[stage.name] = fingerprint
+
+        current = (
+            stage.name not in force
+            and not any(dep in executed for dep in stage.deps)
+            and state.get(stage.name) == fingerprint
+            and all(os.path.exists(path) for path in stage.outputs)
+        )
+        if current:
+            log(f"[{stage.name}] up to date")
+            continue
+
+        executed.append(stage.name)
+        if dry_run:
+            log(f"[{stage.name}] would run")
+            yield stage
+            continue
+
+        log(f"[{stage.name}] running")
+        # a rerun stage invalidates everything downstream of it, even after a crash
+        state.pop(stage.name, None)
+        for name in downstream(stages, stage.name):
+            state.pop(name, None)
+        save_state(state_file, state)
+
+        prepare_outputs(stage)
+        yield stage
+
+        state[stage.name] = fingerprint
+        save_state(state_file, state)
+
+def run_stage(stage, run_command=subprocess.run):
+    for command in stage.commands:
+        run_command(command, check=True)
+
+def run_pipeline(stages, state_file, force=(), dry_run=False, run_command=subprocess.run):
+    """Runs the stages in dependency order, skipping stages whose outputs are current.
+
+    Parameters:
+        stages: Pipeline stages.
+        state_file: JSON file recording the fingerprint of every completed stage.
+        force: Names of stages to rerun regardless of their fingerprint.
+        dry_run: Only report which stages would run.
+        run_command: Callable used to execute each stage command.
+
+    Returns:
+        Names of the stages that were (or would be) run.
+    """
+    executed = []
+    for stage in pipeline_steps(stages, state_file, force, dry_run):
+        executed.append(stage.name)
+        if not dry_run:
+            run_stage(stage, run_command)
+
+    return executed
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    paths = scene_paths(args.dataset, args.data_path, args.scene)
+    stages = build_stages(
+        paths,
+        args.max_error,
+        args.min_track_len,
+        args.matcher,
+        args.top_k_pairs,
+        args.workers,
+        args.colmap,
+        args.colmap_threads,
+        args.incremental,
+    )
+
+    os.makedirs(paths["colmap_path"], exist_ok=True)
+    run_pipeline(stages, os.path.join(paths["colmap_path"], STATE_FILE), args.force, args.dry_run)
+
+if __name__=="__main__":
+    main()
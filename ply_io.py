@@ -0,0 +1,209 @@
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+
+PLY_VERTEX_DTYPE = np.dtype([
+    ("x", "<f4"),
+    ("y", "<f4"),
+    ("z", "<f4"),
+    ("red", "u1"),
+    ("green", "u1"),
+    ("blue", "u1"),
+])
+
+PLY_CHUNK_SIZE = 1 << 20
+
+# voxel and tile coordinates are packed into int64 keys with this many bits per axis
+GRID_KEY_BITS = 21
+
+TILE_INDEX = "tiles.json"
+
+def ply_header(num_points: int, ply_format: str = "binary") -> str:
+    """Builds the header of a colored point cloud PLY file.
+
+    Parameters:
+        num_points: Number of vertices stored in the file.
+        ply_format: Either 'ascii' or 'binary' (little endian).
+
+    Returns:
+        PLY header string, including the end_header line.
+    """
+    header = "ply\n"
+    header += "format ascii 1.0\n" if ply_format == "ascii" else "format binary_little_endian 1.0\n"
+    header += "comment Right-Handed System\n"
+    header += f"element vertex {num_points}\n"
+    header += "property float x\n"
+    header += "property float y\n"
+    header += "property float z\n"
+    header += "property uchar red\n"
+    header += "property uchar green\n"
+    header += "property uchar blue\n"
+    header += "end_header\n"
+    return header
+
+def write_ply(ply_file: str, xyz: np.ndarray, rgb: np.ndarray, ply_format: str = "binary", chunk_size: int = PLY_CHUNK_SIZE) -> None:
+    """Writes a colored point cloud to a PLY file in fixed-size chunks.
+
+    Parameters:
+        ply_file: Output PLY file.
+        xyz: Point positions (Nx3).
+        rgb: Point colors (Nx3).
+        ply_format: Either 'ascii' or 'binary' (little endian).
+        chunk_size: Number of points converted and written at a time.
+    """
+    if ply_format not in ("ascii", "binary"):
+        raise Exception(f"Unsupported PLY format '{ply_format}'.")
+
+    num_points = xyz.shape[0]
+    with open(ply_file, 'wb') as of:
+        of.write(ply_header(num_points, ply_format).encode("ascii"))
+
+        chunk = np.empty(min(chunk_size, num_points), dtype=PLY_VERTEX_DTYPE)
+        for start in range(0, num_points, chunk_size):
+            end = min(start + chunk_size, num_points)
+            _write_vertices(of, xyz[start:end], rgb[start:end], ply_format, chunk[:end-start])
+
+def _write_vertices(of, xyz, rgb, ply_format, block=None):
+    # writes the vertex rows of a PLY body (block is an optional PLY_VERTEX_DTYPE buffer)
+    if ply_format == "ascii":
+        np.savetxt(of, np.hstack([xyz, rgb]), fmt="%.8g %.8g %.8g %d %d %d")
+        return
+
+    block = block if block is not None else np.empty(xyz.shape[0], dtype=PLY_VERTEX_DTYPE)
+    block["x"] = xyz[:,0]
+    block["y"] = xyz[:,1]
+    block["z"] = xyz[:,2]
+    block["red"] = rgb[:,0]
+    block["green"] = rgb[:,1]
+    block["blue"] = rgb[:,2]
+    of.write(block.tobytes())
+
+def grid_keys(xyz: np.ndarray, cell_size: float) -> np.ndarray:
+    """Hashes points to the integer cells of a regular grid.
+
+    Parameters:
+        xyz: Point positions (Nx3).
+        cell_size: Edge length of the grid cells.
+
+    Returns:
+        Key of the cell of every point (N), ordered like the cell coordinates (x, y, z).
+    """
+    half = 1 << (GRID_KEY_BITS - 1)
+    cells = np.floor(np.asarray(xyz, dtype=np.float64) / cell_size).astype(np.int64) + half
+    if cells.size and (cells.min() < 0 or cells.max() >= 2 * half):
+        raise ValueError(f"Points lie further than {half} cells of size {cell_size} from the origin.")
+    return (cells[:,0] << (2 * GRID_KEY_BITS)) | (cells[:,1] << GRID_KEY_BITS) | cells[:,2]
+
+def grid_cells(keys: np.ndarray) -> np.ndarray:
+    """Returns the integer cell coordinates (Nx3) of grid keys (see grid_keys)."""
+    mask = (1 << GRID_KEY_BITS) - 1
+    half = 1 << (GRID_KEY_BITS - 1)
+    return np.stack([keys >> (2 * GRID_KEY_BITS), (keys >> GRID_KEY_BITS) & mask, keys & mask], axis=1) - half
+
+def _reduce_voxels(keys, sums, counts):
+    keys, inverse = np.unique(keys, return_inverse=True)
+    reduced = np.zeros((keys.shape[0], sums.shape[1]), dtype=np.float64)
+    for c in range(sums.shape[1]):
+        reduced[:,c] = np.bincount(inverse, weights=sums[:,c], minlength=keys.shape[0])
+    return keys, reduced, np.bincount(inverse, weights=counts, minlength=keys.shape[0])
+
+def voxel_downsample(xyz: np.ndarray, rgb: np.ndarray, voxel_size: float, chunk_size: int = PLY_CHUNK_SIZE) -> tuple:
+    """Replaces the points of every voxel by their centroid and mean color.
+
+    Points are aggregated chunk_size at a time, so memory is bounded by the number of
+    occupied voxels rather than the number of points (xyz and rgb may be memory maps).
+
+    Parameters:
+        xyz: Point positions (Nx3).
+        rgb: Point colors (Nx3).
+        voxel_size: Edge length of the voxels.
+        chunk_size: Number of points aggregated at a time.
+
+    Returns:
+        Centroids (Vx3) and mean colors (Vx3) of the occupied voxels, ordered by voxel.
+    """
+    keys = np.zeros(0, dtype=np.int64)
+    sums = np.zeros((0, 6), dtype=np.float64)
+    counts = np.zeros(0, dtype=np.float64)
+    for start in range(0, xyz.shape[0], chunk_size):
+        chunk_xyz = np.asarray(xyz[start:start+chunk_size], dtype=np.float64)
+        chunk_rgb = np.asarray(rgb[start:start+chunk_size], dtype=np.float64)
+        chunk = _reduce_voxels(grid_keys(chunk_xyz, voxel_size), np.hstack([chunk_xyz, chunk_rgb]), np.ones(chunk_xyz.shape[0]))
+
+        # merge with the voxels of the previous chunks
+        keys, sums, counts = _reduce_voxels(
+            np.concatenate([keys, chunk[0]]),
+            np.concatenate([sums, chunk[1]]),
+            np.concatenate([counts, chunk[2]]),
+        )
+
+    means = sums / np.maximum(counts, 1)[:,None]
+    return means[:,:3], np.clip(np.round(means[:,3:]), 0, 255).astype(np.uint8)
+
+def write_tiles(tile_path: str, xyz: np.ndarray, rgb: np.ndarray, tile_size: float, ply_format: str = "binary", chunk_size: int = PLY_CHUNK_SIZE) -> list:
+    """Splits a colored point cloud into cubic tiles written as separate PLY files.
+
+    Every occupied tile is written to tile_<x>_<y>_<z>.ply in tile_path, along with an
+    index file (tiles.json) listing the file, point count and bounding box of each tile,
+    so clients can load only the region they need. Points are assigned to tiles
+    chunk_size at a time and appended to per-tile vertex files, so memory is bounded by
+    the chunk and the number of tiles (xyz and rgb may be memory maps).
+
+    Parameters:
+        tile_path: Output directory of the tiles.
+        xyz: Point positions (Nx3).
+        rgb: Point colors (Nx3).
+        tile_size: Edge length of the tiles.
+        ply_format: Either 'ascii' or 'binary' (little endian).
+        chunk_size: Number of points assigned to tiles at a time.
+
+    Returns:
+        Index entry of every tile.
+    """
+    if ply_format not in ("ascii", "binary"):
+        raise Exception(f"Unsupported PLY format '{ply_format}'.")
+
+    os.makedirs(tile_path, exist_ok=True)
+    body_path = tempfile.mkdtemp(prefix=".vertices-", dir=tile_path)
+    stats = {}
+    try:
+        for start in range(0, xyz.shape[0], chunk_size):
+            chunk_xyz = np.asarray(xyz[start:start+chunk_size], dtype=np.float64)
+            chunk_rgb = np.asarray(rgb[start:start+chunk_size])
+            keys = grid_keys(chunk_xyz, tile_size)
+            order = np.argsort(keys, kind="stable")
+            tile_keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+
+            # the points of every tile keep their input order across chunks
+            for key, tile_start, count in zip(tile_keys.tolist(), starts, counts):
+                inds = order[tile_start:tile_start+count]
+                tile_xyz = chunk_xyz[inds]
+                with open(os.path.join(body_path, str(key)), 'ab') as bf:
+                    _write_vertices(bf, tile_xyz, chunk_rgb[inds], ply_format)
+
+                num_points, bbox_min, bbox_max = stats.get(key, (0, tile_xyz[0], tile_xyz[0]))
+                stats[key] = (num_points + int(count), np.minimum(bbox_min, tile_xyz.min(axis=0)), np.maximum(bbox_max, tile_xyz.max(axis=0)))
+
+        tiles = []
+        tile_keys = np.array(sorted(stats), dtype=np.int64)
+        for key, cell in zip(tile_keys.tolist(), grid_cells(tile_keys)):
+            num_points, bbox_min, bbox_max = stats[key]
+            tile_file = f"tile_{cell[0]}_{cell[1]}_{cell[2]}.ply"
+            with open(os.path.join(tile_path, tile_file), 'wb') as of, open(os.path.join(body_path, str(key)), 'rb') as bf:
+                of.write(ply_header(num_points, ply_format).encode("ascii"))
+                shutil.copyfileobj(bf, of)
+            tiles.append({
+                "file": tile_file,
+                "cell": cell.tolist(),
+                "num_points": num_points,
+                "bbox_min": bbox_min.tolist(),
+                "bbox_max": bbox_max.tolist(),
+            })
+    finally:
+        shutil.rmtree(body_path, ignore_errors=True)
+
+    with open(os.path.join(tile_path, TILE_INDEX), 'w') as tf:
+        json.dump({"tile_size": tile_size, "format": ply_format, "tiles": tiles}, tf, indent=2)
+    return tiles
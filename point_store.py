@@ -0,0 +1,167 @@
+import os
+import json
+import numpy as np
+
+import colmap_io
+from visibility import VisibilityIndex
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+META_FILE = "meta.json"
+
+# dtype and row shape of every column of a store
+POINT_COLUMNS = {
+    "ids": ("<i8", ()),
+    "xyz": ("<f8", (3,)),
+    "rgb": ("u1", (3,)),
+    "error": ("<f8", ()),
+    "track_lens": ("<i8", ()),
+    "track_offsets": ("<i8", ()),
+    "track_image_ids": ("<i4", ()),
+    "track_point2d_ids": ("<i4", ()),
+}
+
+INDEX_COLUMNS = {
+    "image_ids": ("<i8", ()),
+    "row_ptr": ("<i8", ()),
+    "point_inds": ("<i8", ()),
+}
+
+def _open_column(store_path, key, dtype, shape, mode='r'):
+    if shape[0] == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(os.path.join(store_path, f"{key}.bin"), dtype=dtype, mode=mode, shape=shape)
+
+def _read_meta(store_path):
+    with open(os.path.join(store_path, META_FILE), 'r') as mf:
+        return json.load(mf)
+
+def _write_meta(store_path, meta):
+    with open(os.path.join(store_path, META_FILE), 'w') as mf:
+        json.dump(meta, mf)
+
+def write_point_store(points_file: str, store_path: str, max_error: float, min_track_len: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> tuple:
+    """Filters a colmap points3D file chunk by chunk into on-disk columns.
+
+    Only one chunk of points is held in memory at a time: every chunk is filtered and its
+    surviving points are appended to one raw file per column.
+
+    Parameters:
+        points_file: Path to the colmap points3D.txt or points3D.bin file.
+        store_path: Output directory of the columns.
+        max_error: Maximum point error threshold.
+        min_track_len: Minimum required point track length.
+        chunk_size: Maximum number of points read and filtered at a time.
+
+    Returns:
+        Columnar points as returned by open_point_store, and the number of points read.
+    """
+    os.makedirs(store_path, exist_ok=True)
+    files = {key: open(os.path.join(store_path, f"{key}.bin"), 'wb') for key in POINT_COLUMNS}
+    num_loaded = 0
+    num_points = 0
+    num_obs = 0
+    try:
+        files["track_offsets"].write(np.zeros(1, dtype="<i8").tobytes())
+        for chunk in colmap_io.iter_points3d(points_file, chunk_size):
+            num_loaded += chunk["ids"].shape[0]
+            chunk = colmap_io.filter_points(chunk, max_error, min_track_len)
+            chunk["track_lens"] = np.diff(chunk["track_offsets"])
+
+            # track offsets continue from the observations of the previous chunks
+            offsets = chunk["track_offsets"][1:] + num_obs
+            num_points += chunk["ids"].shape[0]
+            num_obs = int(offsets[-1]) if offsets.shape[0] else num_obs
+            chunk["track_offsets"] = offsets
+
+            for key, (dtype, _) in POINT_COLUMNS.items():
+                files[key].write(np.ascontiguousarray(chunk[key], dtype=dtype).tobytes())
+    finally:
+        for f in files.values():
+            f.close()
+
+    _write_meta(store_path, {"num_loaded": num_loaded, "num_points": num_points, "num_obs": num_obs})
+    return open_point_store(store_path), num_loaded
+
+def open_point_store(store_path: str) -> dict:
+    """Opens the columns written by write_point_store as read-only memory maps.
+
+    Parameters:
+        store_path: Directory of the columns.
+
+    Returns:
+        Columnar points in the layout of colmap_io.load_points, plus their track_lens (N).
+    """
+    meta = _read_meta(store_path)
+    rows = {
+        "track_offsets": meta["num_points"] + 1,
+        "track_image_ids": meta["num_obs"],
+        "track_point2d_ids": meta["num_obs"],
+    }
+    return {
+        key: _open_column(store_path, key, dtype, (rows.get(key, meta["num_points"]), *shape))
+        for key, (dtype, shape) in POINT_COLUMNS.items()
+    }
+
+def build_visibility(points: dict, store_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> VisibilityIndex:
+    """Builds the image-to-point visibility index of stored points into on-disk columns.
+
+    The index is built in two passes over the tracks, chunk_size points at a time: the
+    first counts the observations of every image, the second scatters the point indices
+    into their rows. The result is identical to VisibilityIndex.from_points.
+
+    Parameters:
+        points: Columnar points as returned by open_point_store.
+        store_path: Output directory of the index columns.
+        chunk_size: Maximum number of points processed at a time.
+
+    Returns:
+        Visibility index backed by read-only memory maps.
+    """
+    os.makedirs(store_path, exist_ok=True)
+    track_offsets = points["track_offsets"]
+    track_image_ids = points["track_image_ids"]
+    num_points = points["xyz"].shape[0]
+    num_obs = track_image_ids.shape[0]
+
+    counts = np.zeros(0, dtype=np.int64)
+    for start in range(0, num_points, chunk_size):
+        image_ids = track_image_ids[track_offsets[start]:track_offsets[min(start + chunk_size, num_points)]]
+        chunk_counts = np.bincount(image_ids)
+        if chunk_counts.shape[0] > counts.shape[0]:
+            counts = np.pad(counts, (0, chunk_counts.shape[0] - counts.shape[0]))
+        counts[:chunk_counts.shape[0]] += chunk_counts
+
+    image_ids = np.flatnonzero(counts)
+    row_ptr = np.zeros(image_ids.shape[0] + 1, dtype=np.int64)
+    np.cumsum(counts[image_ids], out=row_ptr[1:])
+
+    # next free slot of every image id, filled in point order so rows stay sorted
+    cursor = np.zeros(counts.shape[0], dtype=np.int64)
+    cursor[image_ids] = row_ptr[:-1]
+    point_inds = _open_column(store_path, "point_inds", "<i8", (num_obs,), mode='w+')
+    for start in range(0, num_points, chunk_size):
+        end = min(start + chunk_size, num_points)
+        chunk_ids = np.asarray(track_image_ids[track_offsets[start]:track_offsets[end]])
+        chunk_points = np.repeat(np.arange(start, end, dtype=np.int64), np.diff(track_offsets[start:end+1]))
+
+        order = np.argsort(chunk_ids, kind="stable")
+        chunk_ids = chunk_ids[order]
+        chunk_counts = np.bincount(chunk_ids, minlength=counts.shape[0])
+        group_starts = np.cumsum(chunk_counts) - chunk_counts
+        ranks = np.arange(chunk_ids.shape[0]) - group_starts[chunk_ids]
+        point_inds[cursor[chunk_ids] + ranks] = chunk_points[order]
+        cursor += chunk_counts
+    if isinstance(point_inds, np.memmap):
+        point_inds.flush()
+    del point_inds
+
+    for key, values in [("image_ids", image_ids), ("row_ptr", row_ptr)]:
+        values.astype(INDEX_COLUMNS[key][0]).tofile(os.path.join(store_path, f"{key}.bin"))
+
+    return VisibilityIndex.from_csr(
+        points["xyz"],
+        _open_column(store_path, "image_ids", "<i8", image_ids.shape),
+        _open_column(store_path, "row_ptr", "<i8", row_ptr.shape),
+        _open_column(store_path, "point_inds", "<i8", (num_obs,)),
+    )
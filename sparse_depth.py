@@ -0,0 +1,67 @@
+import numpy as np
+
+def write_sparse_depth(sparse_file: str, pixels: np.ndarray, depth: np.ndarray, shape: tuple, point_ids: np.ndarray = None, errors: np.ndarray = None, track_lens: np.ndarray = None) -> None:
+    """Writes the valid pixels of a sparse depth map to a compressed *.npz file.
+
+    Parameters:
+        sparse_file: Output sparse depth file.
+        pixels: Linear (row-major) indices of the valid pixels (M).
+        depth: Depth at each valid pixel (M).
+        shape: Height and width of the full depth map.
+        point_ids: Optional colmap point id at each valid pixel (M).
+        errors: Optional point reprojection error at each valid pixel (M).
+        track_lens: Optional point track length at each valid pixel (M).
+    """
+    data = {
+        "shape": np.asarray(shape, dtype=np.int64),
+        "pixels": np.asarray(pixels, dtype=np.uint32),
+        "depth": np.asarray(depth, dtype=np.float32),
+    }
+    if point_ids is not None:
+        data["point_ids"] = np.asarray(point_ids, dtype=np.int64)
+    if errors is not None:
+        data["errors"] = np.asarray(errors, dtype=np.float32)
+    if track_lens is not None:
+        data["track_lens"] = np.asarray(track_lens, dtype=np.uint16 if track_lens.max(initial=0) < (1 << 16) else np.uint32)
+
+    with open(sparse_file, 'wb') as sf:
+        np.savez_compressed(sf, **data)
+
+def read_sparse_depth(sparse_file: str) -> dict:
+    """Reads a sparse depth file written by write_sparse_depth.
+
+    Parameters:
+        sparse_file: Input sparse depth file.
+
+    Returns:
+        Dictionary of the map shape, pixel indices, depths and any optional per-pixel values.
+    """
+    with np.load(sparse_file) as data:
+        return {key: data[key] for key in data.files}
+
+def densify_sparse_depth(sparse: dict, key: str = "depth", fill_value: float = 0.0) -> np.ndarray:
+    """Scatters a sparse per-pixel value into a full map.
+
+    Parameters:
+        sparse: Sparse depth as returned by read_sparse_depth.
+        key: Per-pixel value to densify (e.g. 'depth', 'errors', 'track_lens' or 'point_ids').
+        fill_value: Value of pixels without a point.
+
+    Returns:
+        Dense map (HxW).
+    """
+    height, width = sparse["shape"]
+    dense = np.full((height, width), fill_value, dtype=sparse[key].dtype)
+    dense.flat[sparse["pixels"]] = sparse[key]
+    return dense
+
+def load_sparse_depth(sparse_file: str) -> np.ndarray:
+    """Reads a sparse depth file and densifies its depth map.
+
+    Parameters:
+        sparse_file: Input sparse depth file.
+
+    Returns:
+        Depth map (HxW) with zeros at pixels without a point.
+    """
+    return densify_sparse_depth(read_sparse_depth(sparse_file))
@@ -0,0 +1,13 @@
+import sys, os
+import pytest
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_PATH)
+sys.path.insert(0, os.path.join(REPO_PATH, "benchmarks"))
+
+from synthetic_scene import generate_scene
+
+@pytest.fixture(scope="session")
+def scene(tmp_path_factory):
+    """Small synthetic scene (cams/, imgs/, text and binary models) shared by the tests."""
+    return generate_scene(str(tmp_path_factory.mktemp("scene")), num_points=2000, num_cams=6, track_len=3, width=64, height=48)
@@ -0,0 +1,49 @@
+import os
+import json
+import shutil
+
+import batch
+import pipeline
+
+def _dtu_layout(scene, data_path, scenes):
+    shutil.copytree(scene["cam_path"], os.path.join(data_path, "Cameras"))
+    for name in scenes:
+        shutil.copytree(scene["image_path"], os.path.join(data_path, "Images", name))
+
+def test_fake_colmap_scenes_run_and_resume(scene, tmp_path, monkeypatch, capsys):
+    data_path = str(tmp_path / "DTU")
+    _dtu_layout(scene, data_path, ["scan1", "scan2"])
+    monkeypatch.setenv("COLMAP_SCRIPTS_CACHE", str(tmp_path / "cache"))
+    # the first colmap command fails, so one scene is retried from its cache
+    monkeypatch.setenv("FAKE_COLMAP_FAIL_FILE", str(tmp_path / "failed_once"))
+    args = ["--dataset", "dtu", "--data_path", data_path, "--scenes", "scan1", "scan2", "--cpus", "2", "--fake_colmap"]
+
+    batch.main(args)
+    assert os.path.exists(str(tmp_path / "failed_once"))
+    logs = capsys.readouterr().out
+    assert "retrying (1/1)" in logs
+    stage_names = [stage.name for stage in pipeline.build_stages(pipeline.scene_paths("dtu", data_path, "scan1"), 2.0, 3)]
+    for name in ["scan1", "scan2"]:
+        paths = pipeline.scene_paths("dtu", data_path, name)
+        with open(os.path.join(paths["colmap_path"], pipeline.STATE_FILE), 'r') as sf:
+            assert sorted(json.load(sf)) == sorted(stage_names)
+        assert len(os.listdir(paths["depth_path"])) == 6
+        assert os.path.exists(paths["ply_file"])
+        assert f"[{name}] done" in logs
+        assert os.path.exists(os.path.join(data_path, "logs", f"{name}.log"))
+
+    # a second run finds every stage up to date
+    batch.main(args)
+    logs = capsys.readouterr().out
+    assert logs.count("up to date") == 2 * len(stage_names)
+    assert "running" not in logs
+
+def test_dry_run_lists_stages_with_their_cores(scene, tmp_path, capsys):
+    data_path = str(tmp_path / "DTU")
+    _dtu_layout(scene, data_path, ["scan1"])
+    batch.main(["--dataset", "dtu", "--data_path", data_path, "--scenes", "scan1", "--cpus", "8", "--colmap_threads", "4", "--fake_colmap", "--dry_run"])
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "[scan1] [database] would run on 1 core(s)"
+    assert "[scan1] [features] would run on 4 core(s)" in lines
+    assert len(lines) == 6
@@ -0,0 +1,38 @@
+import sys, os
+import json
+import types
+import argparse
+import pytest
+
+import cli
+
+def test_command_runs_its_module_with_the_remaining_arguments(monkeypatch):
+    calls = []
+    module = types.ModuleType("pair_selection")
+    module.parser = argparse.ArgumentParser()
+    module.main = calls.append
+    monkeypatch.setitem(sys.modules, "pair_selection", module)
+
+    cli.main(["pairs", "--top_k", "3", "--no_cache"])
+    assert calls == [["--top_k", "3", "--no_cache"]]
+    assert module.parser.prog.endswith(" pairs")
+
+def test_unknown_command_is_rejected(capsys):
+    with pytest.raises(SystemExit) as e:
+        cli.main(["render"])
+    assert e.value.code == 2
+    assert "invalid choice" in capsys.readouterr().err
+
+def test_ply_command_exports_the_scene(scene, tmp_path):
+    output_file = str(tmp_path / "points.ply")
+    report_file = str(tmp_path / "report.json")
+    cli.main(["ply", "--points_file", scene["points_file"], "--output_file", output_file,
+              "--max_error", "2", "--min_track_len", "2", "--no_cache", "--report_file", report_file])
+
+    with open(report_file) as rf:
+        report = json.load(rf)
+    assert report["counters"]["points_loaded"] == 2000
+    with open(output_file, 'rb') as pf:
+        header = pf.read(256).split(b"end_header")[0].decode()
+    assert f"element vertex {report['counters']['points_kept']}" in header
+    assert os.path.getsize(output_file) > 0
@@ -0,0 +1,135 @@
+import os
+import numpy as np
+import pytest
+
+import colmap_io
+
+POINTS_TEXT = """# 3D point list with one line of data per point:
+#   POINT3D_ID, X, Y, Z, R, G, B, ERROR, TRACK[] as (IMAGE_ID, POINT2D_IDX)
+1 0.5 -1.25 2 255 128 0 0.75 1 10 2 20
+2\t1e-3 2.5\t3  0 0 7  1.5  3 30 4 40\t5 50
+3 4 5 6 1 2 3 0.1
+
+4 7 8 9 9 9 9 2.25 6 60
+"""
+
+def _write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+    return str(path)
+
+def test_text_points_tolerate_any_whitespace(tmp_path):
+    points = colmap_io.read_points3d_text(_write(tmp_path / "points3D.txt", POINTS_TEXT))
+
+    assert points["ids"].tolist() == [1, 2, 3, 4]
+    assert np.allclose(points["xyz"][1], [1e-3, 2.5, 3])
+    assert points["rgb"][1].tolist() == [0, 0, 7]
+    assert points["error"].tolist() == [0.75, 1.5, 0.1, 2.25]
+    assert points["track_offsets"].tolist() == [0, 2, 5, 5, 6]
+    assert points["track_image_ids"].tolist() == [1, 2, 3, 4, 5, 6]
+    assert points["track_point2d_ids"].tolist() == [10, 20, 30, 40, 50, 60]
+
+def test_text_points_blocks_match_whole_file(tmp_path, monkeypatch):
+    points_file = _write(tmp_path / "points3D.txt", POINTS_TEXT)
+    whole = colmap_io.read_points3d_text(points_file)
+    monkeypatch.setattr(colmap_io, "TEXT_BLOCK_SIZE", 1)
+    blocks = colmap_io.read_points3d_text(points_file)
+
+    for key in whole:
+        assert np.array_equal(whole[key], blocks[key])
+
+def test_text_points_reject_bad_tokens(tmp_path):
+    with pytest.raises(ValueError):
+        colmap_io.read_points3d_text(_write(tmp_path / "points3D.txt", "1 0 0 0 1 2 3 nope 1 1 1\n"))
+
+def _assert_columns_equal(a, b):
+    assert sorted(a) == sorted(b)
+    for key in a:
+        if isinstance(a[key], list):
+            assert a[key] == b[key]
+        else:
+            assert np.array_equal(np.asarray(a[key]), np.asarray(b[key])), key
+
+def test_text_and_binary_points_agree(scene):
+    text = colmap_io.read_points3d(scene["points_file"])
+    binary = colmap_io.read_points3d(os.path.join(scene["model_path"], "points3D.bin"))
+    _assert_columns_equal(text, binary)
+    assert text["xyz"].shape == (2000, 3)
+    assert text["track_offsets"][-1] == 3 * 2000
+
+def test_points_binary_round_trip(scene, tmp_path):
+    points = colmap_io.read_points3d(scene["points_file"])
+    points_file = str(tmp_path / "points3D.bin")
+    colmap_io.write_points3d_binary(points_file, points)
+    _assert_columns_equal(points, colmap_io.read_points3d(points_file))
+
+def test_images_text_binary_round_trip(scene, tmp_path):
+    text = colmap_io.read_images(scene["images_file"])
+    binary = colmap_io.read_images(os.path.join(scene["model_path"], "images.bin"))
+    images_file = str(tmp_path / "images.bin")
+    colmap_io.write_images_binary(images_file, text)
+
+    assert text["names"] == [f"{i:08d}.png" for i in range(6)]
+    assert text["points2d_offsets"][-1] == 3 * 2000
+    for images in [binary, colmap_io.read_images(images_file)]:
+        assert images["names"] == text["names"]
+        for key in ["ids", "camera_ids", "points2d_offsets", "point3d_ids"]:
+            assert np.array_equal(images[key], text[key]), key
+        for key in ["qvec", "tvec", "xys"]:
+            assert np.allclose(images[key], text[key]), key
+
+def test_cameras_binary_round_trip(tmp_path):
+    cameras = {
+        1: {"model": 1, "width": 640, "height": 480, "params": np.array([500.0, 501.0, 320.0, 240.0])},
+        3: {"model": 0, "width": 320, "height": 200, "params": np.array([250.0, 160.0, 100.0])},
+    }
+    cameras_file = str(tmp_path / "cameras.bin")
+    colmap_io.write_cameras_binary(cameras_file, cameras)
+    read = colmap_io.read_cameras_binary(cameras_file)
+
+    assert sorted(read) == [1, 3]
+    for camera_id, camera in cameras.items():
+        for key in ["model", "width", "height"]:
+            assert read[camera_id][key] == camera[key]
+        assert np.array_equal(read[camera_id]["params"], camera["params"])
+
+def test_binary_readers_handle_empty_records(tmp_path):
+    # points without a track and images without keypoints next to regular ones
+    points = {
+        "ids": np.array([4, 7, 9]),
+        "xyz": np.arange(9, dtype=np.float64).reshape(3, 3),
+        "rgb": np.array([[1, 2, 3], [4, 5, 6], [7, 8, 9]], dtype=np.uint8),
+        "error": np.array([0.5, 1.0, 1.5]),
+        "track_offsets": np.array([0, 0, 2, 2]),
+        "track_image_ids": np.array([1, 3], dtype=np.int32),
+        "track_point2d_ids": np.array([5, 0], dtype=np.int32),
+    }
+    points_file = str(tmp_path / "points3D.bin")
+    colmap_io.write_points3d_binary(points_file, points)
+    _assert_columns_equal(points, colmap_io.read_points3d(points_file))
+    for chunk_size in [1, 2]:
+        _assert_columns_equal(points, colmap_io.concat_points3d(list(colmap_io.iter_points3d(points_file, chunk_size))))
+
+    images = {
+        "ids": np.array([1, 2, 5]),
+        "qvec": np.eye(4)[:3],
+        "tvec": np.arange(9, dtype=np.float64).reshape(3, 3),
+        "camera_ids": np.array([1, 1, 2]),
+        "names": ["a.png", "sub/b.png", "c.png"],
+        "points2d_offsets": np.array([0, 2, 2, 3]),
+        "xys": np.arange(6, dtype=np.float64).reshape(3, 2),
+        "point3d_ids": np.array([7, -1, 4]),
+    }
+    images_file = str(tmp_path / "images.bin")
+    colmap_io.write_images_binary(images_file, images)
+    _assert_columns_equal(images, colmap_io.read_images(images_file))
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 500, 5000])
+@pytest.mark.parametrize("binary", [False, True])
+def test_chunked_readers_match_whole_file(scene, chunk_size, binary):
+    points_file = os.path.join(scene["model_path"], "points3D.bin") if binary else scene["points_file"]
+    chunks = list(colmap_io.iter_points3d(points_file, chunk_size))
+
+    assert all(chunk["ids"].shape[0] <= chunk_size for chunk in chunks)
+    assert len(chunks) == -(-2000 // chunk_size)
+    _assert_columns_equal(colmap_io.concat_points3d(chunks), colmap_io.read_points3d(points_file))
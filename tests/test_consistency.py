@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import consistency
+
+def _brute_force_min_cos(rays, obs_points, num):
+    min_cos = np.ones(num)
+    for point in range(num):
+        r = rays[obs_points == point]
+        for i in range(r.shape[0]):
+            for j in range(i + 1, r.shape[0]):
+                min_cos[point] = min(min_cos[point], r[i] @ r[j])
+    return min_cos
+
+@pytest.mark.parametrize("max_pairs", [1, 3, 10, 1 << 20])
+def test_ray_angles_match_all_pairs(max_pairs):
+    rng = np.random.default_rng(0)
+    lens = np.array([0, 1, 2, 3, 7, 40, 2, 5])
+    obs_points = np.repeat(np.arange(lens.shape[0]), lens)
+    rays = rng.normal(size=(obs_points.shape[0], 3))
+    rays /= np.linalg.norm(rays, axis=1, keepdims=True)
+
+    min_cos = consistency.max_ray_angles(rays, obs_points, lens.shape[0], max_pairs)
+    assert np.allclose(min_cos, _brute_force_min_cos(rays, obs_points, lens.shape[0]))
+
+def test_pair_chunks_bound_pairs():
+    track_lens = np.array([2, 3, 100, 4, 4, 4, 1, 50, 2])
+    chunks = consistency.pair_chunks(track_lens, chunk_size=4, max_pairs=20)
+
+    assert chunks[0][0] == 0 and chunks[-1][1] == track_lens.shape[0]
+    assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
+    for start, end in chunks:
+        lens = track_lens[start:end]
+        pairs = lens * (lens - 1) // 2
+        assert end - start <= 4
+        assert end - start == 1 or (np.where(pairs > 20, 0, pairs) + lens).sum() <= 20
+
+def test_load_points_counts_geometric_removals(scene):
+    import colmap2sparse
+    from instrument import RunReport
+    from utils import read_cams_sfm
+
+    _, image_index = colmap2sparse.build_index(scene["images_file"])
+    geometric = {
+        "cams": read_cams_sfm(scene["cam_path"]),
+        "image_index": image_index,
+        "width": 64,
+        "height": 48,
+        "min_tri_angle": 20.0,
+    }
+    report = RunReport("load_points")
+    _, points = colmap2sparse.load_points(scene["points_file"], 2.0, 2, report=report, geometric=geometric)
+
+    counters = report.counters
+    removed = sum(count for name, count in counters.items() if name.startswith("points_removed_"))
+    assert removed > 0
+    assert counters["points_kept"] == points["xyz"].shape[0]
+    assert counters["points_kept"] + counters["points_filtered"] == counters["points_loaded"]
+    assert counters["points_filtered"] >= removed
@@ -0,0 +1,210 @@
+import os
+import shutil
+import numpy as np
+import pytest
+
+import colmap_io
+import database
+from database import COLMAPDatabase
+from pair_selection import select_pairs
+from utils import read_cams_sfm, camera_centers
+
+def _table_rows(database_file, table):
+    db = COLMAPDatabase.connect(database_file)
+    try:
+        return db.execute(f"SELECT * FROM {table}").fetchall()
+    finally:
+        db.close()
+
+def test_gen_database_stores_pose_priors(tmp_path):
+    database_file = str(tmp_path / "database.db")
+    image_files = ["a.png", "b.png", "c.png"]
+    positions = np.arange(9, dtype=np.float64).reshape(3, 3)
+    database.gen_database(database_file, [100.0, 100.0, 32.0, 24.0], 48, 64, image_files, prior_positions=positions)
+
+    assert [row[:3] for row in _table_rows(database_file, "images")] == [(1, "a.png", 1), (2, "b.png", 1), (3, "c.png", 1)]
+    priors = _table_rows(database_file, "pose_priors")
+    assert [row[0] for row in priors] == [1, 2, 3]
+    assert np.array_equal([database.blob_to_array(row[1], np.float64) for row in priors], positions)
+    assert all(row[2] == database.POSE_PRIOR_CARTESIAN for row in priors)
+
+def test_gen_database_rolls_back_on_error(tmp_path, monkeypatch):
+    database_file = str(tmp_path / "database.db")
+
+    def failing_add_pose_priors_bulk(self, *args, **kwargs):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(COLMAPDatabase, "add_pose_priors_bulk", failing_add_pose_priors_bulk)
+
+    with pytest.raises(RuntimeError):
+        database.gen_database(database_file, [100.0, 100.0, 32.0, 24.0], 48, 64, ["a.png", "b.png"], prior_positions=np.zeros((2, 3)))
+    assert _table_rows(database_file, "images") == []
+
+def _partial_scene(scene, tmp_path, num_cams):
+    # the first num_cams cameras and images of the synthetic scene
+    cam_path, image_path = tmp_path / "cams", tmp_path / "imgs"
+    cam_path.mkdir(exist_ok=True)
+    image_path.mkdir(exist_ok=True)
+    for i in range(num_cams):
+        shutil.copy(os.path.join(scene["cam_path"], f"{i:08d}_cam.txt"), cam_path)
+        shutil.copy(os.path.join(scene["image_path"], f"{i:08d}.png"), image_path)
+    return str(cam_path), str(image_path)
+
+def test_update_scene_appends_new_images(scene, tmp_path):
+    database_file = str(tmp_path / "database.db")
+    output_path = tmp_path / "sparse"
+    output_path.mkdir()
+    pairs_file = str(tmp_path / "pairs.txt")
+
+    cam_path, image_path = _partial_scene(scene, tmp_path, 4)
+    assert database.update_scene(cam_path, image_path, database_file, str(output_path)) == [f"{i:08d}.png" for i in range(4)]
+
+    _partial_scene(scene, tmp_path, 6)
+    new_files = database.update_scene(cam_path, image_path, database_file, str(output_path), pairs_file=pairs_file, top_k_pairs=2, pose_priors=True)
+    assert new_files == ["00000004.png", "00000005.png"]
+
+    names = [f"{i:08d}.png" for i in range(6)]
+    assert [row[:3] for row in _table_rows(database_file, "images")] == [(i + 1, name, 1) for i, name in enumerate(names)]
+    assert len(_table_rows(database_file, "cameras")) == 1
+
+    # priors of the new images only
+    cams = read_cams_sfm(cam_path)
+    priors = _table_rows(database_file, "pose_priors")
+    assert [row[0] for row in priors] == [5, 6]
+    assert np.allclose([database.blob_to_array(row[1], np.float64) for row in priors], camera_centers(cams[4:]))
+
+    # images.txt keeps the database ids
+    images = colmap_io.read_images(str(output_path / "images.txt"))
+    assert images["ids"].tolist() == [1, 2, 3, 4, 5, 6]
+    assert images["names"] == names
+
+    # only the pose-based pairs involving a new image are matched
+    pairs = select_pairs(cams, 48, 64, 2)
+    expected = [f"{names[i]} {names[j]}" for i, j in pairs if i >= 4 or j >= 4]
+    with open(pairs_file) as f:
+        assert f.read().splitlines() == expected
+    assert expected
+
+def test_update_scene_needs_a_camera(scene, tmp_path):
+    database_file = str(tmp_path / "database.db")
+    db = COLMAPDatabase.connect(database_file)
+    db.create_tables()
+    db.close()
+
+    cam_path, image_path = _partial_scene(scene, tmp_path, 2)
+    with pytest.raises(ValueError, match="database.db has no camera"):
+        database.update_scene(cam_path, image_path, database_file, str(tmp_path))
+
+def _fill_database(database_file, bulk):
+    # the same content through the per-row API or the bulk writers
+    rng = np.random.default_rng(0)
+    names = ["a.png", "b.png", "c.png"]
+    keypoints = [(i, rng.uniform(0, 64, (5 + i, 4)).astype(np.float32)) for i in range(1, 4)]
+    descriptors = [(i, rng.integers(0, 255, (5 + i, 128), dtype=np.uint8)) for i in range(1, 4)]
+    matches = [(2, 1, np.array([[0, 1], [2, 3]])), (1, 3, np.array([[4, 4]])), (3, 2, np.zeros((0, 2)))]
+    positions = rng.normal(size=(3, 3))
+
+    db = COLMAPDatabase.connect(database_file)
+    db.create_tables()
+    db.create_pose_priors_table()
+    camera_id = db.add_camera(1, 64, 48, [100.0, 100.0, 32.0, 24.0])
+    if bulk:
+        with db.bulk_transaction():
+            db.add_images_bulk(names, camera_id, image_ids=[1, 2, 3])
+            db.add_pose_priors_bulk([1, 2, 3], positions, database.POSE_PRIOR_CARTESIAN)
+            db.add_keypoints_bulk(iter(keypoints))
+            db.add_descriptors_bulk(iter(descriptors))
+            db.add_matches_bulk(iter(matches))
+            db.add_two_view_geometries_bulk(iter(matches))
+    else:
+        for image_id, name in enumerate(names, 1):
+            db.add_image(name, camera_id, image_id=image_id)
+            db.add_pose_prior(image_id, positions[image_id - 1], database.POSE_PRIOR_CARTESIAN)
+        for image_id, data in keypoints:
+            db.add_keypoints(image_id, data)
+        for image_id, data in descriptors:
+            db.add_descriptors(image_id, data)
+        for image_id1, image_id2, data in matches:
+            db.add_matches(image_id1, image_id2, data)
+            db.add_two_view_geometry(image_id1, image_id2, data)
+        db.commit()
+    db.close()
+
+TABLES = ["cameras", "images", "pose_priors", "keypoints", "descriptors", "matches", "two_view_geometries"]
+
+def test_bulk_writers_match_per_row_writers(tmp_path):
+    bulk_file, row_file = str(tmp_path / "bulk.db"), str(tmp_path / "row.db")
+    _fill_database(bulk_file, bulk=True)
+    _fill_database(row_file, bulk=False)
+
+    for table in TABLES:
+        rows = _table_rows(row_file, table)
+        assert rows, table
+        # NaN priors never compare equal, so compare their text form
+        assert repr(_table_rows(bulk_file, table)) == repr(rows), table
+
+def test_bulk_transaction_rolls_back_on_error(tmp_path):
+    database_file = str(tmp_path / "database.db")
+    _fill_database(database_file, bulk=True)
+    before = {table: repr(_table_rows(database_file, table)) for table in TABLES}
+
+    db = COLMAPDatabase.connect(database_file)
+    with pytest.raises(RuntimeError):
+        with db.bulk_transaction():
+            db.add_images_bulk(["d.png", "e.png"], 1)
+            db.add_keypoints_bulk([(4, np.zeros((2, 2)))])
+            db.execute("DELETE FROM matches")
+            raise RuntimeError("interrupted")
+
+    # the connection is usable afterwards with its previous settings
+    assert db.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    assert db.execute("PRAGMA synchronous").fetchone()[0] == 2
+    db.close()
+    assert {table: repr(_table_rows(database_file, table)) for table in TABLES} == before
+
+def test_pair_ids_round_trip():
+    image_ids1 = np.array([1, 2, 7, database.MAX_IMAGE_ID - 2])
+    image_ids2 = np.array([3, 2, 5, database.MAX_IMAGE_ID - 1])
+    pair_ids = [database.image_ids_to_pair_id(i, j) for i, j in zip(image_ids1.tolist(), image_ids2.tolist())]
+
+    assert database.pair_id_to_image_ids(pair_ids[2]) == (5, 7)
+    first, second = database.pair_id_to_image_ids(np.array(pair_ids, dtype=np.int64))
+    assert first.tolist() == np.minimum(image_ids1, image_ids2).tolist()
+    assert second.tolist() == np.maximum(image_ids1, image_ids2).tolist()
+
+@pytest.mark.parametrize("batch_size", [1, 2, 1024])
+def test_readers_stream_the_stored_rows(tmp_path, batch_size):
+    database_file = str(tmp_path / "database.db")
+    _fill_database(database_file, bulk=True)
+    db = COLMAPDatabase.connect(database_file)
+
+    keypoints = dict(db.iter_keypoints(batch_size))
+    assert sorted(keypoints) == [1, 2, 3]
+    assert keypoints[2].shape == (7, 4) and keypoints[2].dtype == np.float32
+    assert not keypoints[2].flags.writeable
+    descriptors = dict(db.iter_descriptors(batch_size))
+    assert [descriptors[i].shape for i in [1, 2, 3]] == [(6, 128), (7, 128), (8, 128)]
+
+    # matches are stored from the smaller image id
+    matches = {(i, j): m for i, j, m in db.iter_matches(batch_size)}
+    assert sorted(matches) == [(1, 2), (1, 3), (2, 3)]
+    assert matches[1, 2].tolist() == [[1, 0], [3, 2]]
+    assert matches[1, 3].tolist() == [[4, 4]]
+    assert matches[2, 3].shape == (0, 2)
+
+    geometries = list(db.iter_two_view_geometries(batch_size))
+    assert [(g["image_id1"], g["image_id2"]) for g in geometries] == sorted(matches)
+    assert np.array_equal(geometries[0]["matches"], matches[1, 2])
+    assert np.array_equal(geometries[0]["F"], np.eye(3))
+    assert geometries[0]["qvec"].tolist() == [1.0, 0.0, 0.0, 0.0]
+
+    for table in ["matches", "two_view_geometries"]:
+        image_ids1, image_ids2, counts = db.read_pair_match_counts(table, batch_size)
+        assert list(zip(image_ids1.tolist(), image_ids2.tolist(), counts.tolist())) == [(1, 2, 2), (1, 3, 1), (2, 3, 0)]
+    db.close()
+
+def test_pair_match_counts_of_an_empty_table(tmp_path):
+    db = COLMAPDatabase.connect(str(tmp_path / "database.db"))
+    db.create_tables()
+    image_ids1, image_ids2, counts = db.read_pair_match_counts()
+    assert image_ids1.shape == image_ids2.shape == counts.shape == (0,)
+    db.close()
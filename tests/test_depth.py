@@ -0,0 +1,270 @@
+import os
+import numpy as np
+import pytest
+
+import colmap_io
+import utils
+from utils import rasterize, zbuffer_depth, read_cams_sfm
+
+def _splat_reference(u, v, z, width, height, point_size):
+    # nearest depth over the point_size x point_size square of every point, one point at a time
+    depth = np.full((height, width), np.inf)
+    offsets = np.arange(point_size) - ((point_size - 1) // 2)
+    for pu, pv, pz in zip(np.round(u).astype(int), np.round(v).astype(int), z):
+        if pz <= 0:
+            continue
+        for dv in offsets:
+            for du in offsets:
+                if 0 <= pu + du < width and 0 <= pv + dv < height:
+                    depth[pv+dv, pu+du] = min(depth[pv+dv, pu+du], pz)
+    depth[np.isinf(depth)] = 0
+    return depth
+
+@pytest.mark.parametrize("point_size", [1, 2, 3, 5])
+def test_rasterize_matches_reference(point_size):
+    rng = np.random.default_rng(point_size)
+    width, height = 40, 30
+    u = rng.uniform(-3, width + 3, 500)
+    v = rng.uniform(-3, height + 3, 500)
+    z = rng.uniform(-0.5, 5.0, 500)
+
+    pixels, depths, inds = rasterize(u, v, z, width, height, point_size=point_size)
+    depth = np.zeros((height, width))
+    depth.flat[pixels] = depths
+
+    assert np.all(np.diff(pixels) > 0)
+    assert np.array_equal(depths, z[inds])
+    assert np.array_equal(depth, _splat_reference(u, v, z, width, height, point_size))
+
+def test_splat_covers_border_from_outside():
+    pixels, _, _ = rasterize(np.array([-1.0]), np.array([0.0]), np.array([1.0]), 4, 4, point_size=3)
+    assert pixels.tolist() == [0, 4]
+
+def test_open3d_renderer_matches_splat(scene):
+    pytest.importorskip("open3d")
+    from colmap2sparse import render_depth
+
+    cams = read_cams_sfm(scene["cam_path"])
+    points = colmap_io.read_points3d(scene["points_file"])["xyz"]
+    pose, K = cams[0,0], cams[0,1,:3,:3]
+    width, height = 64, 48
+
+    try:
+        rendered = render_depth(pose, K, points, width, height)
+    except RuntimeError as e:
+        pytest.skip(f"no offscreen rendering available: {e}")
+    rendered = np.nan_to_num(rendered)
+    rendered[rendered >= 1e5] = 0.0
+    depth = zbuffer_depth(pose, K, points, width, height, utils.DEFAULT_POINT_SIZE)
+
+    # pixels exactly between two rounding candidates may go either way
+    covered = (rendered > 0) == (depth > 0)
+    assert covered.mean() > 0.98
+    both = (rendered > 0) & (depth > 0)
+    close = np.isclose(rendered[both], depth[both], rtol=1e-3)
+    assert close.mean() > 0.98
+
+def test_interrupted_incremental_run_resumes(scene, tmp_path, monkeypatch):
+    import colmap2sparse
+    from instrument import RunReport
+
+    output_path = str(tmp_path / "depths")
+    os.makedirs(output_path)
+    args = (scene["points_file"], scene["images_file"], scene["cam_path"], scene["image_path"], output_path, 2.0, 2)
+
+    # fail after three views have been written
+    process_view = colmap2sparse.process_view
+    written = []
+    def failing_process_view(task):
+        if len(written) == 3:
+            raise KeyboardInterrupt
+        written.append(task[0])
+        return process_view(task)
+    monkeypatch.setattr(colmap2sparse, "process_view", failing_process_view)
+    monkeypatch.setattr(colmap2sparse, "MANIFEST_SAVE_INTERVAL", 1)
+    with pytest.raises(KeyboardInterrupt):
+        colmap2sparse.generate_depths(*args, incremental=True)
+
+    manifest = colmap2sparse.load_manifest(os.path.join(output_path, colmap2sparse.DEPTH_MANIFEST))
+    assert sorted(manifest) == [str(i) for i in written]
+
+    monkeypatch.setattr(colmap2sparse, "process_view", process_view)
+    report = RunReport("colmap2sparse")
+    colmap2sparse.generate_depths(*args, incremental=True, report=report)
+    assert report.counters["views_skipped"] == 3
+    assert report.counters["views_written"] == 3
+
+def test_build_index_reads_text_and_binary(scene, tmp_path):
+    from colmap2sparse import build_index
+
+    num_images, image_index = build_index(scene["images_file"])
+    assert num_images == 6 and isinstance(num_images, int)
+    assert build_index(os.path.join(scene["model_path"], "images.bin")) == (num_images, image_index)
+
+    # a header without the image count, and images without POINTS2D
+    images_file = str(tmp_path / "images.txt")
+    with open(images_file, 'w') as imf:
+        imf.write("# Image list\n7 1 0 0 0 0 0 0 1 00000003.png\n\n9 1 0 0 0 0 0 0 1 00000005.png\n1.5 2.5 -1\n")
+    assert build_index(images_file) == (2, {3: 7, 5: 9})
+
+def test_worker_pool_matches_single_process(scene, tmp_path, monkeypatch):
+    import colmap2sparse
+    from multiprocessing import shared_memory
+
+    # record the shared memory segments handed to the workers
+    share_array = colmap2sparse.share_array
+    segments = []
+    def recording_share_array(array):
+        shm, spec = share_array(array)
+        if shm is not None:
+            segments.append(shm.name)
+        return shm, spec
+    monkeypatch.setattr(colmap2sparse, "share_array", recording_share_array)
+
+    outputs = {}
+    for workers in [1, 2]:
+        output_path = str(tmp_path / f"workers_{workers}")
+        os.makedirs(output_path)
+        colmap2sparse.generate_depths(scene["points_file"], scene["images_file"], scene["cam_path"], scene["image_path"],
+                                      output_path, 2.0, 2, workers=workers, point_info=True, scales=(1, 2))
+        outputs[workers] = {}
+        for root, _, files in os.walk(output_path):
+            for name in files:
+                with open(os.path.join(root, name), 'rb') as f:
+                    outputs[workers][os.path.relpath(os.path.join(root, name), output_path)] = f.read()
+
+    assert len(outputs[1]) > 6
+    assert outputs[2] == outputs[1]
+
+    assert segments
+    for name in segments:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+def test_match_observations_joins_point_ids():
+    from colmap2sparse import match_observations
+
+    point_ids = np.array([9, 3, 7])
+    assert match_observations(np.array([5, -1, 3, 9, 5, 7, 10]), point_ids).tolist() == [-1, -1, 1, 0, -1, 2, -1]
+    assert match_observations(np.array([1, 2]), np.zeros(0, dtype=np.int64)).tolist() == [-1, -1]
+
+def test_tracks_renderer_writes_depths_at_keypoints(scene, tmp_path):
+    import colmap2sparse
+    from sparse_depth import read_sparse_depth
+
+    output_path = str(tmp_path / "depths")
+    os.makedirs(output_path)
+    colmap2sparse.generate_depths(scene["points_file"], scene["images_file"], scene["cam_path"], scene["image_path"],
+                                  output_path, 2.0, 2, depth_format="sparse", point_info=True, renderer="tracks", point_size=1)
+
+    # every kept observation puts the depth of its point at its rounded keypoint, the nearest one wins
+    images = colmap_io.read_images(scene["images_file"])
+    points = colmap_io.filter_points(colmap_io.read_points3d(scene["points_file"]), 2.0, 2)
+    cams = read_cams_sfm(scene["cam_path"])
+    width, height = 64, 48
+    num_dropped = 0
+    for row, name in enumerate(images["names"]):
+        view = int(name[:-4])
+        start, end = images["points2d_offsets"][row:row+2]
+        point_rows = colmap2sparse.match_observations(images["point3d_ids"][start:end], points["ids"])
+        num_dropped += int((point_rows < 0).sum())
+
+        expected = {}
+        for (x, y), point_row in zip(images["xys"][start:end], point_rows):
+            u, v = int(np.round(x)), int(np.round(y))
+            z = points["xyz"][point_row] @ cams[view,0,2,:3] + cams[view,0,2,3]
+            if point_row < 0 or z <= 0 or not (0 <= u < width and 0 <= v < height):
+                continue
+            pixel = v * width + u
+            if pixel not in expected or z < expected[pixel][0]:
+                expected[pixel] = (z, points["ids"][point_row])
+
+        sparse = read_sparse_depth(os.path.join(output_path, f"{view:08d}.npz"))
+        pixels = sorted(expected)
+        assert sparse["pixels"].tolist() == pixels
+        assert np.allclose(sparse["depth"], [expected[pixel][0] for pixel in pixels])
+        assert sparse["point_ids"].tolist() == [expected[pixel][1] for pixel in pixels]
+    assert num_dropped > 0
+
+def test_point_info_maps_describe_the_winning_points(scene, tmp_path):
+    import colmap2sparse
+    from sparse_depth import read_sparse_depth
+    from visibility import VisibilityIndex
+
+    output_path = str(tmp_path / "depths")
+    os.makedirs(output_path)
+    colmap2sparse.generate_depths(scene["points_file"], scene["images_file"], scene["cam_path"], scene["image_path"],
+                                  output_path, 2.0, 2, point_info=True, scales=(1, 2))
+
+    points = colmap_io.filter_points(colmap_io.read_points3d(scene["points_file"]), 2.0, 2)
+    visibility = VisibilityIndex.from_points(points)
+    track_lens = np.diff(points["track_offsets"])
+    cams = read_cams_sfm(scene["cam_path"])
+    _, image_index = colmap2sparse.build_index(scene["images_file"])
+    for view in range(6):
+        candidates = visibility.point_indices(image_index[view])
+        for scale in [1, 2]:
+            aux = read_sparse_depth(colmap2sparse.aux_file(colmap2sparse.level_file(os.path.join(output_path, f"{view:08d}.pfm"), scale)))
+            pixels, z, winners = utils.zbuffer_pyramid(cams[view,0], cams[view,1,:3,:3], points["xyz"][candidates], 64, 48, (scale,), utils.DEFAULT_POINT_SIZE)[0]
+            rows = candidates[winners]
+
+            assert aux["shape"].tolist() == [48 // scale, 64 // scale]
+            assert pixels.shape[0] > 0
+            assert aux["pixels"].tolist() == pixels.tolist()
+            assert np.array_equal(aux["depth"], z.astype(np.float32))
+            assert aux["point_ids"].tolist() == points["ids"][rows].tolist()
+            assert np.array_equal(aux["errors"], points["error"][rows].astype(np.float32))
+            assert aux["track_lens"].tolist() == track_lens[rows].tolist()
+            assert aux["track_lens"].min() >= 2
+
+def test_scale_intrinsics_halves_every_level():
+    K = np.array([[100.0, 0.5, 32.0, 0], [0, 101.0, 24.0, 0], [0, 0, 1.0, 0], [0.5, 0.01, 128, 1.78]])
+    for scale in [2, 4]:
+        scaled = utils.scale_intrinsics(K, scale)
+        assert np.array_equal(scaled[:2,:3], K[:2,:3] / scale)
+        assert np.array_equal(scaled[2:], K[2:])
+    assert K[0,0] == 100.0
+
+def test_zbuffer_pyramid_keeps_the_nearest_depth_per_level():
+    rng = np.random.default_rng(0)
+    width, height = 64, 48
+    pose = np.eye(4)
+    K = np.array([[50.0, 0, 32], [0, 50.0, 24], [0, 0, 1]])
+    points = np.stack([rng.uniform(-2, 2, 3000), rng.uniform(-1.5, 1.5, 3000), rng.uniform(1, 5, 3000)], axis=1)
+
+    levels = utils.zbuffer_pyramid(pose, K, points, width, height, (1, 2, 4))
+    u, v, z = utils.project_points(pose, K, points)
+    for scale, (pixels, depths, inds) in zip((1, 2, 4), levels):
+        w, h = width // scale, height // scale
+        depth = np.zeros((h, w))
+        depth.flat[pixels] = depths
+
+        assert np.array_equal(depths, z[inds])
+        assert np.array_equal(depth, _splat_reference(u / scale, v / scale, z, w, h, 1))
+    assert levels[0][0].shape[0] > levels[1][0].shape[0] > levels[2][0].shape[0]
+
+def test_levels_are_written_with_their_cameras(scene, tmp_path):
+    import colmap2sparse
+    from utils import read_single_cam_sfm
+
+    output_path = str(tmp_path / "depths")
+    os.makedirs(output_path)
+    colmap2sparse.generate_depths(scene["points_file"], scene["images_file"], scene["cam_path"], scene["image_path"],
+                                  output_path, 2.0, 2, scales=(1, 2, 4))
+
+    output_file = os.path.join(output_path, "00000003.pfm")
+    assert colmap2sparse.level_file(output_file, 1) == output_file
+    assert colmap2sparse.level_file(output_file, 2) == os.path.join(output_path, "scale_2", "00000003.pfm")
+    assert colmap2sparse.level_cam_file(output_file, 4) == os.path.join(output_path, "scale_4", "00000003_cam.txt")
+
+    cams = read_cams_sfm(scene["cam_path"])
+    for view in range(6):
+        output_file = os.path.join(output_path, f"{view:08d}.pfm")
+        assert os.path.exists(output_file)
+        assert not os.path.exists(colmap2sparse.level_cam_file(output_file, 1))
+        for scale in [2, 4]:
+            assert os.path.exists(colmap2sparse.level_file(output_file, scale))
+            cam = read_single_cam_sfm(colmap2sparse.level_cam_file(output_file, scale))
+            assert np.allclose(cam[0], cams[view,0])
+            assert np.allclose(cam[1,:2,:3], cams[view,1,:2,:3] / scale)
+            assert np.allclose(cam[1,2:], cams[view,1,2:])
@@ -0,0 +1,28 @@
+import time
+import numpy as np
+
+from instrument import RunReport
+
+def test_stage_peak_is_measured_per_stage():
+    report = RunReport("test")
+    with report.stage("large"):
+        data = np.ones(200 << 17)
+        data[::512] = 2.0
+        time.sleep(0.05)
+        del data
+    with report.stage("small"):
+        time.sleep(0.05)
+
+    large, small = report.stages
+    assert large["peak_rss_mb"] - large["rss_before_mb"] > 150
+    assert small["peak_rss_mb"] < large["peak_rss_mb"] - 150
+
+def test_failed_stage_is_recorded():
+    report = RunReport("test")
+    try:
+        with report.stage("fails"):
+            raise ValueError
+    except ValueError:
+        pass
+    assert report.stages[0]["name"] == "fails"
+    assert "peak_rss_mb" in report.stages[0]
@@ -0,0 +1,57 @@
+import os
+from multiprocessing import Pool
+import numpy as np
+
+import colmap_io
+import model_cache
+
+def test_hit_returns_same_columns(scene, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    first = model_cache.read_model(scene["points_file"], colmap_io.read_points3d, cache_dir)
+    second = model_cache.read_model(scene["points_file"], colmap_io.read_points3d, cache_dir)
+
+    assert isinstance(second["xyz"], np.memmap)
+    for key in first:
+        assert np.array_equal(first[key], second[key])
+
+def test_changed_file_replaces_entry(scene, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    points_file = str(tmp_path / "points3D.txt")
+    with open(scene["points_file"], 'r') as src, open(points_file, 'w') as dst:
+        dst.write(src.read())
+
+    model_cache.read_model(points_file, colmap_io.read_points3d, cache_dir)
+    with open(points_file, 'a') as pf:
+        pf.write("99999 0 0 0 0 0 0 0.5 1 0 2 0 3 0\n")
+    points = model_cache.read_model(points_file, colmap_io.read_points3d, cache_dir)
+
+    assert points["ids"][-1] == 99999
+    assert len(model_cache.list_entries(cache_dir)) == 1
+
+def test_broken_entry_is_recomputed(scene, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    model_cache.read_cams(scene["cam_path"], cache_dir)
+    (entry_path, _, _), = model_cache.list_entries(cache_dir)
+    os.remove(os.path.join(entry_path, "cams.npy"))
+
+    cams = model_cache.read_cams(scene["cam_path"], cache_dir)
+    assert cams.shape == (6, 2, 4, 4)
+
+def _read_concurrently(args):
+    cam_path, points_file, cache_dir, seed = args
+    rng = np.random.default_rng(seed)
+    for _ in range(10):
+        # a tiny size limit evicts entries while other processes load them
+        max_bytes = int(rng.choice([1 << 12, 1 << 30]))
+        if rng.random() < 0.5:
+            assert model_cache.read_cams(cam_path, cache_dir, max_bytes).shape[0] == 6
+        else:
+            assert model_cache.read_model(points_file, colmap_io.read_points3d, cache_dir, max_bytes)["xyz"].shape[0] == 2000
+
+def test_concurrent_readers(scene, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    with Pool(8) as pool:
+        pool.map(_read_concurrently, [(scene["cam_path"], scene["points_file"], cache_dir, seed) for seed in range(16)])
+
+    names = os.listdir(cache_dir)
+    assert not [name for name in names if name.startswith(model_cache.TMP_PREFIX)]
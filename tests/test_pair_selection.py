@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from pair_selection import select_pairs, write_match_list
+
+def _cams_along_x(xs, flipped=()):
+    # cameras on the x axis looking down +z (or -z when flipped), with scene depths between 4 and 6
+    cams = np.zeros((len(xs), 2, 4, 4))
+    for i, x in enumerate(xs):
+        R = np.diag([-1.0, 1.0, -1.0]) if i in flipped else np.eye(3)
+        cams[i,0,:3,:3] = R
+        cams[i,0,:3,3] = -R @ np.array([x, 0.0, 0.0])
+        cams[i,0,3,3] = 1.0
+        cams[i,1,:3,:3] = [[50.0, 0.0, 32.0], [0.0, 50.0, 24.0], [0.0, 0.0, 1.0]]
+        cams[i,1,3,0] = 4.0
+        cams[i,1,3,3] = 6.0
+    return cams
+
+@pytest.mark.parametrize("top_k,expected", [
+    (1, [[0, 1], [1, 2], [2, 3]]),
+    (2, [[0, 1], [0, 2], [1, 2], [1, 3], [2, 3]]),
+    (3, [[0, 1], [0, 2], [0, 3], [1, 2], [1, 3], [2, 3]]),
+])
+def test_select_pairs_keeps_the_nearest_overlapping_views(top_k, expected):
+    # camera 4 sees a disjoint part of the scene and camera 5 looks the other way
+    cams = _cams_along_x([0.0, 1.0, 2.5, 4.5, 20.0, 1.2], flipped=(5,))
+    pairs = select_pairs(cams, 48, 64, top_k=top_k, num_candidates=5)
+
+    assert pairs.tolist() == expected
+
+def test_select_pairs_needs_two_cameras():
+    assert select_pairs(_cams_along_x([0.0]), 48, 64).shape == (0, 2)
+
+def test_match_list_names_the_pairs(tmp_path):
+    output_file = str(tmp_path / "pairs.txt")
+    write_match_list(np.array([[0, 2], [1, 2]]), ["a.png", "b.png", "c.png"], output_file)
+    with open(output_file) as f:
+        assert f.read() == "a.png c.png\nb.png c.png\n"
@@ -0,0 +1,71 @@
+import sys, os
+import subprocess
+import pytest
+
+import pipeline
+
+def _stage_inputs(tmp_path):
+    paths = pipeline.scene_paths("dtu", str(tmp_path), "scan1")
+    stages = pipeline.build_stages(paths, 2.0, 3, matcher="pose")
+    return {stage.name: {os.path.basename(path) for path in stage.inputs} for stage in stages}
+
+def test_stage_inputs_follow_imports(tmp_path):
+    inputs = _stage_inputs(tmp_path)
+
+    assert {"colmap2sparse.py", "point_store.py", "consistency.py", "visibility.py", "utils.py"} <= inputs["depth"]
+    assert {"colmap2ply.py", "ply_io.py", "utils.py", "consistency.py", "point_store.py", "visibility.py"} <= inputs["ply"]
+    assert {"database.py", "pair_selection.py", "model_cache.py"} <= inputs["database"]
+    assert "colmap2sparse.py" not in inputs["ply"]
+
+def _write_stage(name, output, inputs=(), deps=()):
+    # a stage whose single command appends its name to a log and writes its output file
+    log = os.path.join(os.path.dirname(output), "log.txt")
+    command = [sys.executable, "-c", f"open({log!r}, 'a').write({name!r} + ' '); open({output!r}, 'w').write('x')"]
+    return pipeline.Stage(name, [command], inputs=inputs, outputs=[output], deps=deps)
+
+def _toy_pipeline(tmp_path):
+    source = tmp_path / "source.txt"
+    if not source.exists():
+        source.write_text("1")
+    return [
+        _write_stage("c", str(tmp_path / "c.out"), deps=["b"]),
+        _write_stage("a", str(tmp_path / "a.out"), inputs=[str(source)]),
+        _write_stage("b", str(tmp_path / "b.out"), deps=["a"]),
+        _write_stage("d", str(tmp_path / "d.out"), deps=["a"]),
+    ]
+
+def test_stages_are_skipped_until_their_inputs_change(tmp_path):
+    state_file = str(tmp_path / pipeline.STATE_FILE)
+    run = lambda **kwargs: pipeline.run_pipeline(_toy_pipeline(tmp_path), state_file, **kwargs)
+
+    assert run() == ["a", "b", "c", "d"]
+    assert (tmp_path / "log.txt").read_text().split() == ["a", "b", "c", "d"]
+    assert run() == []
+
+    # a changed input reruns the stage and everything downstream of it
+    (tmp_path / "source.txt").write_text("22")
+    assert run() == ["a", "b", "c", "d"]
+
+    # forcing a stage reruns its dependents only
+    assert run(force=["b"]) == ["b", "c"]
+
+    # a missing output reruns its stage
+    os.remove(str(tmp_path / "d.out"))
+    assert run(dry_run=True) == ["d"]
+    assert run(dry_run=True) == ["d"]
+    assert run() == ["d"]
+    assert run() == []
+
+def test_failed_stage_resumes_from_the_failure(tmp_path):
+    state_file = str(tmp_path / pipeline.STATE_FILE)
+
+    def fail_on_c(command, check):
+        if "'c'" in command[-1]:
+            raise subprocess.CalledProcessError(1, command)
+        return subprocess.run(command, check=check)
+
+    with pytest.raises(subprocess.CalledProcessError):
+        pipeline.run_pipeline(_toy_pipeline(tmp_path), state_file, run_command=fail_on_c)
+    assert sorted(pipeline.load_state(state_file)) == ["a", "b"]
+
+    assert pipeline.run_pipeline(_toy_pipeline(tmp_path), state_file) == ["c", "d"]
@@ -0,0 +1,72 @@
+import os
+import json
+import numpy as np
+
+import ply_io
+
+def _read_tiles(tile_path):
+    with open(os.path.join(tile_path, ply_io.TILE_INDEX), 'r') as tf:
+        index = json.load(tf)
+    contents = {}
+    for tile in index["tiles"]:
+        with open(os.path.join(tile_path, tile["file"]), 'rb') as pf:
+            contents[tile["file"]] = pf.read()
+    return index, contents
+
+def test_chunked_tiles_match_single_chunk(tmp_path):
+    rng = np.random.default_rng(0)
+    xyz = rng.uniform(-1, 1, (5000, 3))
+    rgb = rng.integers(0, 256, (5000, 3)).astype(np.uint8)
+
+    ply_io.write_tiles(str(tmp_path / "whole"), xyz, rgb, 0.5)
+    ply_io.write_tiles(str(tmp_path / "chunked"), xyz, rgb, 0.5, chunk_size=333)
+    whole, whole_files = _read_tiles(str(tmp_path / "whole"))
+    chunked, chunked_files = _read_tiles(str(tmp_path / "chunked"))
+
+    assert whole == chunked
+    assert whole_files == chunked_files
+    assert sorted(os.listdir(str(tmp_path / "chunked"))) == sorted([ply_io.TILE_INDEX, *chunked_files])
+    assert sum(tile["num_points"] for tile in whole["tiles"]) == 5000
+
+    # every tile holds its points in input order
+    tile = whole["tiles"][0]
+    inside = np.all(np.floor(xyz / 0.5) == tile["cell"], axis=1)
+    vertices = np.frombuffer(whole_files[tile["file"]].split(b"end_header\n", 1)[1], dtype=ply_io.PLY_VERTEX_DTYPE)
+    assert np.array_equal(vertices["x"], xyz[inside,0].astype(np.float32))
+    assert np.allclose(tile["bbox_min"], xyz[inside].min(axis=0))
+
+def _sorted_by_position(xyz, rgb):
+    order = np.lexsort(xyz.T[::-1])
+    return xyz[order], rgb[order]
+
+def test_voxel_downsample_averages_each_voxel():
+    xyz = np.array([
+        [0.1, 0.2, 0.3], [0.5, 0.6, 0.7],                 # voxel (0, 0, 0)
+        [-0.5, 0.1, 0.1],                                 # voxel (-1, 0, 0)
+        [2.2, 3.1, -3.5], [2.4, 3.3, -3.9], [2.9, 3.8, -3.1],  # voxel (2, 3, -4)
+    ])
+    rgb = np.array([[10, 20, 30], [20, 40, 60], [255, 0, 7], [0, 0, 0], [3, 3, 3], [6, 255, 9]], dtype=np.uint8)
+
+    for chunk_size in [1, 4, 100]:
+        centroids, colors = _sorted_by_position(*ply_io.voxel_downsample(xyz, rgb, 1.0, chunk_size))
+        assert np.allclose(centroids, [[-0.5, 0.1, 0.1], [0.3, 0.4, 0.5], [2.5, 3.4, -3.5]])
+        assert colors.dtype == np.uint8
+        assert colors.tolist() == [[255, 0, 7], [15, 30, 45], [3, 86, 4]]
+
+def test_voxel_downsample_matches_brute_force():
+    rng = np.random.default_rng(1)
+    xyz = rng.uniform(-2, 2, (3000, 3))
+    rgb = rng.integers(0, 256, (3000, 3)).astype(np.uint8)
+
+    voxels, inverse = np.unique(np.floor(xyz / 0.5).astype(np.int64), axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    counts = np.bincount(inverse)
+    expected_xyz = np.stack([np.bincount(inverse, xyz[:,k]) for k in range(3)], axis=1) / counts[:,None]
+    expected_rgb = np.stack([np.bincount(inverse, rgb[:,k]) for k in range(3)], axis=1) / counts[:,None]
+    expected_xyz, expected_rgb = _sorted_by_position(expected_xyz, np.round(expected_rgb))
+
+    for chunk_size in [7, 1000, 10000]:
+        centroids, colors = _sorted_by_position(*ply_io.voxel_downsample(xyz, rgb, 0.5, chunk_size))
+        assert centroids.shape == (voxels.shape[0], 3)
+        assert np.allclose(centroids, expected_xyz)
+        assert np.array_equal(colors, expected_rgb.astype(np.uint8))
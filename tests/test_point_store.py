@@ -0,0 +1,33 @@
+import os
+import numpy as np
+import pytest
+
+import colmap_io
+import point_store
+from visibility import VisibilityIndex
+
+@pytest.mark.parametrize("chunk_size", [1, 333, 1 << 20])
+@pytest.mark.parametrize("binary", [False, True])
+def test_store_matches_in_memory_filter(scene, tmp_path, chunk_size, binary):
+    points_file = os.path.join(scene["model_path"], "points3D.bin") if binary else scene["points_file"]
+    store_path = str(tmp_path / "store")
+    stored, num_loaded = point_store.write_point_store(points_file, store_path, 1.0, 2, chunk_size)
+    expected = colmap_io.filter_points(colmap_io.read_points3d(points_file), 1.0, 2)
+
+    assert num_loaded == 2000
+    assert 0 < stored["ids"].shape[0] < 2000
+    for key in expected:
+        assert np.array_equal(stored[key], expected[key]), key
+    assert np.array_equal(stored["track_lens"], np.diff(expected["track_offsets"]))
+
+    # the index built from the store matches the in-memory index
+    index = point_store.build_visibility(stored, str(tmp_path / "index"), chunk_size)
+    reference = VisibilityIndex.from_points(expected)
+    for key in ["image_ids", "row_ptr", "point_inds"]:
+        assert np.array_equal(getattr(index, key), getattr(reference, key)), key
+
+def test_empty_store(scene, tmp_path):
+    stored, num_loaded = point_store.write_point_store(scene["points_file"], str(tmp_path / "store"), -1.0, 2)
+    assert num_loaded == 2000
+    assert stored["xyz"].shape == (0, 3)
+    assert point_store.open_point_store(str(tmp_path / "store"))["track_offsets"].tolist() == [0]
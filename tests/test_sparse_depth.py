@@ -0,0 +1,29 @@
+import numpy as np
+
+from sparse_depth import write_sparse_depth, read_sparse_depth, densify_sparse_depth, load_sparse_depth
+
+def test_round_trip_and_densify(tmp_path):
+    sparse_file = str(tmp_path / "00000000.npz")
+    pixels = np.array([0, 5, 11])
+    depth = np.array([1.5, 2.25, 3.0])
+    write_sparse_depth(sparse_file, pixels, depth, (3, 4), point_ids=np.array([7, 8, 9]), errors=np.array([0.5, 1.0, 0.25]), track_lens=np.array([2, 3, 4]))
+    sparse = read_sparse_depth(sparse_file)
+
+    assert sparse["shape"].tolist() == [3, 4]
+    assert sparse["pixels"].tolist() == [0, 5, 11]
+    assert sparse["track_lens"].dtype == np.uint16
+
+    dense = load_sparse_depth(sparse_file)
+    expected = np.zeros((3, 4), dtype=np.float32)
+    expected.flat[pixels] = depth
+    assert np.array_equal(dense, expected)
+    assert densify_sparse_depth(sparse, "point_ids", -1)[1, 1] == 8
+    assert densify_sparse_depth(sparse, "point_ids", -1)[0, 1] == -1
+    assert densify_sparse_depth(sparse, "errors")[2, 3] == np.float32(0.25)
+
+def test_depth_only(tmp_path):
+    sparse_file = str(tmp_path / "empty.npz")
+    write_sparse_depth(sparse_file, np.zeros(0, dtype=np.int64), np.zeros(0), (2, 2))
+    sparse = read_sparse_depth(sparse_file)
+    assert sorted(sparse) == ["depth", "pixels", "shape"]
+    assert not load_sparse_depth(sparse_file).any()
@@ -0,0 +1,74 @@
+import struct
+import zlib
+import numpy as np
+import pytest
+
+import utils
+
+def _png_header(width, height):
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return utils.PNG_SIGNATURE + struct.pack(">I", len(ihdr)) + b"IHDR" + ihdr + struct.pack(">I", zlib.crc32(b"IHDR" + ihdr))
+
+def _jpeg_header(width, height):
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + bytes(9)
+    # a Huffman table (0xc4) is not a frame, even though its code lies in the SOF range
+    dht = b"\xff\xc4" + struct.pack(">H", 5) + bytes(3)
+    sof0 = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 1) + bytes(3)
+    # fill bytes may precede a marker
+    return b"\xff\xd8" + app0 + dht + b"\xff\xff" + sof0 + b"\xff\xda"
+
+@pytest.mark.parametrize("header", [_png_header, _jpeg_header])
+def test_probe_image_size_reads_headers(tmp_path, header):
+    image_file = str(tmp_path / "image")
+    with open(image_file, 'wb') as imf:
+        imf.write(header(1920, 1080) + bytes(64))
+    assert utils.probe_image_size(image_file) == (1080, 1920)
+    assert utils.read_image_size(image_file) == (1080, 1920)
+
+@pytest.mark.parametrize("data", [b"GIF89a" + bytes(32), b"\xff\xd8\xff\xe0\x00\x10JFIF", b"\xff\xd8\xff\xd9", b""])
+def test_probe_image_size_gives_up_on_other_data(tmp_path, data):
+    image_file = str(tmp_path / "image")
+    with open(image_file, 'wb') as imf:
+        imf.write(data)
+    assert utils.probe_image_size(image_file) is None
+
+def _cam_words(extrinsic, intrinsic, metadata):
+    # tokens of a camera file as read by utils._read_words
+    text = "extrinsic\n" + " ".join(map(str, extrinsic.ravel())) + "\nintrinsic\n" + " ".join(map(str, intrinsic.ravel()))
+    return (text + "\n" + " ".join(map(str, metadata))).encode().split()
+
+def test_parse_cams_sfm_reads_every_layout():
+    extrinsics = [np.eye(4) + i for i in range(4)]
+    intrinsics = [np.array([[100.0 + i, 0, 32], [0, 100.0 + i, 24], [0, 0, 1]]) for i in range(4)]
+    metadata = [[], [0.5, 0.01], [0.5, 0.01, 100], [0.5, 0.01, 100, 2.0]]
+    words = [_cam_words(e, k, m) for e, k, m in zip(extrinsics, intrinsics, metadata)]
+
+    for depth_planes in [utils.DEFAULT_DEPTH_PLANES, 64]:
+        cams = utils.parse_cams_sfm(words, depth_planes)
+
+        assert cams.shape == (4, 2, 4, 4)
+        assert np.array_equal(cams[:,0], np.stack(extrinsics))
+        assert np.array_equal(cams[:,1,:3,:3], np.stack(intrinsics))
+        assert np.array_equal(cams[:,1,:3,3], np.zeros((4, 3)))
+        # depth min, interval, number of planes and depth max
+        assert cams[0,1,3].tolist() == [0, 0, 0, 1]
+        assert np.allclose(cams[1,1,3], [0.5, 0.01, depth_planes, 0.5 + (0.01 * depth_planes)])
+        assert np.allclose(cams[2,1,3], [0.5, 0.01, 100, 1.5])
+        assert cams[3,1,3].tolist() == [0.5, 0.01, 100, 2.0]
+
+def test_read_cams_sfm_matches_single_files(tmp_path):
+    cam = np.zeros((2, 4, 4))
+    cam[0] = np.eye(4)
+    cam[0,:3,3] = [1, 2, 3]
+    cam[1,:3,:3] = [[50, 0, 32], [0, 50, 24], [0, 0, 1]]
+    cam[1,3] = [0.5, 0.01, 128, 1.78]
+    for i in range(3):
+        cam[0,0,3] = i
+        utils.write_cam_sfm(str(tmp_path / f"{i:08d}_cam.txt"), cam)
+    (tmp_path / "notes.txt").write_text("not a camera")
+
+    cams = utils.read_cams_sfm(str(tmp_path), threads=2)
+    assert cams.shape == (3, 2, 4, 4)
+    for i in range(3):
+        assert np.array_equal(cams[i], utils.read_single_cam_sfm(str(tmp_path / f"{i:08d}_cam.txt")))
+    assert cams[:,0,0,3].tolist() == [0, 1, 2]
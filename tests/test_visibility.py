@@ -0,0 +1,37 @@
+import numpy as np
+
+import colmap_io
+from visibility import VisibilityIndex
+
+def test_rows_list_the_points_of_each_image(scene):
+    points = colmap_io.read_points3d(scene["points_file"])
+    index = VisibilityIndex.from_points(points)
+    track_point_rows = np.repeat(np.arange(2000), np.diff(points["track_offsets"]))
+
+    assert index.image_ids.tolist() == [1, 2, 3, 4, 5, 6]
+    for image_id in range(1, 7):
+        expected = track_point_rows[points["track_image_ids"] == image_id]
+        assert np.array_equal(index.point_indices(image_id), expected)
+        assert np.array_equal(index.points(image_id), points["xyz"][expected])
+        assert index.num_points(image_id) == expected.shape[0]
+    assert index.point_indices(99).shape == (0,)
+
+def test_shared_points_and_covisibility(scene):
+    points = colmap_io.read_points3d(scene["points_file"])
+    index = VisibilityIndex.from_points(points)
+    sees = lambda image_id: set(index.point_indices(image_id).tolist())
+
+    assert set(index.shared_points(1, 2).tolist()) == sees(1) & sees(2)
+    assert index.num_shared_points(1, 2) == len(sees(1) & sees(2))
+
+    covisibility = index.covisibility_matrix().toarray()
+    assert covisibility.shape == (6, 6)
+    assert covisibility[0, 1] == len(sees(1) & sees(2))
+    assert covisibility[2, 2] == len(sees(3))
+
+def test_from_csr_wraps_arrays(scene):
+    points = colmap_io.read_points3d(scene["points_file"])
+    index = VisibilityIndex.from_points(points)
+    wrapped = VisibilityIndex.from_csr(index.xyz, index.image_ids, index.row_ptr, index.point_inds)
+    assert wrapped.point_inds is index.point_inds
+    assert np.array_equal(wrapped.points(4), index.points(4))
@@ -1,9 +1,14 @@
 #!/bin/bash
 
-./tnt_sparse_depth.sh ~/data/TNT Barn
-./tnt_sparse_depth.sh ~/data/TNT Caterpillar
-./tnt_sparse_depth.sh ~/data/TNT Church
-./tnt_sparse_depth.sh ~/data/TNT Courthouse
-./tnt_sparse_depth.sh ~/data/TNT Ignatius
-./tnt_sparse_depth.sh ~/data/TNT Meetingroom
-./tnt_sparse_depth.sh ~/data/TNT Truck
+# run all scenes concurrently under a shared CPU budget; see batch.py --help
+python batch.py \
+    --dataset tnt \
+    --data_path ~/data/TNT \
+    --scenes \
+        Barn \
+        Caterpillar \
+        Church \
+        Courthouse \
+        Ignatius \
+        Meetingroom \
+        Truck
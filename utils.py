@@ -1,7 +1,26 @@
-import cv2, sys
+import sys
 import os
+import struct
 import numpy as np
-import open3d as o3d
+from concurrent.futures import ThreadPoolExecutor
+
+# cv2 and open3d are imported inside the functions that need them, since importing
+# them dominates the startup time of the scripts that only read cameras or write maps
+
+# number of depth planes assumed for camera files that only store the depth min and interval
+DEFAULT_DEPTH_PLANES = 256
+
+# splat size (pixels) of the points of the rendered depth maps, the point size of the default
+# material of the Open3D renderer the depth maps were originally rendered with
+DEFAULT_POINT_SIZE = 3
+
+# number of threads reading camera files and image headers (I/O bound on network filesystems)
+IO_THREADS = 16
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# extensions of the images whose size can be read from their headers (see probe_image_size)
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
 
 def render_point_cloud(render, intrins, pose):
     """Renders a point cloud into a 2D image plane.
@@ -10,6 +29,8 @@ def render_point_cloud(render, intrins, pose):
 
     Returns:
     """
+    import cv2
+
     render.setup_camera(intrins, pose)
 
     # render image
@@ -20,33 +41,292 @@ def render_point_cloud(render, intrins, pose):
 
     return image, depth
 
-def read_cams_sfm(camera_path: str, extension: str = "cam.txt") -> np.ndarray:
+def project_points(pose: np.ndarray, K: np.ndarray, points: np.ndarray) -> tuple:
+    """Projects world points into the image plane of a pinhole camera.
+
+    Parameters:
+        pose: World-to-camera extrinsic matrix (4x4).
+        K: Camera intrinsic matrix (3x3 or 4x4).
+        points: World points to be projected (Nx3).
+
+    Returns:
+        Pixel columns (N), pixel rows (N) and view-space depths (N).
+    """
+    points = np.asarray(points, dtype=np.float64)
+    cam_points = points @ pose[:3,:3].T + pose[:3,3]
+    z = cam_points[:,2]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        u = (K[0,0] * cam_points[:,0] / z) + K[0,2]
+        v = (K[1,1] * cam_points[:,1] / z) + K[1,2]
+
+    return u, v, z
+
+def nearest_per_pixel(pixels: np.ndarray, z: np.ndarray) -> np.ndarray:
+    """Resolves pixel collisions by keeping the nearest depth (a vectorized scatter-min).
+
+    Parameters:
+        pixels: Linear pixel index of each candidate (N).
+        z: Depth of each candidate (N).
+
+    Returns:
+        Indices of the winning candidates, ordered by ascending pixel index.
+    """
+    # sort by pixel then depth, keep the first (nearest) entry per pixel
+    order = np.lexsort((z, pixels))
+    sorted_pixels = pixels[order]
+    first = np.ones(order.shape[0], dtype=bool)
+    first[1:] = sorted_pixels[1:] != sorted_pixels[:-1]
+    return order[first]
+
+def rasterize(u: np.ndarray, v: np.ndarray, z: np.ndarray, width: int, height: int, scale: int = 1, point_size: int = 1) -> tuple:
+    """Rounds projected points to the pixels of an image, keeping the nearest point per pixel.
+
+    Every point covers the point_size x point_size square of pixels centered on its rounded
+    pixel (for even sizes the extra row and column lie after it), like the point sprites
+    of an OpenGL renderer.
+
+    Parameters:
+        u: Pixel columns at full resolution (N).
+        v: Pixel rows at full resolution (N).
+        z: View-space depths (N).
+        width: Width of the full resolution image.
+        height: Height of the full resolution image.
+        scale: Downscaling factor of the target image (see scale_intrinsics).
+        point_size: Splat size of every point, in pixels of the target image.
+
+    Returns:
+        Sorted linear pixel indices (M), depths (M) and indices into the inputs (M) of the
+        nearest point at every covered pixel of the (width // scale)x(height // scale) image.
+    """
+    width, height = width // scale, height // scale
+    u = np.round(u / scale)
+    v = np.round(v / scale)
+    offsets = np.arange(point_size) - ((point_size - 1) // 2)
+    lo, hi = offsets[0], offsets[-1]
+
+    # points just outside the image still cover its border pixels
+    with np.errstate(invalid='ignore'):
+        inds = np.flatnonzero((z > 0) & (u >= -hi) & (u < width - lo) & (v >= -hi) & (v < height - lo))
+
+    u, v = u[inds], v[inds]
+    if point_size > 1:
+        du, dv = np.meshgrid(offsets, offsets)
+        u = (u[:,None] + du.ravel()).ravel()
+        v = (v[:,None] + dv.ravel()).ravel()
+        inds = np.repeat(inds, point_size * point_size)
+        inside = (u >= 0) & (u < width) & (v >= 0) & (v < height)
+        u, v, inds = u[inside], v[inside], inds[inside]
+    pixels = v.astype(np.int64) * width + u.astype(np.int64)
+    z = z[inds]
+
+    winners = nearest_per_pixel(pixels, z)
+    return pixels[winners], z[winners], inds[winners]
+
+def scale_intrinsics(K: np.ndarray, scale: int) -> np.ndarray:
+    """Scales camera intrinsics to an image downscaled by an integer factor.
+
+    Parameters:
+        K: Camera intrinsic matrix (3x3, or 4x4 with a depth metadata row).
+        scale: Downscaling factor.
+
+    Returns:
+        Intrinsic matrix of the downscaled image (same shape as K).
+    """
+    K = np.array(K, dtype=np.float64)
+    K[:2,:3] /= scale
+    return K
+
+def zbuffer_project(pose: np.ndarray, K: np.ndarray, points: np.ndarray, width: int, height: int, point_size: int = 1) -> tuple:
+    """Projects a point cloud into an image, keeping only the nearest point per pixel.
+
+    Parameters:
+        pose: World-to-camera extrinsic matrix (4x4).
+        K: Camera intrinsic matrix (3x3 or 4x4).
+        points: World points to be projected (Nx3).
+        width: Width of the image.
+        height: Height of the image.
+        point_size: Splat size of every point (pixels).
+
+    Returns:
+        Sorted linear pixel indices (M), depths (M) and indices into points (M) of the
+        nearest point at every covered pixel.
+    """
+    return zbuffer_pyramid(pose, K, points, width, height, point_size=point_size)[0]
+
+def zbuffer_pyramid(pose: np.ndarray, K: np.ndarray, points: np.ndarray, width: int, height: int, scales: tuple = (1,), point_size: int = 1) -> list:
+    """Projects a point cloud once and keeps the nearest point per pixel at several scales.
+
+    Parameters:
+        pose: World-to-camera extrinsic matrix (4x4).
+        K: Camera intrinsic matrix (3x3 or 4x4) of the full resolution image.
+        points: World points to be projected (Nx3).
+        width: Width of the full resolution image.
+        height: Height of the full resolution image.
+        scales: Downscaling factors of the pyramid levels.
+        point_size: Splat size of every point, in pixels of each level.
+
+    Returns:
+        Sorted linear pixel indices, depths and indices into points of every level, as
+        returned by zbuffer_project for the scaled intrinsics and image size.
+    """
+    u, v, z = project_points(pose, K, points)
+    return [rasterize(u, v, z, width, height, scale, point_size) for scale in scales]
+
+def observation_project(pose: np.ndarray, xys: np.ndarray, points: np.ndarray, width: int, height: int, point_size: int = 1) -> tuple:
+    """Places the depth of observed points at their measured keypoint pixels.
+
+    Parameters:
+        pose: World-to-camera extrinsic matrix (4x4).
+        xys: Measured keypoint location of each observation (Nx2).
+        points: World point of each observation (Nx3).
+        width: Width of the image.
+        height: Height of the image.
+        point_size: Splat size of every observation (pixels).
+
+    Returns:
+        Sorted linear pixel indices (M), depths (M) and indices into the observations (M)
+        of the nearest observation at every covered pixel.
+    """
+    return observation_pyramid(pose, xys, points, width, height, point_size=point_size)[0]
+
+def observation_pyramid(pose: np.ndarray, xys: np.ndarray, points: np.ndarray, width: int, height: int, scales: tuple = (1,), point_size: int = 1) -> list:
+    """Places the depth of observed points at their keypoint pixels at several scales.
+
+    Parameters:
+        pose: World-to-camera extrinsic matrix (4x4).
+        xys: Measured keypoint location of each observation at full resolution (Nx2).
+        points: World point of each observation (Nx3).
+        width: Width of the full resolution image.
+        height: Height of the full resolution image.
+        scales: Downscaling factors of the pyramid levels.
+        point_size: Splat size of every observation, in pixels of each level.
+
+    Returns:
+        Sorted linear pixel indices, depths and indices into the observations of every
+        level, as returned by observation_project for the scaled image size.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    z = points @ pose[2,:3] + pose[2,3]
+
+    # keypoints are rounded to the nearest pixel, as in zbuffer_project
+    return [rasterize(xys[:,0], xys[:,1], z, width, height, scale, point_size) for scale in scales]
+
+def zbuffer_depth(pose: np.ndarray, K: np.ndarray, points: np.ndarray, width: int, height: int, point_size: int = 1) -> np.ndarray:
+    """Rasterizes a point cloud into a depth map, keeping the nearest depth per pixel.
+
+    Parameters:
+        pose: World-to-camera extrinsic matrix (4x4).
+        K: Camera intrinsic matrix (3x3 or 4x4).
+        points: World points to be rasterized (Nx3).
+        width: Width of the output depth map.
+        height: Height of the output depth map.
+        point_size: Splat size of every point (pixels).
+
+    Returns:
+        Depth map (HxW) with zeros at pixels that received no points.
+    """
+    depth = np.zeros((height, width), dtype=np.float32)
+    if len(points) == 0:
+        return depth
+
+    pixels, z, _ = zbuffer_project(pose, K, points, width, height, point_size)
+    depth.flat[pixels] = z
+
+    return depth
+
+def camera_centers(cams: np.ndarray) -> np.ndarray:
+    """Computes the world coordinates of the camera centers.
+
+    Parameters:
+        cams: Camera extrinsics and intrinsics (Nx2x4x4).
+
+    Returns:
+        Camera centers (Nx3).
+    """
+    R = cams[:,0,:3,:3]
+    t = cams[:,0,:3,3]
+    return -np.einsum("nji,nj->ni", R, t)
+
+def write_cam_sfm(cam_file: str, cam: np.ndarray) -> None:
+    """Writes a single camera file in SFM format (readable by read_single_cam_sfm).
+
+    Parameters:
+        cam_file: Output camera file.
+        cam: Camera extrinsics, intrinsics, and view metadata (2x4x4).
+    """
+    with open(cam_file, 'w') as cf:
+        cf.write("extrinsic\n")
+        cf.writelines(" ".join(str(v) for v in row) + "\n" for row in cam[0].tolist())
+        cf.write("\nintrinsic\n")
+        cf.writelines(" ".join(str(v) for v in row) + "\n" for row in cam[1,:3,:3].tolist())
+        cf.write("\n" + " ".join(str(v) for v in cam[1,3].tolist()) + "\n")
+
+def read_cams_sfm(camera_path: str, extension: str = "cam.txt", depth_planes: int = DEFAULT_DEPTH_PLANES, threads: int = IO_THREADS) -> np.ndarray:
     """Reads an entire directory of camera files in SFM format.
 
     Parameters:
         camera_path: Path to the directory of camera files.
         extension: File extension being used for the camera files.
+        depth_planes: Number of depth planes for camera files without a depth plane count.
+        threads: Number of threads reading the camera files.
 
     Returns:
         Array of camera extrinsics, intrinsics, and view metadata (Nx2x4x4).
     """
-    cam_files = os.listdir(camera_path)
+    cam_files = [cf for cf in os.listdir(camera_path) if cf.endswith(extension)]
     cam_files.sort()
 
-    cams = []
+    with ThreadPoolExecutor(max(1, threads)) as executor:
+        words = list(executor.map(_read_words, [os.path.join(camera_path,cf) for cf in cam_files]))
+
+    return parse_cams_sfm(words, depth_planes)
+
+def _read_words(text_file):
+    with open(text_file, 'rb') as tf:
+        return tf.read().split()
+
+def parse_cams_sfm(words: list, depth_planes: int = DEFAULT_DEPTH_PLANES) -> np.ndarray:
+    """Parses the tokens of camera files in SFM format.
 
-    for cf in cam_files:
-        if (cf[-7:] != extension):
-            continue
+    Files with the same number of tokens are converted together, so the parsing cost
+    does not grow with a Python loop per camera entry.
 
-        cam_path = os.path.join(camera_path,cf)
-        #with open(cam_path,'r') as f:
-        cam = read_single_cam_sfm(cam_path, 256)
-        cams.append(cam)
+    Parameters:
+        words: Whitespace separated tokens of each camera file.
+        depth_planes: Number of depth planes for camera files without a depth plane count.
 
-    return np.asarray(cams)
+    Returns:
+        Array of camera extrinsics, intrinsics, and view metadata (Nx2x4x4).
+    """
+    cams = np.zeros((len(words), 2, 4, 4))
+    words_lens = np.asarray([len(w) for w in words], dtype=np.int64)
+
+    for words_len in np.unique(words_lens):
+        rows = np.flatnonzero(words_lens == words_len)
+
+        # numeric tokens of the group, skipping the extrinsic and intrinsic labels
+        values = np.array([token for i in rows for token in words[i][1:17] + words[i][18:]], dtype=np.float64)
+        values = values.reshape(rows.shape[0], words_len - 2)
+        cams[rows,0] = values[:,0:16].reshape(-1, 4, 4)
+        cams[rows,1,:3,:3] = values[:,16:25].reshape(-1, 3, 3)
+
+        # depth min, interval, number of planes and depth max
+        if words_len == 29:
+            cams[rows,1,3,:2] = values[:,25:27]
+            cams[rows,1,3,2] = depth_planes
+            cams[rows,1,3,3] = values[:,25] + (values[:,26] * depth_planes)
+        elif words_len == 30:
+            cams[rows,1,3,:3] = values[:,25:28]
+            cams[rows,1,3,3] = values[:,25] + (values[:,26] * values[:,27])
+        elif words_len == 31:
+            cams[rows,1,3,:] = values[:,25:29]
+        else:
+            cams[rows,1,3,3] = 1
+
+    return cams
 
-def read_single_cam_sfm(cam_file: str, depth_planes: int = 256) -> np.ndarray:
+def read_single_cam_sfm(cam_file: str, depth_planes: int = DEFAULT_DEPTH_PLANES) -> np.ndarray:
     """Reads a single camera file in SFM format.
 
     Parameters:
@@ -56,49 +336,110 @@ def read_single_cam_sfm(cam_file: str, depth_planes: int = 256) -> np.ndarray:
     Returns:
         Camera extrinsics, intrinsics, and view metadata (2x4x4).
     """
-    cam = np.zeros((2, 4, 4))
-
-    with open(cam_file, 'r') as cam_file:
-        words = cam_file.read().split()
-
-    words_len = len(words)
-
-    # read extrinsic
-    for i in range(0, 4):
-        for j in range(0, 4):
-            extrinsic_index = 4 * i + j + 1
-            cam[0,i,j] = float(words[extrinsic_index])
-
-    # read intrinsic
-    for i in range(0, 3):
-        for j in range(0, 3):
-            intrinsic_index = 3 * i + j + 18
-            cam[1,i,j] = float(words[intrinsic_index])
-
-    if words_len == 29:
-        cam[1,3,0] = float(words[27])
-        cam[1,3,1] = float(words[28])
-        cam[1,3,2] = depth_planes
-        cam[1,3,3] = cam[1][3][0] + (cam[1][3][1] * cam[1][3][2])
-    elif words_len == 30:
-        cam[1,3,0] = float(words[27])
-        cam[1,3,1] = float(words[28])
-        cam[1,3,2] = float(words[29])
-        cam[1,3,3] = cam[1][3][0] + (cam[1][3][1] * cam[1][3][2])
-    elif words_len == 31:
-        cam[1,3,0] = words[27]
-        cam[1,3,1] = float(words[28])
-        cam[1,3,2] = float(words[29])
-        cam[1,3,3] = float(words[30])
-    else:
-        cam[1,3,0] = 0
-        cam[1,3,1] = 0
-        cam[1,3,2] = 0
-        cam[1,3,3] = 1
-
-    return cam
-
-def read_point_cloud(point_cloud_file: str) -> o3d.geometry.PointCloud:
+    return parse_cams_sfm([_read_words(cam_file)], depth_planes)[0]
+
+def probe_image_size(image_file: str) -> tuple:
+    """Reads the size of a PNG or JPEG image from its header, without decoding it.
+
+    Parameters:
+        image_file: Input image file.
+
+    Returns:
+        The image height and width, or None if the format is not recognized.
+    """
+    with open(image_file, 'rb') as imf:
+        head = imf.read(24)
+
+        # PNG: the IHDR chunk directly follows the signature
+        if head[:8] == PNG_SIGNATURE and head[12:16] == b"IHDR":
+            width, height = struct.unpack(">II", head[16:24])
+            return height, width
+
+        if head[:2] != b"\xff\xd8":
+            return None
+
+        # JPEG: walk the marker segments up to the first start-of-frame
+        imf.seek(2)
+        while True:
+            byte = imf.read(1)
+            while byte and byte != b"\xff":
+                byte = imf.read(1)
+            marker = imf.read(1)
+            while marker == b"\xff":
+                marker = imf.read(1)
+            if not marker:
+                return None
+
+            code = marker[0]
+            if code == 0xd9:
+                return None
+            if code == 0x01 or 0xd0 <= code <= 0xd8:
+                continue
+            length = struct.unpack(">H", imf.read(2))[0]
+            if 0xc0 <= code <= 0xcf and code not in (0xc4, 0xc8, 0xcc):
+                _, height, width = struct.unpack(">BHH", imf.read(5))
+                return height, width
+            imf.seek(length - 2, 1)
+
+def read_image_size(image_file: str) -> tuple:
+    """Reads the size of an image.
+
+    Parameters:
+        image_file: Input image file.
+
+    Returns:
+        The image height and width.
+    """
+    size = probe_image_size(image_file)
+    if size is not None:
+        return size
+
+    # other formats are decoded
+    import cv2
+
+    img = cv2.imread(image_file)
+    if img is None:
+        raise ValueError(f"could not read image {image_file}")
+    return img.shape[0], img.shape[1]
+
+def list_images(image_path: str, extensions: tuple = IMAGE_EXTENSIONS) -> list:
+    """Lists the image files of a directory, ignoring other files and subdirectories.
+
+    Parameters:
+        image_path: Path to the directory of images.
+        extensions: Accepted file extensions (case-insensitive).
+
+    Returns:
+        Sorted image file names.
+    """
+    return sorted(
+        img for img in os.listdir(image_path)
+        if img.lower().endswith(extensions) and os.path.isfile(os.path.join(image_path, img))
+    )
+
+def common_image_size(image_path: str, image_files: list, threads: int = IO_THREADS) -> tuple:
+    """Reads the size shared by a set of images.
+
+    Parameters:
+        image_path: Path to the directory of images.
+        image_files: Image file names.
+        threads: Number of threads reading the image headers.
+
+    Returns:
+        The image height and width.
+    """
+    with ThreadPoolExecutor(max(1, threads)) as executor:
+        sizes = list(executor.map(read_image_size, [os.path.join(image_path,img) for img in image_files]))
+
+    if not sizes:
+        raise ValueError(f"no images found in {image_path}")
+    mismatched = [img for img, size in zip(image_files, sizes) if size != sizes[0]]
+    if mismatched:
+        raise ValueError(f"images in {image_path} do not share the size {sizes[0][1]}x{sizes[0][0]} of {image_files[0]}: {', '.join(mismatched[:5])}")
+
+    return sizes[0]
+
+def read_point_cloud(point_cloud_file: str) -> "o3d.geometry.PointCloud":
     """Reads a point cloud from a file.
 
     Parameters:
@@ -107,6 +448,8 @@ def read_point_cloud(point_cloud_file: str) -> o3d.geometry.PointCloud:
     Returns:
         The point cloud stored in the given file.
     """
+    import open3d as o3d
+
     return o3d.io.read_point_cloud(point_cloud_file)
 
 def write_pfm(pfm_file: str, data_map: np.ndarray, scale: float = 1.0) -> None:
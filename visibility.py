@@ -0,0 +1,110 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+
+class VisibilityIndex:
+    """Image-to-point visibility index stored in CSR layout.
+
+    The indices of the points observed by the image in row r are given by
+    point_inds[row_ptr[r]:row_ptr[r+1]], with rows ordered by ascending image id.
+    """
+    def __init__(self, xyz: np.ndarray, track_offsets: np.ndarray, track_image_ids: np.ndarray):
+        """Builds the index from CSR point tracks.
+
+        Parameters:
+            xyz: Point positions (Nx3).
+            track_offsets: Track offsets of each point (N+1).
+            track_image_ids: Image id of each point observation (T).
+        """
+        self.xyz = xyz
+
+        track_lens = np.diff(track_offsets)
+        obs_point_inds = np.repeat(np.arange(track_lens.shape[0], dtype=np.int64), track_lens)
+        order = np.argsort(track_image_ids, kind="stable")
+        self.point_inds = obs_point_inds[order]
+
+        self.image_ids, counts = np.unique(track_image_ids[order], return_counts=True)
+        self.row_ptr = np.zeros(self.image_ids.shape[0] + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.row_ptr[1:])
+
+    @classmethod
+    def from_points(cls, points: dict) -> "VisibilityIndex":
+        """Builds the index from columnar points as returned by colmap_io.load_points."""
+        return cls(points["xyz"], points["track_offsets"], points["track_image_ids"])
+
+    @classmethod
+    def from_csr(cls, xyz: np.ndarray, image_ids: np.ndarray, row_ptr: np.ndarray, point_inds: np.ndarray) -> "VisibilityIndex":
+        """Wraps existing index arrays (e.g. views of shared memory) without copying them."""
+        index = cls.__new__(cls)
+        index.xyz = xyz
+        index.image_ids = image_ids
+        index.row_ptr = row_ptr
+        index.point_inds = point_inds
+        return index
+
+    def _row(self, image_id: int) -> int:
+        row = np.searchsorted(self.image_ids, image_id)
+        if row == self.image_ids.shape[0] or self.image_ids[row] != image_id:
+            return -1
+        return int(row)
+
+    def point_indices(self, image_id: int) -> np.ndarray:
+        """Returns the indices of the points observed by an image (zero-copy view).
+
+        Parameters:
+            image_id: Colmap image id.
+
+        Returns:
+            Sorted point indices into xyz (K).
+        """
+        row = self._row(image_id)
+        if row < 0:
+            return self.point_inds[:0]
+        return self.point_inds[self.row_ptr[row]:self.row_ptr[row+1]]
+
+    def points(self, image_id: int) -> np.ndarray:
+        """Returns the positions of the points observed by an image.
+
+        Parameters:
+            image_id: Colmap image id.
+
+        Returns:
+            Point positions (Kx3).
+        """
+        return self.xyz[self.point_indices(image_id)]
+
+    def num_points(self, image_id: int) -> int:
+        """Returns the number of points observed by an image."""
+        return self.point_indices(image_id).shape[0]
+
+    def shared_points(self, image_id1: int, image_id2: int) -> np.ndarray:
+        """Returns the indices of the points observed by both images.
+
+        Parameters:
+            image_id1: First colmap image id.
+            image_id2: Second colmap image id.
+
+        Returns:
+            Sorted indices of the covisible points.
+        """
+        return np.intersect1d(self.point_indices(image_id1), self.point_indices(image_id2), assume_unique=True)
+
+    def num_shared_points(self, image_id1: int, image_id2: int) -> int:
+        """Returns the number of points observed by both images."""
+        return self.shared_points(image_id1, image_id2).shape[0]
+
+    def incidence_matrix(self) -> csr_matrix:
+        """Returns the sparse image-by-point incidence matrix, sharing the index arrays.
+
+        Rows follow the order of image_ids and columns index into xyz.
+        """
+        data = np.ones(self.point_inds.shape[0], dtype=np.int32)
+        return csr_matrix((data, self.point_inds, self.row_ptr), shape=(self.image_ids.shape[0], self.xyz.shape[0]), copy=False)
+
+    def covisibility_matrix(self) -> csr_matrix:
+        """Returns the sparse matrix of shared-point counts between all pairs of images.
+
+        Rows and columns follow the order of image_ids; the diagonal holds the number of
+        points observed by each image.
+        """
+        incidence = self.incidence_matrix()
+        return (incidence @ incidence.T).tocsr()